@@ -7,12 +7,15 @@ Phân tích và suy luận thông tin đời từ liên kết gia đình
 import re
 from collections import defaultdict
 
+from clan_rules import load_rules
+from familyecho_file import FamilyEchoFile
+
 def parse_familyscript(filepath):
     """Parse FamilyScript file and extract person data"""
     persons = {}
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        for line in f:
+    with FamilyEchoFile(filepath) as reader:
+        for line in reader.person_text():
             line = line.strip()
             if not line.startswith('i'):
                 continue
@@ -69,8 +72,10 @@ def parse_familyscript(filepath):
     return persons
 
 
-def propagate_generations(persons):
+def propagate_generations(persons, rules=None):
     """Propagate generation info from parents to children and vice versa"""
+    if rules is None:
+        rules = load_rules()
 
     # Build children index
     children_of = defaultdict(list)
@@ -95,16 +100,16 @@ def propagate_generations(persons):
             # Try to infer from father
             if person['father_id'] and person['father_id'] in persons:
                 father = persons[person['father_id']]
-                if father['generation'] is not None:
+                if father['generation'] is not None and rules.inherits('father', father):
                     person['generation'] = father['generation'] + 1
                     person['gen_source'] = f"inferred from father {father['name']} {father['surname']}"
                     changes = True
                     continue
 
-            # Try to infer from mother (if she's a Đặng)
+            # Try to infer from mother (by default only if she carries the clan surname)
             if person['mother_id'] and person['mother_id'] in persons:
                 mother = persons[person['mother_id']]
-                if mother['generation'] is not None and 'Đặng' in mother.get('surname', ''):
+                if mother['generation'] is not None and rules.inherits('mother', mother):
                     person['generation'] = mother['generation'] + 1
                     person['gen_source'] = f"inferred from mother {mother['name']} {mother['surname']}"
                     changes = True
@@ -113,7 +118,7 @@ def propagate_generations(persons):
             # Try to infer from children (generation = child's generation - 1)
             for child_id in children_of.get(pid, []):
                 child = persons[child_id]
-                if child['generation'] is not None:
+                if child['generation'] is not None and rules.inherits('child', child):
                     person['generation'] = child['generation'] - 1
                     person['gen_source'] = f"inferred from child {child['name']} {child['surname']}"
                     changes = True
@@ -122,8 +127,10 @@ def propagate_generations(persons):
     return iterations
 
 
-def analyze_results(persons):
+def analyze_results(persons, rules=None):
     """Analyze and report results"""
+    if rules is None:
+        rules = load_rules()
 
     total = len(persons)
     with_gen = sum(1 for p in persons.values() if p['generation'] is not None)
@@ -166,7 +173,7 @@ def analyze_results(persons):
 
     count = 0
     for pid, p in persons.items():
-        if p['generation'] is None and 'Đặng' in p.get('surname', ''):
+        if p['generation'] is None and rules.is_clan_member(p):
             father_info = ""
             if p['father_id'] and p['father_id'] in persons:
                 f = persons[p['father_id']]
@@ -195,8 +202,10 @@ def analyze_results(persons):
     return without_gen
 
 
-def export_missing_generations(persons, output_file):
+def export_missing_generations(persons, output_file, rules=None):
     """Export list of people missing generation info"""
+    if rules is None:
+        rules = load_rules()
 
     missing = []
     for pid, p in persons.items():
@@ -210,30 +219,41 @@ def export_missing_generations(persons, output_file):
                 'name': f"{p['name']} {p['surname']}",
                 'father_id': p['father_id'],
                 'father_gen': father_gen,
-                'has_dang': 'Đặng' in p.get('surname', '')
+                'in_clan': rules.is_clan_member(p)
             })
 
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write("ID\tTên\tCha ID\tĐời cha\tHọ Đặng\n")
+        f.write(f"ID\tTên\tCha ID\tĐời cha\tHọ {rules.surname}\n")
         for m in missing:
-            f.write(f"{m['id']}\t{m['name']}\t{m['father_id'] or 'N/A'}\t{m['father_gen'] or 'N/A'}\t{'Có' if m['has_dang'] else 'Không'}\n")
+            f.write(f"{m['id']}\t{m['name']}\t{m['father_id'] or 'N/A'}\t{m['father_gen'] or 'N/A'}\t{'Có' if m['in_clan'] else 'Không'}\n")
 
     print(f"\nĐã xuất danh sách {len(missing)} người thiếu thông tin đời ra: {output_file}")
 
 
 if __name__ == "__main__":
-    input_file = "/Users/toandang/Downloads/FamilyEcho/My-Family-20-Jan-2026-020424519.txt"
-    output_file = "/Users/toandang/Downloads/FamilyEcho/missing_generations.txt"
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Phân tích và suy luận thông tin đời')
+    parser.add_argument('input', help='File FamilyScript hoặc HTML xuất từ FamilyEcho')
+    parser.add_argument('-o', '--output', default='missing_generations.txt',
+                        help='File danh sách người thiếu thông tin đời (mặc định: thư mục hiện tại, '
+                             'không ghi vào docs/ vì thư mục đó được xuất bản)')
+    parser.add_argument('--rules', default=None, help='File JSON quy tắc dòng họ')
+    args = parser.parse_args()
+    rules = load_rules(args.rules)
+
+    input_file = args.input
+    output_file = args.output
 
     print("Đang đọc file FamilyScript...")
     persons = parse_familyscript(input_file)
     print(f"Đã đọc {len(persons)} người")
 
     print("\nĐang suy luận thông tin đời từ liên kết...")
-    iterations = propagate_generations(persons)
+    iterations = propagate_generations(persons, rules)
     print(f"Hoàn thành sau {iterations} vòng lặp")
 
-    without_gen = analyze_results(persons)
+    without_gen = analyze_results(persons, rules)
 
     if without_gen > 0:
-        export_missing_generations(persons, output_file)
+        export_missing_generations(persons, output_file, rules)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Đường dẫn tổ tiên trực hệ ("gia phả trực hệ") của mọi người
+
+Mỗi người có một cha/mẹ theo dòng dõi (parent_of), nên các đường dẫn từ cụ tổ
+xuống tạo thành một cây tiền tố (trie): hai anh em dùng chung toàn bộ phần
+đường dẫn của cha. Cây được lưu dạng hai mảng song song, sắp từ trên xuống
+(cha luôn đứng trước con):
+
+    ids     = ["START", "N72F1", "Z2G2D", ...]
+    parents = [-1,      0,       1,       ...]
+
+Mỗi người chỉ cần một số path_id (vị trí trong mảng). Breadcrumb của một
+người là dãy ids[i], ids[parents[i]], ... cho tới -1; viewer không phải
+duyệt father_id trên toàn bộ dữ liệu.
+"""
+
+from collections import defaultdict, deque
+from typing import Optional, Dict, List, Callable
+
+
+class AncestorPaths:
+    """Cây tiền tố các đường dẫn tổ tiên, dạng mảng con trỏ cha"""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.parents: List[int] = []
+        self.index: Dict[str, int] = {}
+
+    @classmethod
+    def build(cls, persons: Dict[str, Dict], parent_of: Callable[[str], Optional[str]],
+              root_id: Optional[str] = None) -> "AncestorPaths":
+        """Một lượt duyệt từ trên xuống (BFS) từ các gốc
+
+        root_id (cụ tổ) luôn là gốc đầu tiên, kể cả khi dữ liệu có ghi cha
+        của cụ tổ: đường dẫn dừng ở cụ tổ. Người nằm trong vòng lặp cha-con
+        (dữ liệu lỗi) không tới được từ gốc nào; vòng lặp được cắt tại người
+        đầu tiên gặp trong đó.
+        """
+        children = defaultdict(list)
+        roots = [root_id] if root_id in persons else []
+        for pid in persons:
+            if pid == root_id:
+                continue
+            parent = parent_of(pid)
+            if parent is None:
+                roots.append(pid)
+            else:
+                children[parent].append(pid)
+
+        paths = cls()
+
+        def visit(start: str):
+            paths._add(start, -1)
+            queue = deque([start])
+            while queue:
+                pid = queue.popleft()
+                parent_index = paths.index[pid]
+                for child in children.get(pid, ()):
+                    if child not in paths.index:
+                        paths._add(child, parent_index)
+                        queue.append(child)
+
+        for pid in roots:
+            visit(pid)
+        for pid in persons:
+            if pid not in paths.index:
+                visit(pid)
+        return paths
+
+    def _add(self, pid: str, parent_index: int):
+        self.index[pid] = len(self.ids)
+        self.ids.append(pid)
+        self.parents.append(parent_index)
+
+    def path_id(self, pid: str) -> Optional[int]:
+        return self.index.get(pid)
+
+    def path(self, pid: str) -> List[str]:
+        """Đường dẫn từ gốc xuống pid (gồm cả pid), rỗng nếu không có"""
+        i = self.index.get(pid)
+        result = []
+        while i is not None and i >= 0:
+            result.append(self.ids[i])
+            i = self.parents[i]
+        result.reverse()
+        return result
+
+    def root(self, pid: str) -> Optional[str]:
+        path = self.path(pid)
+        return path[0] if path else None
+
+    def to_dict(self) -> Dict[str, List]:
+        """Phần "ancestor_paths" trong family_data.json"""
+        return {"ids": self.ids, "parents": self.parents}
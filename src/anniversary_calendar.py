@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lịch ngày giỗ (và ngày an táng) tính sẵn lúc build
+
+Ngày giỗ được giữ theo âm lịch:
+    - ngày có đủ năm (FamilyEcho lưu dương lịch) -> đổi sang ngày âm lúc mất
+    - ngày chỉ có ngày/tháng (0000MMDD) -> coi là ngày âm gia phả ghi sẵn
+Sau đó đổi ngược ngày âm ra dương lịch cho từng năm cần xuất.
+
+Đổi lịch theo thuật toán của Hồ Ngọc Đức (múi giờ UTC+7), thuần Python,
+không cần mạng hay thư viện ngoài.
+
+Xuất ra thư mục calendar/:
+    calendar/index.json     -> chỉ mục theo ngày âm "MM-DD" (không đổi giữa các năm)
+    calendar/YYYY-MM.json   -> {"YYYY-MM-DD": [người có giỗ ngày đó]}
+    calendar/gio.ics        -> lịch iCalendar để thêm vào điện thoại
+"""
+
+import json
+import math
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple
+
+# Giờ Việt Nam
+TIMEZONE = 7
+
+# Số năm xuất lịch dương (tính từ năm hiện tại)
+CALENDAR_YEARS = 2
+
+# Trường ngày -> loại sự kiện
+EVENT_FIELDS = (("death_date", "gio"), ("burial_date", "an_tang"))
+EVENT_LABELS = {"gio": "Giỗ", "an_tang": "Ngày an táng"}
+
+_JD_EPOCH_NEW_MOON = 2415021.076998695
+_SYNODIC_MONTH = 29.530588853
+
+
+# ----------------------------------------------------------------------
+# Đổi lịch âm - dương
+# ----------------------------------------------------------------------
+
+def jd_from_date(dd: int, mm: int, yy: int) -> int:
+    """Số ngày Julius của một ngày dương lịch"""
+    a = (14 - mm) // 12
+    y = yy + 4800 - a
+    m = mm + 12 * a - 3
+    jd = dd + (153 * m + 2) // 5 + 365 * y + y // 4 - y // 100 + y // 400 - 32045
+    if jd < 2299161:
+        jd = dd + (153 * m + 2) // 5 + 365 * y + y // 4 - 32083
+    return jd
+
+
+def jd_to_date(jd: int) -> Tuple[int, int, int]:
+    """Số ngày Julius -> (ngày, tháng, năm) dương lịch"""
+    if jd > 2299160:
+        a = jd + 32044
+        b = (4 * a + 3) // 146097
+        c = a - (b * 146097) // 4
+    else:
+        b = 0
+        c = jd + 32082
+    d = (4 * c + 3) // 1461
+    e = c - (1461 * d) // 4
+    m = (5 * e + 2) // 153
+    day = e - (153 * m + 2) // 5 + 1
+    month = m + 3 - 12 * (m // 10)
+    year = b * 100 + d - 4800 + m // 10
+    return day, month, year
+
+
+def _new_moon(k: int) -> float:
+    """Thời điểm (ngày Julius) của lần sóc thứ k kể từ 1/1/1900"""
+    t = k / 1236.85
+    t2 = t * t
+    t3 = t2 * t
+    dr = math.pi / 180
+    jd1 = 2415020.75933 + 29.53058868 * k + 0.0001178 * t2 - 0.000000155 * t3
+    jd1 += 0.00033 * math.sin((166.56 + 132.87 * t - 0.009173 * t2) * dr)
+    m = 359.2242 + 29.10535608 * k - 0.0000333 * t2 - 0.00000347 * t3
+    mpr = 306.0253 + 385.81691806 * k + 0.0107306 * t2 + 0.00001236 * t3
+    f = 21.2964 + 390.67050646 * k - 0.0016528 * t2 - 0.00000239 * t3
+    c1 = (0.1734 - 0.000393 * t) * math.sin(m * dr) + 0.0021 * math.sin(2 * dr * m)
+    c1 += -0.4068 * math.sin(mpr * dr) + 0.0161 * math.sin(dr * 2 * mpr)
+    c1 += -0.0004 * math.sin(dr * 3 * mpr)
+    c1 += 0.0104 * math.sin(dr * 2 * f) - 0.0051 * math.sin(dr * (m + mpr))
+    c1 += -0.0074 * math.sin(dr * (m - mpr)) + 0.0004 * math.sin(dr * (2 * f + m))
+    c1 += -0.0004 * math.sin(dr * (2 * f - m)) - 0.0006 * math.sin(dr * (2 * f + mpr))
+    c1 += 0.0010 * math.sin(dr * (2 * f - mpr)) + 0.0005 * math.sin(dr * (2 * mpr + m))
+    if t < -11:
+        delta_t = 0.001 + 0.000839 * t + 0.0002261 * t2 - 0.00000845 * t3 - 0.000000081 * t * t3
+    else:
+        delta_t = -0.000278 + 0.000265 * t + 0.000262 * t2
+    return jd1 + c1 - delta_t
+
+
+def _sun_longitude(jdn: float) -> float:
+    """Kinh độ mặt trời (radian, 0..2π) tại thời điểm jdn"""
+    t = (jdn - 2451545.0) / 36525
+    t2 = t * t
+    dr = math.pi / 180
+    m = 357.52910 + 35999.05030 * t - 0.0001559 * t2 - 0.00000048 * t * t2
+    l0 = 280.46645 + 36000.76983 * t + 0.0003032 * t2
+    dl = (1.914600 - 0.004817 * t - 0.000014 * t2) * math.sin(dr * m)
+    dl += (0.019993 - 0.000101 * t) * math.sin(dr * 2 * m) + 0.000290 * math.sin(dr * 3 * m)
+    longitude = (l0 + dl) * dr
+    return longitude - math.pi * 2 * math.floor(longitude / (math.pi * 2))
+
+
+def _sun_sector(day_number: int, tz: int) -> int:
+    """Cung hoàng đạo (0..11) của mặt trời lúc đầu ngày"""
+    return math.floor(_sun_longitude(day_number - 0.5 - tz / 24) / math.pi * 6)
+
+
+@lru_cache(maxsize=None)
+def _new_moon_day(k: int, tz: int) -> int:
+    return math.floor(_new_moon(k) + 0.5 + tz / 24)
+
+
+@lru_cache(maxsize=None)
+def _lunar_month11(yy: int, tz: int) -> int:
+    """Ngày bắt đầu tháng 11 âm lịch (tháng chứa đông chí) của năm yy"""
+    off = jd_from_date(31, 12, yy) - 2415021
+    k = math.floor(off / _SYNODIC_MONTH)
+    nm = _new_moon_day(k, tz)
+    if _sun_sector(nm, tz) >= 9:
+        nm = _new_moon_day(k - 1, tz)
+    return nm
+
+
+@lru_cache(maxsize=None)
+def _leap_month_offset(a11: int, tz: int) -> int:
+    """Vị trí tháng nhuận (tính từ tháng 11) trong năm âm có 13 tháng"""
+    k = math.floor((a11 - _JD_EPOCH_NEW_MOON) / _SYNODIC_MONTH + 0.5)
+    i = 1
+    arc = _sun_sector(_new_moon_day(k + i, tz), tz)
+    while True:
+        last = arc
+        i += 1
+        arc = _sun_sector(_new_moon_day(k + i, tz), tz)
+        if arc == last or i >= 14:
+            break
+    return i - 1
+
+
+def solar_to_lunar(dd: int, mm: int, yy: int, tz: int = TIMEZONE) -> Tuple[int, int, int, bool]:
+    """Dương lịch -> (ngày, tháng, năm, nhuận) âm lịch"""
+    day_number = jd_from_date(dd, mm, yy)
+    k = math.floor((day_number - _JD_EPOCH_NEW_MOON) / _SYNODIC_MONTH)
+    month_start = _new_moon_day(k + 1, tz)
+    if month_start > day_number:
+        month_start = _new_moon_day(k, tz)
+
+    a11 = _lunar_month11(yy, tz)
+    b11 = a11
+    if a11 >= month_start:
+        lunar_year = yy
+        a11 = _lunar_month11(yy - 1, tz)
+    else:
+        lunar_year = yy + 1
+        b11 = _lunar_month11(yy + 1, tz)
+
+    lunar_day = day_number - month_start + 1
+    diff = (month_start - a11) // 29
+    leap = False
+    lunar_month = diff + 11
+    if b11 - a11 > 365:
+        leap_diff = _leap_month_offset(a11, tz)
+        if diff >= leap_diff:
+            lunar_month = diff + 10
+            leap = diff == leap_diff
+    if lunar_month > 12:
+        lunar_month -= 12
+    if lunar_month >= 11 and diff < 4:
+        lunar_year -= 1
+    return lunar_day, lunar_month, lunar_year, leap
+
+
+def lunar_to_solar(lunar_day: int, lunar_month: int, lunar_year: int, leap: bool = False,
+                   tz: int = TIMEZONE) -> Optional[Tuple[int, int, int]]:
+    """Âm lịch -> (ngày, tháng, năm) dương lịch; None nếu năm đó không có tháng nhuận này"""
+    if lunar_month < 11:
+        a11 = _lunar_month11(lunar_year - 1, tz)
+        b11 = _lunar_month11(lunar_year, tz)
+    else:
+        a11 = _lunar_month11(lunar_year, tz)
+        b11 = _lunar_month11(lunar_year + 1, tz)
+
+    k = math.floor(0.5 + (a11 - _JD_EPOCH_NEW_MOON) / _SYNODIC_MONTH)
+    off = lunar_month - 11
+    if off < 0:
+        off += 12
+    if b11 - a11 > 365:
+        leap_off = _leap_month_offset(a11, tz)
+        leap_month = leap_off - 2
+        if leap_month < 0:
+            leap_month += 12
+        if leap and lunar_month != leap_month:
+            return None
+        if leap or off >= leap_off:
+            off += 1
+    elif leap:
+        return None
+
+    month_start = _new_moon_day(k + off, tz)
+    return jd_to_date(month_start + lunar_day - 1)
+
+
+def lunar_month_length(lunar_month: int, lunar_year: int, tz: int = TIMEZONE) -> int:
+    """Số ngày (29 hoặc 30) của tháng âm thường (không nhuận)"""
+    start = jd_from_date(*lunar_to_solar(1, lunar_month, lunar_year, tz=tz))
+    k = math.floor((start - _JD_EPOCH_NEW_MOON) / _SYNODIC_MONTH + 0.5)
+    return _new_moon_day(k + 1, tz) - start
+
+
+# ----------------------------------------------------------------------
+# Chỉ mục ngày giỗ
+# ----------------------------------------------------------------------
+
+def _valid_solar(year: int, month: int, day: int) -> bool:
+    try:
+        date(year, month, day)
+    except ValueError:
+        return False
+    return True
+
+
+def anniversary_of(date_info: Optional[Dict]) -> Optional[Dict]:
+    """Ngày âm cần cúng từ một ngày đã parse; None nếu thiếu ngày/tháng hoặc sai"""
+    if not date_info:
+        return None
+    year, month, day = date_info.get("year"), date_info.get("month"), date_info.get("day")
+    if not month or not day:
+        return None
+
+    if year:
+        if not _valid_solar(year, month, day):
+            return None
+        lunar_day, lunar_month, lunar_year, leap = solar_to_lunar(day, month, year)
+        return {"month": lunar_month, "day": lunar_day, "leap": leap,
+                "year": lunar_year, "basis": "solar"}
+
+    if not (1 <= month <= 12 and 1 <= day <= 30):
+        return None
+    return {"month": month, "day": day, "leap": False, "year": None, "basis": "lunar"}
+
+
+def observed_date(anniversary: Dict, lunar_year: int) -> date:
+    """Ngày dương lịch cúng giỗ trong năm âm lunar_year
+
+    Người mất vào tháng nhuận thì cúng vào tháng thường cùng số; ngày 30 ở
+    tháng thiếu thì cúng ngày 29.
+    """
+    month = anniversary["month"]
+    day = min(anniversary["day"], lunar_month_length(month, lunar_year))
+    dd, mm, yy = lunar_to_solar(day, month, lunar_year)
+    return date(yy, mm, dd)
+
+
+def build_anniversaries(persons: Dict[str, Dict]) -> List[Dict]:
+    """Danh sách ngày giỗ/an táng của mọi người (một lần duyệt)"""
+    entries = []
+    for pid, person in persons.items():
+        for field, kind in EVENT_FIELDS:
+            anniversary = anniversary_of(person.get(field))
+            if anniversary is None:
+                continue
+            # View public không có display_name: ghép lại từ họ và tên
+            name = person.get("display_name") or f"{person.get('surname', '')} {person.get('name', '')}".strip()
+            entries.append({
+                "id": pid,
+                "name": name,
+                "kind": kind,
+                **anniversary,
+            })
+    return entries
+
+
+def lunar_key(entry: Dict) -> str:
+    return f"{entry['month']:02d}-{entry['day']:02d}"
+
+
+def _compact(entry: Dict) -> Dict:
+    item = {"id": entry["id"], "name": entry["name"], "kind": entry["kind"], "basis": entry["basis"]}
+    if entry["leap"]:
+        item["leap"] = True
+    if entry["year"]:
+        item["year"] = entry["year"]
+    return item
+
+
+def build_calendar(entries: List[Dict], years: List[int]) -> Tuple[Dict, Dict]:
+    """(chỉ mục theo ngày âm, {"YYYY-MM": {"YYYY-MM-DD": [...]}}) cho các năm âm cho trước"""
+    lunar_index = defaultdict(list)
+    for entry in entries:
+        lunar_index[lunar_key(entry)].append(_compact(entry))
+
+    months = defaultdict(lambda: defaultdict(list))
+    for lunar_year in years:
+        for entry in entries:
+            observed = observed_date(entry, lunar_year)
+            item = _compact(entry)
+            item["lunar"] = f"{entry['day']}/{entry['month']}"
+            if entry["year"]:
+                item["nth"] = lunar_year - entry["year"]
+            months[observed.strftime("%Y-%m")][observed.isoformat()].append(item)
+
+    lunar_index = {key: lunar_index[key] for key in sorted(lunar_index)}
+    months = {
+        month: {day: days[day] for day in sorted(days)}
+        for month, days in sorted(months.items())
+    }
+    return lunar_index, months
+
+
+# ----------------------------------------------------------------------
+# iCalendar
+# ----------------------------------------------------------------------
+
+def _ics_escape(text: str) -> str:
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _ics_fold(line: str) -> str:
+    """Gập dòng dài hơn 75 byte (RFC 5545), không cắt giữa ký tự UTF-8"""
+    parts = []
+    current = ""
+    size = 0
+    limit = 75
+    for ch in line:
+        width = len(ch.encode("utf-8"))
+        if size + width > limit:
+            parts.append(current)
+            current = " "
+            size = 1
+        current += ch
+        size += width
+    parts.append(current)
+    return "\r\n".join(parts)
+
+
+def to_ics(months: Dict[str, Dict], stamp: datetime, calendar_name: str = "Ngày giỗ Tộc Đặng") -> str:
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Toc Dang Non Nuoc//Gia pha//VI",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{_ics_escape(calendar_name)}",
+    ]
+    dtstamp = stamp.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    for days in months.values():
+        for day, items in days.items():
+            start = date.fromisoformat(day)
+            end = start + timedelta(days=1)
+            for item in items:
+                summary = f"{EVENT_LABELS[item['kind']]} {item['name']}"
+                description = f"Ngày {item['lunar']} âm lịch"
+                if item.get("nth"):
+                    description += f", năm thứ {item['nth']}"
+                lines += [
+                    "BEGIN:VEVENT",
+                    f"UID:{item['id']}-{item['kind']}-{start.year}@tocdang",
+                    f"DTSTAMP:{dtstamp}",
+                    f"DTSTART;VALUE=DATE:{start.strftime('%Y%m%d')}",
+                    f"DTEND;VALUE=DATE:{end.strftime('%Y%m%d')}",
+                    f"SUMMARY:{_ics_escape(summary)}",
+                    f"DESCRIPTION:{_ics_escape(description)}",
+                    "TRANSP:TRANSPARENT",
+                    "END:VEVENT",
+                ]
+
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(_ics_fold(line) for line in lines) + "\r\n"
+
+
+def write_calendar(persons: Dict[str, Dict], output_dir: str, start_year: Optional[int] = None,
+                   years: int = CALENDAR_YEARS, calendar_name: str = "Ngày giỗ Tộc Đặng") -> Dict:
+    """Ghi calendar/index.json, các file theo tháng và gio.ics, trả về thông tin tóm tắt"""
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    now = datetime.now(timezone.utc)
+    if start_year is None:
+        start_year = now.year
+    lunar_years = list(range(start_year, start_year + years))
+
+    entries = build_anniversaries(persons)
+    lunar_index, months = build_calendar(entries, lunar_years)
+
+    for month, days in months.items():
+        with open(out / f"{month}.json", 'w', encoding='utf-8') as f:
+            json.dump(days, f, ensure_ascii=False, separators=(',', ':'))
+
+    # Xóa file tháng của các lần build trước không còn dùng
+    for old_file in out.glob("????-??.json"):
+        if old_file.stem not in months:
+            old_file.unlink()
+
+    meta = {
+        "timezone": f"UTC+{TIMEZONE}",
+        "lunar_years": lunar_years,
+        "months": sorted(months),
+        "count": len(entries),
+        "lunar": lunar_index,
+    }
+    with open(out / "index.json", 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(',', ':'))
+
+    with open(out / "gio.ics", 'w', encoding='utf-8', newline='') as f:
+        f.write(to_ics(months, now, calendar_name))
+
+    return {"entries": len(entries), "months": len(months), "days": len(lunar_index)}
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Đổi nhanh một ngày dương sang âm: python anniversary_calendar.py 2026-10-19
+    for arg in sys.argv[1:]:
+        d = date.fromisoformat(arg)
+        lunar_day, lunar_month, lunar_year, leap = solar_to_lunar(d.day, d.month, d.year)
+        print(f"{arg}: {lunar_day}/{lunar_month}{' (nhuận)' if leap else ''}/{lunar_year} âm lịch")
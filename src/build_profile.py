@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Đo thời gian và bộ nhớ cho từng giai đoạn của FamilyTreeConverter.run
+
+Dùng với --profile: in bảng tóm tắt, tùy chọn ghi JSON (--profile-json)
+và dữ liệu cProfile (--cprofile) để xem bằng pstats/snakeviz.
+
+Mặc định chỉ đo thời gian và RSS đỉnh (getrusage, gần như không tốn chi phí).
+tracemalloc làm chậm mọi lần cấp phát nhiều lần, nên bộ nhớ cấp phát theo
+giai đoạn chỉ được đo khi bật --profile-memory; khi đó thời gian các giai
+đoạn không còn so sánh được với lần chạy thường.
+"""
+
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Callable, List, Dict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak RSS của tiến trình (MB), None nếu hệ điều hành không hỗ trợ"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    if sys.platform == "darwin":
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+class StageProfiler:
+    """Ghi nhận thời gian, bộ nhớ đỉnh và số lượng xử lý của từng giai đoạn"""
+
+    def __init__(self, cprofile_file: Optional[str] = None, trace_memory: bool = False):
+        self.cprofile_file = cprofile_file
+        self.trace_memory = trace_memory
+        self.stages: List[Dict] = []
+        self._cprofile = None
+        self._started = None
+
+    def start(self):
+        """Bắt đầu đo (tracemalloc và cProfile nếu được bật)"""
+        self._started = time.perf_counter()
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.cprofile_file:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def stop(self):
+        """Dừng đo và ghi dữ liệu cProfile"""
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_file)
+            print(f"Đã ghi dữ liệu cProfile: {self.cprofile_file}")
+            self._cprofile = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name: str, count: Optional[Callable[[], int]] = None):
+        """Đo một giai đoạn; count() chỉ được gọi khi giai đoạn chạy xong không lỗi
+
+        Khi giai đoạn gặp lỗi, các biến mà count() dùng có thể chưa được gán;
+        gọi count() lúc đó sẽ che mất lỗi thật, nên chỉ ghi thời gian/bộ nhớ.
+        """
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            start_mem = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        entry = {"stage": name, "count": None}
+        try:
+            yield
+        except BaseException:
+            entry["failed"] = True
+            raise
+        else:
+            if count:
+                entry["count"] = count()
+        finally:
+            elapsed = time.perf_counter() - start
+            entry.update({"seconds": round(elapsed, 4), "traced_peak_mb": None, "traced_delta_mb": None})
+            if tracing:
+                current_mem, peak_mem = tracemalloc.get_traced_memory()
+                entry["traced_peak_mb"] = round((peak_mem - start_mem) / 1024 / 1024, 2)
+                entry["traced_delta_mb"] = round((current_mem - start_mem) / 1024 / 1024, 2)
+            entry["rss_peak_mb"] = peak_rss_mb()
+            self.stages.append(entry)
+
+    def summary(self) -> Dict:
+        """Tóm tắt dạng dict (dùng cho JSON)"""
+        total = time.perf_counter() - self._started if self._started else None
+        return {
+            "generated_at": datetime.now().isoformat(),
+            "total_seconds": round(total, 4) if total is not None else None,
+            "rss_peak_mb": peak_rss_mb(),
+            "trace_memory": self.trace_memory,
+            "stages": self.stages,
+        }
+
+    def report(self):
+        """In bảng thời gian theo giai đoạn"""
+        print("\n" + "=" * 60)
+        print("HIỆU NĂNG THEO GIAI ĐOẠN")
+        print("=" * 60)
+        # Không bật tracemalloc: cột bộ nhớ là RSS đỉnh của tiến trình tính đến hết giai đoạn
+        memory_key, memory_label = ("traced_peak_mb", "Peak (MB)") if self.trace_memory else ("rss_peak_mb", "RSS (MB)")
+        print(f"{'Giai đoạn':<16} {'Thời gian (s)':>14} {'Số lượng':>10} {memory_label:>10}")
+        for s in self.stages:
+            count = s["count"] if s["count"] is not None else "-"
+            memory = f"{s[memory_key]:.2f}" if s[memory_key] is not None else "-"
+            print(f"{s['stage']:<16} {s['seconds']:>14.3f} {count:>10} {memory:>10}")
+        summary = self.summary()
+        print(f"Tổng: {summary['total_seconds']:.3f}s, RSS đỉnh: {summary['rss_peak_mb'] or 0:.1f} MB")
+
+    def write_json(self, output_file: str):
+        """Ghi tóm tắt ra file JSON"""
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        print(f"Đã ghi báo cáo hiệu năng: {output_file}")
+
+
+class NullProfiler:
+    """Profiler rỗng khi không bật --profile (không tốn chi phí đo)"""
+
+    @contextmanager
+    def stage(self, name: str, count: Optional[Callable[[], int]] = None):
+        yield
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Quy tắc dòng họ: tên họ, cụ tổ, tên không hợp lệ, cách suy luận đời
+
+Các quy tắc trước đây được viết cứng trong code ("Đặng", "START", "Tộc Đặng
+Non Nước"...) nay nằm trong một file JSON, được biên dịch một lần thành các
+hàm kiểm tra nhanh (regex họ, tập tên không hợp lệ, chính sách kế thừa đời).
+Cùng một bộ công cụ dùng được cho file xuất của dòng họ khác:
+
+    {
+        "family_name": "Tộc Đặng Non Nước",
+        "calendar_name": "Ngày giỗ Tộc Đặng",
+        "founder_id": "START",
+        "surnames": ["Đặng"],
+        "invalid_names": ["A", "B", "C", "Y", "Vợ"],
+        "lineage": {"father": "always", "mother": "clan", "child": "always"}
+    }
+
+Chính sách kế thừa đời ("lineage") cho từng nguồn suy luận:
+    always  luôn suy luận từ người thân này
+    clan    chỉ khi người thân này mang họ của dòng họ
+    never   không bao giờ
+Các khóa không ghi trong file giữ giá trị mặc định ở trên.
+"""
+
+import json
+import re
+from typing import Optional, Dict, List, Any, Tuple
+
+from text_normalize import nfc
+
+LINEAGE_SOURCES = ("father", "mother", "child")
+LINEAGE_POLICIES = ("always", "clan", "never")
+
+DEFAULT_RULES = {
+    "family_name": "Tộc Đặng Non Nước",
+    "calendar_name": "Ngày giỗ Tộc Đặng",
+    "founder_id": "START",
+    "surnames": ["Đặng"],
+    "invalid_names": ["A", "B", "C", "Y", "Vợ"],
+    "lineage": {"father": "always", "mother": "clan", "child": "always"},
+}
+
+
+class ClanRules:
+    """Quy tắc dòng họ đã biên dịch"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = {**DEFAULT_RULES, **(config or {})}
+        unknown = sorted(set(config) - set(DEFAULT_RULES))
+        if unknown:
+            raise ValueError(f"Khóa quy tắc không hợp lệ: {', '.join(unknown)}")
+
+        self.family_name: str = config["family_name"]
+        self.calendar_name: str = config["calendar_name"]
+        self.founder_id: str = config["founder_id"]
+        self.surnames: List[str] = [nfc(s) for s in config["surnames"] if s]
+        if not self.surnames:
+            raise ValueError("Cần ít nhất một tên họ trong 'surnames'")
+        self.invalid_names = frozenset(nfc(n) for n in config["invalid_names"])
+
+        self.lineage: Dict[str, str] = {**DEFAULT_RULES["lineage"], **config["lineage"]}
+        for source, policy in self.lineage.items():
+            if source not in LINEAGE_SOURCES or policy not in LINEAGE_POLICIES:
+                raise ValueError(f"Chính sách kế thừa không hợp lệ: {source}={policy} "
+                                 f"(nguồn: {', '.join(LINEAGE_SOURCES)}; chính sách: {', '.join(LINEAGE_POLICIES)})")
+
+        # Họ xuất hiện ở bất kỳ vị trí nào trong trường họ ("Đặng Văn", "Lê Đặng Thị"...)
+        self._surname_pattern = re.compile("|".join(re.escape(s) for s in self.surnames))
+        self._surname_cache: Dict[str, bool] = {}
+
+    @property
+    def surname(self) -> str:
+        """Tên họ chính (dùng trong báo cáo)"""
+        return self.surnames[0]
+
+    def is_clan_surname(self, surname: Optional[str]) -> bool:
+        """Trường họ có mang họ của dòng họ không (kết quả được cache theo chuỗi)"""
+        if not surname:
+            return False
+        result = self._surname_cache.get(surname)
+        if result is None:
+            result = self._surname_pattern.search(nfc(surname)) is not None
+            self._surname_cache[surname] = result
+        return result
+
+    def is_clan_member(self, person: Dict) -> bool:
+        return self.is_clan_surname(person.get("surname"))
+
+    def is_invalid_name(self, name: Optional[str]) -> bool:
+        """Tên trống hoặc nằm trong danh sách tên tạm (A, B, Vợ...)"""
+        return not name or nfc(name) in self.invalid_names
+
+    def inherits(self, source: str, relative: Dict) -> bool:
+        """Có được suy luận đời từ người thân `relative` (nguồn: father/mother/child) không"""
+        policy = self.lineage[source]
+        if policy == "always":
+            return True
+        if policy == "clan":
+            return self.is_clan_member(relative)
+        return False
+
+    def generation_links(self, persons: Dict[str, Dict]) -> List[Tuple[str, str]]:
+        """Các liên kết (cha/mẹ, con) được dùng để suy luận đời theo một trong hai chiều"""
+        links = []
+        for pid, person in persons.items():
+            for source, key in (("father", "father_id"), ("mother", "mother_id")):
+                parent_id = person.get(key)
+                if not parent_id or parent_id == pid or parent_id not in persons:
+                    continue
+                if self.inherits(source, persons[parent_id]) or self.inherits("child", person):
+                    links.append((parent_id, pid))
+        return links
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "family_name": self.family_name,
+            "calendar_name": self.calendar_name,
+            "founder_id": self.founder_id,
+            "surnames": list(self.surnames),
+            "invalid_names": sorted(self.invalid_names),
+            "lineage": dict(self.lineage),
+        }
+
+
+def load_rules(path: Optional[str] = None) -> ClanRules:
+    """Đọc quy tắc từ file JSON; không có file thì dùng quy tắc mặc định (Tộc Đặng)"""
+    if path is None:
+        return ClanRules()
+    with open(path, 'r', encoding='utf-8') as f:
+        return ClanRules(json.load(f))
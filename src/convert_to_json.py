@@ -10,211 +10,347 @@ Ngày tạo: 20/01/2026
 
 import re
 import json
+import sys
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple, Iterable, Sequence, Set
+
+from build_profile import StageProfiler, NullProfiler
+from tree_layout import layout_tree, build_quadtree, NODE_WIDTH, LEVEL_HEIGHT
+from sqlite_export import export_sqlite
+from search_index import SearchIndex
+from ancestor_paths import AncestorPaths
+from sibling_order import order_siblings
+from anniversary_calendar import write_calendar
+from privacy_projection import VIEWS, DEFAULT_VIEWS, ProjectedRecords, get_projection, parse_views, view_metadata, write_views
+from payload_budget import PayloadBudgets, load_budgets, print_report as print_budget_report
+from clan_rules import ClanRules, load_rules
+from familyecho_file import FamilyEchoFile
+from family_analytics import compute_subtree_aggregates, person_metrics, build_analytics
+from generation_solver import solve_generations
+from family_date import FamilyDate, DateIndex, parse_family_date, from_dict, sort_key, ALL
+from delta_export import load_previous_build, compute_delta, write_patch
+from text_normalize import nfc, fold_text, tokenize
+from note_extractor import scan_note, generation_from_scan, value_from_scan, extra_tags_from_scan
 
 
 class FamilyTreeConverter:
     """Chuyển đổi dữ liệu FamilyScript sang JSON"""
 
-    def __init__(self, input_file: str):
+    def __init__(self, input_file: str, line_cache: Optional[Dict[str, Dict]] = None,
+                 rules: Optional[ClanRules] = None):
         self.input_file = input_file
+        # Quy tắc dòng họ (họ, cụ tổ, cách suy luận đời), mặc định là Tộc Đặng
+        self.rules = rules if rules is not None else ClanRules()
+        # Cache dòng -> bản ghi đã parse, dùng lại giữa các lần build (watch mode)
+        self.line_cache = line_cache
         self.persons = {}
         self.families = {}
         self.children_of = defaultdict(list)
         self.spouse_of = defaultdict(list)
+        # Chỉ mục người -> gia đình theo vai trò ("husband", "wife", "child")
+        self.family_index: Dict[str, Dict[str, List[str]]] = {}
+        # Chỉ mục tên đã bỏ dấu: name_key -> [id], từ -> [id]
+        self.name_key_index = defaultdict(list)
+        self.name_token_index = defaultdict(list)
+        self._subtree_summaries = None
+        # Cây tiền tố đường dẫn tổ tiên (tạo trong build_graph)
+        self.ancestor_paths: Optional[AncestorPaths] = None
+        # Cha/mẹ -> các con theo thứ tự sinh suy luận (tạo trong build_graph)
+        self.sibling_order: Optional[Dict[str, List[str]]] = None
+        # Lời giải ràng buộc đời và các ghi chú đời lúc parse (tạo khi cần)
+        self._generation_solution: Optional[Dict] = None
+        self._annotated_generations: Optional[Dict[str, int]] = None
+        # Ngày đã đóng gói và chỉ mục theo ngày (tạo khi cần, sau khi load)
+        self._dates: Dict[str, Dict[str, Optional[FamilyDate]]] = {}
+        self._date_indexes: Dict[str, DateIndex] = {}
+        # Kết quả kiểm tra ngân sách dữ liệu web của lần xuất gần nhất
+        self.budget_report: Optional[Dict] = None
 
     def parse_date(self, date_str: str) -> Optional[Dict]:
-        """Parse date string từ FamilyScript (YYYYMMDD format)"""
-        if not date_str or len(date_str) < 4:
-            return None
-
-        try:
-            year = int(date_str[:4]) if len(date_str) >= 4 else None
-            month = int(date_str[4:6]) if len(date_str) >= 6 else None
-            day = int(date_str[6:8]) if len(date_str) >= 8 else None
+        """Parse date string từ FamilyScript (YYYYMMDD format)
 
-            return {
-                "year": year,
-                "month": month,
-                "day": day,
-                "display": f"{day or '??'}/{month or '??'}/{year}" if year else None
-            }
-        except ValueError:
-            return None
+        Ngày đã được kiểm tra (tháng/ngày sai bị bỏ), dict trả về dùng chung
+        cho mọi người có cùng giá trị nên không được sửa trực tiếp.
+        """
+        date = parse_family_date(date_str)
+        return date.to_dict() if date is not None else None
 
     def extract_generation(self, text: str) -> Optional[int]:
         """Trích xuất thông tin đời từ text"""
-        if not text:
-            return None
-
-        # Pattern: "Đời thứ X" hoặc "đời thứ X"
-        patterns = [
-            r'[Đđ]ời\s*[Tt]hứ\s*(\d+)',
-            r'[Đđ]ời\s*(\d+)',
-            r'[Gg]en(?:eration)?\s*(\d+)',
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text)
-            if match:
-                return int(match.group(1))
-
-        return None
+        return generation_from_scan(scan_note(text))
 
     def extract_phai(self, text: str) -> Optional[str]:
         """Trích xuất thông tin Phái"""
-        if not text:
-            return None
-
-        match = re.search(r'[Pp]hái\s+(\w+)', text)
-        return match.group(1) if match else None
+        return value_from_scan(scan_note(text), "phai")
 
     def extract_chi(self, text: str) -> Optional[str]:
         """Trích xuất thông tin Chi"""
-        if not text:
+        return value_from_scan(scan_note(text), "chi")
+
+    def parse_line(self, line: str) -> Optional[Dict]:
+        """Parse một dòng FamilyScript thành bản ghi người (None nếu không phải dòng người)"""
+        line = nfc(line.strip())
+        if not line.startswith('i'):
             return None
 
-        match = re.search(r'[Cc]hi\s+(\d+|\w+)', text)
-        return match.group(1) if match else None
+        # Extract ID từ đầu dòng
+        match = re.match(r'^i([A-Z0-9]+)\t', line)
+        if not match:
+            return None
 
-    def parse_familyscript(self):
-        """Parse file FamilyScript"""
-        print(f"Đang đọc file: {self.input_file}")
+        person_id = match.group(1)
+        person = {
+            "id": person_id,
+            "name": "",
+            "surname": "",
+            "surname_at_birth": "",
+            "display_name": "",
+            "name_key": "",
+            "name_tokens": [],
+            "gender": None,
+            "birth_date": None,
+            "birth_place": None,
+            "death_date": None,
+            "death_place": None,
+            "is_deceased": False,
+            "burial_place": None,
+            "burial_date": None,
+            "generation": None,
+            "generation_source": None,
+            "phai": None,
+            "chi": None,
+            "father_id": None,
+            "mother_id": None,
+            "spouse_ids": [],
+            "children_ids": [],
+            "address": None,
+            "email": None,
+            "phone": None,
+            "photo": None,
+            "profession": None,
+            "employer": None,
+            "interests": None,
+            "notes": "",
+            "activities": "",
+            "note_tags": {},
+        }
 
-        with open(self.input_file, 'r', encoding='utf-8') as f:
-            content = f.read()
+        # Parse các trường
+        fields = line.split('\t')
+        notes_parts = []
 
-        # Mỗi dòng bắt đầu bằng 'i' là một người
-        for line in content.split('\n'):
-            line = line.strip()
-            if not line.startswith('i'):
+        for field in fields[1:]:
+            if not field:
                 continue
 
-            # Extract ID từ đầu dòng
-            match = re.match(r'^i([A-Z0-9]+)\t', line)
-            if not match:
-                continue
+            prefix = field[0]
+            value = field[1:] if len(field) > 1 else ""
+
+            if prefix == 'p':
+                person["name"] = value
+            elif prefix == 'l':
+                person["surname"] = value
+            elif prefix == 'q':
+                person["surname_at_birth"] = value
+            elif prefix == 'g':
+                person["gender"] = "male" if value == 'm' else "female" if value == 'f' else None
+            elif prefix == 'b':
+                person["birth_date"] = self.parse_date(value)
+            elif prefix == 'd':
+                person["death_date"] = self.parse_date(value)
+            elif prefix == 'z' and value == '1':
+                person["is_deceased"] = True
+            elif prefix == 'f':
+                person["father_id"] = value
+            elif prefix == 'm' and len(value) > 0 and value[0].isupper():
+                person["mother_id"] = value
+            elif prefix == 's':
+                if value and value not in person["spouse_ids"]:
+                    person["spouse_ids"].append(value)
+            elif prefix == 'a':
+                person["address"] = value
+            elif prefix == 'e':
+                person["email"] = value
+            elif prefix == 'u':
+                person["phone"] = value
+            elif prefix == 'r':
+                person["photo"] = value
+            elif prefix == 'o':
+                notes_parts.append(value)
+                # Quét ghi chú một lần: đời, phái, chi và các tag khác
+                scan = scan_note(value)
+                gen = generation_from_scan(scan)
+                if gen:
+                    person["generation"] = gen
+                    person["generation_source"] = "explicit"
+                phai = value_from_scan(scan, "phai")
+                if phai:
+                    person["phai"] = phai
+                chi = value_from_scan(scan, "chi")
+                if chi:
+                    person["chi"] = chi
+                for tag, tag_value in extra_tags_from_scan(scan).items():
+                    person["note_tags"].setdefault(tag, tag_value)
+            elif prefix == 'A':
+                person["activities"] = value
+                # Also check for generation in activities
+                scan = scan_note(value)
+                gen = generation_from_scan(scan)
+                if gen and not person["generation"]:
+                    person["generation"] = gen
+                    person["generation_source"] = "explicit"
+                for tag, tag_value in extra_tags_from_scan(scan).items():
+                    person["note_tags"].setdefault(tag, tag_value)
+            elif prefix == 'v':
+                # Birth place
+                person["birth_place"] = value
+            elif prefix == 'U':
+                # Burial place
+                person["burial_place"] = value
+            elif prefix == 'F':
+                # Burial date (format: YYYYMMDD or 0000MMDD)
+                person["burial_date"] = self.parse_date(value)
+            elif prefix == 'I':
+                # Interests
+                person["interests"] = value
+            elif prefix == 'j':
+                # Profession/Occupation
+                person["profession"] = value
+            elif prefix == 'E':
+                # Employer/Position
+                person["employer"] = value
+
+        person["notes"] = " | ".join(notes_parts)
+        person["display_name"] = f"{person['surname']} {person['name']}".strip()
+        person["name_key"] = fold_text(person["display_name"])
+        # Cùng bộ tách từ với truy vấn find_by_name ("(doi", "mai(ly)" -> từ riêng)
+        person["name_tokens"] = list(dict.fromkeys(tokenize(person["name_key"])))
+        return person
+
+    def parse_familyscript(self, jobs: Optional[int] = None):
+        """Parse file FamilyScript"""
+        print(f"Đang đọc file: {self.input_file}")
 
-            person_id = match.group(1)
-            person = {
-                "id": person_id,
-                "name": "",
-                "surname": "",
-                "surname_at_birth": "",
-                "gender": None,
-                "birth_date": None,
-                "birth_place": None,
-                "death_date": None,
-                "death_place": None,
-                "is_deceased": False,
-                "burial_place": None,
-                "burial_date": None,
-                "generation": None,
-                "generation_source": None,
-                "phai": None,
-                "chi": None,
-                "father_id": None,
-                "mother_id": None,
-                "spouse_ids": [],
-                "children_ids": [],
-                "address": None,
-                "email": None,
-                "phone": None,
-                "photo": None,
-                "profession": None,
-                "employer": None,
-                "interests": None,
-                "notes": "",
-                "activities": "",
-            }
+        # mmap file, chỉ giải mã các dòng người trong khối FamilyScript
+        with FamilyEchoFile(self.input_file) as reader:
+            if jobs and jobs > 1:
+                self._parse_parallel(jobs, reader.line_chunks(jobs * CHUNKS_PER_JOB))
+            elif self.line_cache is not None:
+                self._parse_cached(reader.person_text())
+            else:
+                # Mỗi dòng bắt đầu bằng 'i' là một người
+                for line in reader.person_text():
+                    person = self.parse_line(line)
+                    if person:
+                        self.persons[person["id"]] = person
+
+        self.build_name_index()
+        print(f"Đã đọc {len(self.persons)} người")
 
-            # Parse các trường
-            fields = line.split('\t')
-            notes_parts = []
+    def _parse_cached(self, lines: Iterable[str]):
+        """Chỉ parse các dòng mới/đã sửa, dùng lại bản ghi cũ cho dòng không đổi"""
+        cache = self.line_cache
+        seen = {}
+        reused = 0
 
-            for field in fields[1:]:
-                if not field:
-                    continue
+        for line in lines:
+            key = line.strip()
+            if not key.startswith('i'):
+                continue
 
-                prefix = field[0]
-                value = field[1:] if len(field) > 1 else ""
-
-                if prefix == 'p':
-                    person["name"] = value
-                elif prefix == 'l':
-                    person["surname"] = value
-                elif prefix == 'q':
-                    person["surname_at_birth"] = value
-                elif prefix == 'g':
-                    person["gender"] = "male" if value == 'm' else "female" if value == 'f' else None
-                elif prefix == 'b':
-                    person["birth_date"] = self.parse_date(value)
-                elif prefix == 'd':
-                    person["death_date"] = self.parse_date(value)
-                elif prefix == 'z' and value == '1':
-                    person["is_deceased"] = True
-                elif prefix == 'f':
-                    person["father_id"] = value
-                elif prefix == 'm' and len(value) > 0 and value[0].isupper():
-                    person["mother_id"] = value
-                elif prefix == 's':
-                    if value and value not in person["spouse_ids"]:
-                        person["spouse_ids"].append(value)
-                elif prefix == 'a':
-                    person["address"] = value
-                elif prefix == 'e':
-                    person["email"] = value
-                elif prefix == 'u':
-                    person["phone"] = value
-                elif prefix == 'r':
-                    person["photo"] = value
-                elif prefix == 'o':
-                    notes_parts.append(value)
-                    # Extract generation from notes
-                    gen = self.extract_generation(value)
-                    if gen:
-                        person["generation"] = gen
-                        person["generation_source"] = "explicit"
-                    # Extract phai/chi
-                    phai = self.extract_phai(value)
-                    if phai:
-                        person["phai"] = phai
-                    chi = self.extract_chi(value)
-                    if chi:
-                        person["chi"] = chi
-                elif prefix == 'A':
-                    person["activities"] = value
-                    # Also check for generation in activities
-                    gen = self.extract_generation(value)
-                    if gen and not person["generation"]:
-                        person["generation"] = gen
-                        person["generation_source"] = "explicit"
-                elif prefix == 'v':
-                    # Birth place
-                    person["birth_place"] = value
-                elif prefix == 'U':
-                    # Burial place
-                    person["burial_place"] = value
-                elif prefix == 'F':
-                    # Burial date (format: YYYYMMDD or 0000MMDD)
-                    person["burial_date"] = self.parse_date(value)
-                elif prefix == 'I':
-                    # Interests
-                    person["interests"] = value
-                elif prefix == 'j':
-                    # Profession/Occupation
-                    person["profession"] = value
-                elif prefix == 'E':
-                    # Employer/Position
-                    person["employer"] = value
-
-            person["notes"] = " | ".join(notes_parts)
-            self.persons[person_id] = person
+            parsed = cache.get(key)
+            if parsed is None:
+                parsed = self.parse_line(key)
+                if parsed is None:
+                    continue
+            else:
+                reused += 1
+            seen[key] = parsed
+
+            # Bản sao để các bước sau không sửa vào bản ghi trong cache
+            self.persons[parsed["id"]] = dict(
+                parsed,
+                spouse_ids=list(parsed["spouse_ids"]),
+                children_ids=list(parsed["children_ids"]),
+                note_tags=dict(parsed["note_tags"]),
+            )
+
+        cache.clear()
+        cache.update(seen)
+        print(f"Dùng lại {reused} dòng không đổi, parse {len(seen) - reused} dòng mới")
+
+    def build_name_index(self):
+        """Xây dựng chỉ mục tên đã bỏ dấu để tra cứu bằng dictionary"""
+        self.name_key_index.clear()
+        self.name_token_index.clear()
 
-        print(f"Đã đọc {len(self.persons)} người")
+        for pid, person in self.persons.items():
+            key = person["name_key"]
+            self.name_key_index[key].append(pid)
+            for token in person["name_tokens"]:
+                self.name_token_index[token].append(pid)
+
+    def find_by_name(self, query: str, exact: bool = False) -> List[str]:
+        """Tìm ID theo tên (không phân biệt dấu, hoa/thường, NFC/NFD)
+
+        exact=True: khớp nguyên cả họ tên; ngược lại trả về những người có
+        tên chứa tất cả các từ trong query.
+        """
+        if exact:
+            return list(self.name_key_index.get(fold_text(query), []))
+
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        postings = sorted((self.name_token_index.get(t, []) for t in tokens), key=len)
+        matches = set(postings[0])
+        for posting in postings[1:]:
+            matches.intersection_update(posting)
+        return [pid for pid in postings[0] if pid in matches]
+
+    def dates(self, field: str = "birth_date") -> Dict[str, Optional[FamilyDate]]:
+        """id -> FamilyDate của một trường ngày (birth_date, death_date, burial_date)"""
+        if field not in self._dates:
+            self._dates[field] = {pid: from_dict(p[field]) for pid, p in self.persons.items()}
+        return self._dates[field]
+
+    def date_index(self, field: str = "birth_date") -> DateIndex:
+        """Chỉ mục đã sắp xếp theo ngày, chia nhóm theo đời"""
+        if field not in self._date_indexes:
+            generations = {pid: p["generation"] for pid, p in self.persons.items()}
+            self._date_indexes[field] = DateIndex.build(self.dates(field), generations)
+        return self._date_indexes[field]
+
+    def reset_derived_caches(self):
+        """Bỏ các ngày/chỉ mục ngày đã cache (sau khi sửa trường của người tại chỗ)"""
+        self._dates.clear()
+        self._date_indexes.clear()
+
+    def find_by_date_range(self, start_year: int, end_year: int, field: str = "birth_date",
+                           generation: Optional[int] = None) -> List[str]:
+        """Người có ngày (mặc định ngày sinh) trong các năm start_year..end_year, có thể lọc theo đời"""
+        group = ALL if generation is None else generation
+        return self.date_index(field).between(start_year, end_year, group)
+
+    def _parse_parallel(self, jobs: int, chunks: List[Tuple[int, int]]):
+        """Parse song song theo các khối dòng (khoảng byte), gộp kết quả theo đúng thứ tự file"""
+        print(f"Parse song song: {len(chunks)} khối, {jobs} tiến trình")
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = executor.map(
+                _parse_chunk,
+                [self.input_file] * len(chunks),
+                [start for start, _ in chunks],
+                [end for _, end in chunks],
+            )
+            # executor.map giữ thứ tự khối nên kết quả giống hệt chế độ tuần tự
+            for persons in results:
+                for person in persons:
+                    self.persons[person["id"]] = person
 
     def build_relationships(self):
         """Xây dựng các mối quan hệ gia đình"""
@@ -227,96 +363,225 @@ class FamilyTreeConverter:
             if person["mother_id"] and person["mother_id"] in self.persons:
                 self.children_of[person["mother_id"]].append(pid)
 
-            # Build spouse index
+            # Build spouse index (hai chiều, kể cả khi chỉ một bên khai)
             for spouse_id in person["spouse_ids"]:
-                if spouse_id in self.persons:
+                if spouse_id in self.persons and spouse_id != pid:
                     self.spouse_of[pid].append(spouse_id)
+                    self.spouse_of[spouse_id].append(pid)
+
+        for spouse_id, spouses in self.spouse_of.items():
+            self.spouse_of[spouse_id] = list(dict.fromkeys(spouses))
 
-        # Update children_ids in person records
+        # Update children_ids in person records (giữ thứ tự để các lần build ổn định)
         for parent_id, children in self.children_of.items():
             if parent_id in self.persons:
-                self.persons[parent_id]["children_ids"] = list(set(children))
+                self.persons[parent_id]["children_ids"] = list(dict.fromkeys(children))
 
-        # Build family units
-        family_id = 1
-        processed_couples = set()
-
-        for pid, person in self.persons.items():
-            if person["father_id"] and person["mother_id"]:
-                couple_key = tuple(sorted([person["father_id"], person["mother_id"]]))
-                if couple_key not in processed_couples:
-                    processed_couples.add(couple_key)
-
-                    # Find all children of this couple
-                    children = []
-                    for child_id, child in self.persons.items():
-                        if (child["father_id"] == person["father_id"] and
-                            child["mother_id"] == person["mother_id"]):
-                            children.append(child_id)
-
-                    self.families[f"F{family_id}"] = {
-                        "id": f"F{family_id}",
-                        "husband_id": person["father_id"] if self.persons.get(person["father_id"], {}).get("gender") == "male" else person["mother_id"],
-                        "wife_id": person["mother_id"] if self.persons.get(person["mother_id"], {}).get("gender") == "female" else person["father_id"],
-                        "children_ids": children
-                    }
-                    family_id += 1
+        self.build_families()
+        self.build_family_index()
 
         print(f"Đã xây dựng {len(self.families)} gia đình")
 
-    def propagate_generations(self):
-        """Suy luận thông tin đời từ liên kết cha-con"""
-        print("Đang suy luận thông tin đời...")
+    def _couple_roles(self, father_id: Optional[str], mother_id: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """(husband_id, wife_id): cha là chồng, mẹ là vợ, trừ khi giới tính ghi ngược"""
+        father_gender = self.persons.get(father_id, {}).get("gender")
+        mother_gender = self.persons.get(mother_id, {}).get("gender")
+        if father_gender == "female" or mother_gender == "male":
+            return mother_id, father_id
+        return father_id, mother_id
 
-        changes = True
-        iterations = 0
-        max_iterations = 20
+    def build_families(self):
+        """Các gia đình, gom trong một lượt (không quét lại toàn bộ cho mỗi cặp)
 
-        while changes and iterations < max_iterations:
-            changes = False
-            iterations += 1
+        Thứ tự đánh số: các cặp có con chung (theo người con đầu tiên), rồi các
+        cặp vợ chồng chưa có con chung, rồi cha/mẹ đơn thân (con chỉ ghi một
+        bên cha hoặc mẹ).
+        """
+        couples: Dict[Tuple[str, str], Dict] = {}
+        single_parents: Dict[str, List[str]] = {}
 
-            for pid, person in self.persons.items():
-                if person["generation"] is not None:
-                    continue
+        for pid, person in self.persons.items():
+            father_id, mother_id = person["father_id"], person["mother_id"]
+            if father_id and mother_id:
+                key = tuple(sorted((father_id, mother_id)))
+                if key not in couples:
+                    couples[key] = {"roles": self._couple_roles(father_id, mother_id), "children": []}
+                couples[key]["children"].append(pid)
+            elif father_id or mother_id:
+                parent_id = father_id or mother_id
+                if parent_id in self.persons and parent_id != pid:
+                    single_parents.setdefault(parent_id, []).append(pid)
+
+        # Vợ chồng đã khai nhưng chưa có con chung
+        for pid in self.persons:
+            for spouse_id in self.spouse_of.get(pid, ()):
+                key = tuple(sorted((pid, spouse_id)))
+                if key not in couples:
+                    roles = (pid, spouse_id) if self.persons[pid]["gender"] != "female" else (spouse_id, pid)
+                    couples[key] = {"roles": self._couple_roles(*roles), "children": []}
+
+        units = [(couple["roles"], couple["children"]) for couple in couples.values()]
+        for parent_id, children in single_parents.items():
+            roles = (None, parent_id) if self.persons[parent_id]["gender"] == "female" else (parent_id, None)
+            units.append((roles, children))
+
+        for number, ((husband_id, wife_id), children) in enumerate(units, 1):
+            family_id = f"F{number}"
+            self.families[family_id] = {
+                "id": family_id,
+                "husband_id": husband_id,
+                "wife_id": wife_id,
+                "children_ids": children,
+            }
 
-                # Từ cha
-                if person["father_id"] and person["father_id"] in self.persons:
-                    father = self.persons[person["father_id"]]
-                    if father["generation"] is not None:
-                        person["generation"] = father["generation"] + 1
-                        person["generation_source"] = f"inferred_from_father:{father['id']}"
-                        changes = True
-                        continue
+    def build_family_index(self):
+        """Chỉ mục người -> gia đình (vai trò chồng/vợ/con), gắn vào từng người:
+        spouse_family_ids (gia đình làm chồng/vợ) và parent_family_id (gia đình làm con)"""
+        self.family_index = {pid: {"husband": [], "wife": [], "child": []} for pid in self.persons}
+        for family_id, family in self.families.items():
+            for role in ("husband", "wife"):
+                member = family[f"{role}_id"]
+                if member in self.family_index:
+                    self.family_index[member][role].append(family_id)
+            for child_id in family["children_ids"]:
+                self.family_index[child_id]["child"].append(family_id)
 
-                # Từ mẹ (nếu họ Đặng)
-                if person["mother_id"] and person["mother_id"] in self.persons:
-                    mother = self.persons[person["mother_id"]]
-                    if mother["generation"] is not None and "Đặng" in mother.get("surname", ""):
-                        person["generation"] = mother["generation"] + 1
-                        person["generation_source"] = f"inferred_from_mother:{mother['id']}"
-                        changes = True
+        for pid, person in self.persons.items():
+            roles = self.family_index[pid]
+            person["spouse_family_ids"] = roles["husband"] + roles["wife"]
+            person["parent_family_id"] = roles["child"][0] if roles["child"] else None
+
+    def families_of(self, person_id: str, role: Optional[str] = None) -> List[str]:
+        """Các gia đình của một người, theo vai trò (husband/wife/child) hoặc mọi vai trò"""
+        roles = self.family_index.get(person_id)
+        if roles is None:
+            return []
+        if role is not None:
+            return roles[role]
+        return roles["husband"] + roles["wife"] + roles["child"]
+
+    def spouses(self, person_id: str) -> List[str]:
+        """Vợ/chồng: người cùng làm chủ các gia đình của person_id"""
+        result = []
+        for family_id in self.families_of(person_id, "husband") + self.families_of(person_id, "wife"):
+            family = self.families[family_id]
+            for partner in (family["husband_id"], family["wife_id"]):
+                if partner and partner != person_id and partner in self.persons and partner not in result:
+                    result.append(partner)
+        return result
+
+    def siblings(self, person_id: str) -> List[str]:
+        """Anh chị em ruột (cùng gia đình cha mẹ)"""
+        result = []
+        for family_id in self.families_of(person_id, "child"):
+            result.extend(c for c in self.families[family_id]["children_ids"] if c != person_id)
+        return result
+
+    def half_siblings(self, person_id: str) -> List[str]:
+        """Anh chị em cùng cha khác mẹ hoặc cùng mẹ khác cha"""
+        own = self.families_of(person_id, "child")
+        result = []
+        for family_id in own:
+            family = self.families[family_id]
+            for parent_id in (family["husband_id"], family["wife_id"]):
+                for other_id in self.families_of(parent_id, "husband") + self.families_of(parent_id, "wife"):
+                    if other_id in own:
                         continue
+                    result.extend(c for c in self.families[other_id]["children_ids"]
+                                  if c != person_id and c not in result)
+        return result
 
-                # Từ con
-                for child_id in self.children_of.get(pid, []):
-                    child = self.persons[child_id]
-                    if child["generation"] is not None:
-                        person["generation"] = child["generation"] - 1
-                        person["generation_source"] = f"inferred_from_child:{child['id']}"
-                        changes = True
-                        break
+    def annotated_generations(self) -> Dict[str, int]:
+        """Đời ghi trong ghi chú ("Đời thứ N") lúc parse, trước khi lời giải ghi đè (cache)"""
+        if self._annotated_generations is None:
+            self._annotated_generations = {pid: p["generation"] for pid, p in self.persons.items()
+                                           if p["generation_source"] == "explicit"}
+        return self._annotated_generations
+
+    def propagate_generations(self):
+        """Gán đời cho mọi người từ lời giải ràng buộc đời (solve_generations)
+
+        Liên kết và ghi chú được giải đồng thời nên đời xuất ra luôn khớp với
+        báo cáo mâu thuẫn: ghi chú bị lời giải bác bỏ được thay bằng đời theo
+        đa số ghi chú ("annotation_conflict:N", N là đời đã ghi); người không
+        nối tới ghi chú nào giữ đời None.
+        """
+        print("Đang suy luận thông tin đời...")
+
+        annotated = self.annotated_generations()
+        solution = self.solve_generations()
+        generations = solution["generations"]
+        links = set(self.generation_links())
+
+        for pid, person in self.persons.items():
+            generation = generations.get(pid)
+            person["generation"] = generation
+            if pid in annotated:
+                person["generation_source"] = ("explicit" if annotated[pid] == generation
+                                               else f"annotation_conflict:{annotated[pid]}")
+            elif generation is None:
+                person["generation_source"] = None
+            else:
+                person["generation_source"] = self._inferred_from(pid, generation, generations, links)
 
         # Statistics
         explicit = sum(1 for p in self.persons.values() if p["generation_source"] == "explicit")
         inferred = sum(1 for p in self.persons.values() if p["generation_source"] and p["generation_source"].startswith("inferred"))
         unknown = sum(1 for p in self.persons.values() if p["generation"] is None)
 
-        print(f"Hoàn thành sau {iterations} vòng lặp:")
+        print(f"Đã giải {solution['components']} thành phần liên thông:")
         print(f"  - Rõ ràng: {explicit}")
         print(f"  - Suy luận: {inferred}")
+        print(f"  - Ghi chú mâu thuẫn (đã sửa theo lời giải): {len(solution['conflicts'])}")
         print(f"  - Không xác định: {unknown}")
 
+    def _inferred_from(self, pid: str, generation: int, generations: Dict[str, int],
+                       links: Set[Tuple[str, str]]) -> str:
+        """Nguồn suy luận của một người: cha, mẹ rồi con có đời khớp qua một liên kết đã dùng"""
+        person = self.persons[pid]
+        for source, key in (("father", "father_id"), ("mother", "mother_id")):
+            parent_id = person[key]
+            if (parent_id, pid) in links and generations.get(parent_id) == generation - 1:
+                return f"inferred_from_{source}:{parent_id}"
+        for child_id in self.children_of.get(pid, []):
+            if (pid, child_id) in links and generations.get(child_id) == generation + 1:
+                return f"inferred_from_child:{child_id}"
+        return "inferred"
+
+    def generation_links(self) -> List[Tuple[str, str]]:
+        """Các liên kết (cha/mẹ, con) được dùng để suy luận đời theo một trong hai chiều"""
+        return self.rules.generation_links(self.persons)
+
+    def solve_generations(self) -> Dict:
+        """Giải đồng thời mọi liên kết và ghi chú đời, kèm các ghi chú mâu thuẫn (cache)"""
+        if self._generation_solution is None:
+            self._generation_solution = solve_generations(self.persons, self.generation_links(),
+                                                          self.annotated_generations())
+        return self._generation_solution
+
+    def generation_conflict_report(self) -> Dict:
+        """Báo cáo mâu thuẫn đời: ghi chú sai và liên kết lệch đời, kèm tên người liên quan"""
+        solution = self.solve_generations()
+        involved = set()
+        for conflict in solution["conflicts"]:
+            involved.update(conflict["path"])
+        for conflict in solution["link_conflicts"]:
+            involved.update(conflict["cycle"])
+        return {
+            "conflicts": solution["conflicts"],
+            "link_conflicts": solution["link_conflicts"],
+            "names": {pid: self.persons[pid]["display_name"] for pid in sorted(involved)},
+        }
+
+    def export_generation_conflicts(self, output_file: str) -> Dict:
+        """Export báo cáo mâu thuẫn đời"""
+        report = self.generation_conflict_report()
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Đã xuất {len(report['conflicts'])} ghi chú đời mâu thuẫn, "
+              f"{len(report['link_conflicts'])} liên kết lệch đời: {output_file}")
+        return report
+
     def compute_statistics(self) -> dict:
         """Tính toán các thống kê"""
         stats = {
@@ -361,10 +626,99 @@ class FamilyTreeConverter:
         stats["min_generation"] = min(stats["generations"].keys()) if stats["generations"] else None
         stats["max_generation"] = max(stats["generations"].keys()) if stats["generations"] else None
 
+        # Quy mô nhánh, dòng nam dài nhất, số con mỗi cặp theo đời
+        stats["analytics"] = build_analytics(self.persons, self.compute_subtree_summaries(),
+                                             root_id=self.rules.founder_id)
+
+        solution = self.solve_generations()
+        stats["generation_conflicts"] = {
+            "annotations": len(solution["conflicts"]),
+            "links": len(solution["link_conflicts"]),
+        }
+
         return stats
 
-    def build_tree_structure(self, root_id: str = "START", max_depth: int = None) -> Dict:
-        """Xây dựng cấu trúc cây cho D3.js"""
+    def compute_subtree_summaries(self) -> Dict[str, Dict]:
+        """Tổng hợp hậu duệ (số người, nam/nữ, còn sống, khoảng đời, độ sâu) cho
+        mọi người trong một lần duyệt sau; kết quả được cache"""
+        if self._subtree_summaries is None:
+            self._subtree_summaries = compute_subtree_aggregates(self.persons)
+        return self._subtree_summaries
+
+    def attach_subtree_metrics(self):
+        """Gắn số hậu duệ, số hậu duệ còn sống và độ sâu dòng dõi vào từng người"""
+        for pid, agg in self.compute_subtree_summaries().items():
+            self.persons[pid].update(person_metrics(agg))
+
+    def lineage_parent(self, person_id: str) -> Optional[str]:
+        """Cha/mẹ theo dòng dõi: cha, hoặc mẹ nếu quy tắc dòng họ cho phép kế thừa từ mẹ"""
+        person = self.persons[person_id]
+        for source, key in (("father", "father_id"), ("mother", "mother_id")):
+            parent_id = person[key]
+            if (parent_id and parent_id != person_id and parent_id in self.persons
+                    and self.rules.inherits(source, self.persons[parent_id])):
+                return parent_id
+        return None
+
+    def build_ancestor_paths(self) -> AncestorPaths:
+        """Đường dẫn tổ tiên của mọi người trong một lượt từ trên xuống; gắn path_id vào từng người"""
+        self.ancestor_paths = AncestorPaths.build(self.persons, self.lineage_parent,
+                                                  root_id=self.rules.founder_id)
+        for pid, person in self.persons.items():
+            person["path_id"] = self.ancestor_paths.path_id(pid)
+        return self.ancestor_paths
+
+    def infer_birth_ranks(self) -> Dict[str, List[str]]:
+        """Thứ tự con của mỗi cha/mẹ (ghi chú, ngày sinh, thứ tự trong file);
+        gắn birth_rank (1, 2, ...) theo cha/mẹ dòng dõi vào từng người"""
+        births = {pid: sort_key(date) for pid, date in self.dates("birth_date").items()}
+        self.sibling_order = {
+            pid: order_siblings(person["children_ids"], self.persons, births)
+            for pid, person in self.persons.items() if person["children_ids"]
+        }
+        ranks = {pid: {cid: rank for rank, cid in enumerate(order, 1)}
+                 for pid, order in self.sibling_order.items()}
+        for pid, person in self.persons.items():
+            parent_id = self.lineage_parent(pid)
+            if parent_id is None:
+                parent_id = next((p for p in (person["father_id"], person["mother_id"])
+                                  if p in ranks and pid in ranks[p]), None)
+            person["birth_rank"] = ranks[parent_id].get(pid) if parent_id in ranks else None
+        return self.sibling_order
+
+    def ordered_children(self, person_id: str) -> List[str]:
+        """Các con của person_id theo thứ tự sinh đã suy luận"""
+        if self.sibling_order is None:
+            self.infer_birth_ranks()
+        return self.sibling_order.get(person_id, [])
+
+    def ancestor_path(self, person_id: str) -> List[str]:
+        """Các id từ tổ tiên xa nhất xuống person_id (breadcrumb)"""
+        if self.ancestor_paths is None:
+            self.build_ancestor_paths()
+        return self.ancestor_paths.path(person_id)
+
+    def subtree_summary(self, person_id: str) -> Dict:
+        """Tóm tắt cây con đã thu gọn của một người (dùng cho nút "collapsed")"""
+        agg = self.compute_subtree_summaries()[person_id]
+        span = [agg["min_gen"], agg["max_gen"]] if agg["min_gen"] is not None else None
+        return {
+            "descendants": agg["descendants"],
+            "generation_span": span,
+            "male": agg["male"],
+            "female": agg["female"],
+            "living": agg["living"],
+        }
+
+    def build_tree_structure(self, root_id: Optional[str] = None, max_depth: int = None,
+                             summarize: bool = False) -> Dict:
+        """Xây dựng cấu trúc cây cho D3.js (mặc định từ cụ tổ trong quy tắc dòng họ)
+
+        summarize=True: nút ở độ sâu max_depth còn hậu duệ được gắn "collapsed"
+        (tóm tắt cây con) thay vì bị cắt bỏ không dấu vết.
+        """
+        if root_id is None:
+            root_id = self.rules.founder_id
 
         def build_node(person_id: str, depth: int = 0) -> Optional[Dict]:
             if person_id not in self.persons:
@@ -376,7 +730,7 @@ class FamilyTreeConverter:
             person = self.persons[person_id]
             node = {
                 "id": person_id,
-                "name": f"{person['surname']} {person['name']}".strip(),
+                "name": person["display_name"],
                 "generation": person["generation"],
                 "gender": person["gender"],
                 "is_deceased": person["is_deceased"],
@@ -384,98 +738,296 @@ class FamilyTreeConverter:
                 "children": []
             }
 
-            # Add children
-            for child_id in person.get("children_ids", []):
+            # Con ở độ sâu max_depth + 1 đều bị cắt: không cần duyệt tiếp
+            if max_depth is not None and depth == max_depth:
+                if summarize and person.get("children_ids"):
+                    node["collapsed"] = self.subtree_summary(person_id)
+                return node
+
+            # Con theo thứ tự sinh đã tính sẵn (không sắp xếp lại ở mỗi lần xuất)
+            for child_id in self.ordered_children(person_id):
                 child_node = build_node(child_id, depth + 1)
                 if child_node:
                     node["children"].append(child_node)
 
-            # Sort children by birth date or name
-            def get_sort_key(child_node):
-                person = self.persons.get(child_node["id"], {})
-                birth = person.get("birth_date")
-                year = birth.get("year", 9999) if birth else 9999
-                return (year, child_node["name"])
-
-            node["children"].sort(key=get_sort_key)
-
             return node
 
         return build_node(root_id)
 
-    def export_json(self, output_file: str, include_tree: bool = True):
-        """Export dữ liệu ra file JSON"""
-        print(f"Đang xuất file JSON: {output_file}")
+    def export_json(self, output_file: str, include_tree: bool = True, write_delta: bool = True,
+                    views: Sequence[str] = DEFAULT_VIEWS, tree_layout: bool = False):
+        """Export dữ liệu ra file JSON, mỗi view (public/family/admin) một file
+
+        output_file là file của view public (trang web); patch cho client cũng
+        theo view này nên chỉ được tạo khi có xuất view public. tree_layout:
+        bản build có family_tree.tiles.json (viewer chỉ tải khi cờ này bật).
+        """
+        print(f"Đang xuất file JSON: {output_file} (view: {', '.join(views)})")
+        projections = [get_projection(view) for view in views]
+
+        # Bản build trước, dùng để tạo patch cho client
+        previous = load_previous_build(output_file) if write_delta and "public" in views else None
 
         # Find founder
-        founder_id = "START"
+        founder_id = self.rules.founder_id
         founder = self.persons.get(founder_id, {})
 
         output = {
             "metadata": {
-                "family_name": "Tộc Đặng Non Nước",
+                "family_name": self.rules.family_name,
                 "founder_id": founder_id,
                 "founder_name": f"{founder.get('surname', '')} {founder.get('name', '')}".strip(),
                 "total_members": len(self.persons),
                 "total_families": len(self.families),
                 "total_generations": len(set(p["generation"] for p in self.persons.values() if p["generation"])),
                 "generated_at": datetime.now().isoformat(),
-                "source_file": str(self.input_file)
+                "source_file": str(self.input_file),
+                "tree_layout": tree_layout,
             },
             "statistics": self.compute_statistics(),
             "persons": self.persons,
             "families": self.families,
         }
 
+        if self.ancestor_paths is not None:
+            output["ancestor_paths"] = self.ancestor_paths.to_dict()
+
         if include_tree:
             output["tree"] = self.build_tree_structure(founder_id, max_depth=5)
 
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
+        # Đánh số phiên bản và xuất patch so với bản build trước
+        delta = None
+        version = 1
+        if previous is not None:
+            previous_version = previous.get("metadata", {}).get("version", 0)
+            # Patch áp lên family_data.json nên được tính trên đúng view public
+            public = {**get_projection("public").document(output), "persons": self.public_persons()}
+            delta = compute_delta(previous, public)
+            version = previous_version + 1 if delta else previous_version
+        output["metadata"]["version"] = version
+
+        if delta:
+            patch_dir = Path(output_file).parent / "patches"
+            patch_file = write_patch(patch_dir, previous_version, version, delta,
+                                     view_metadata(output["metadata"], "public"))
+            print(f"Đã xuất patch {previous_version} -> {version}: {patch_file}")
+        elif previous is not None:
+            print(f"Không có thay đổi so với phiên bản {version}")
+
+        # Mọi view (bản đầy đủ và bản minified) ghi trong một lượt duyệt persons
+        written = write_views(output_file, output, projections)
 
         print(f"Đã xuất {len(self.persons)} người và {len(self.families)} gia đình")
+        print(f"Đã xuất: {', '.join(written)} (kèm bản .min.json)")
 
-        # Also export a minified version for web
-        minified_file = output_file.replace('.json', '.min.json')
-        with open(minified_file, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, separators=(',', ':'))
-        print(f"Đã xuất file minified: {minified_file}")
+    def export_tree_only(self, output_file: str, max_depth: int = 14, layout: bool = False):
+        """Export chỉ cấu trúc cây cho D3.js
 
-    def export_tree_only(self, output_file: str, max_depth: int = 14):
-        """Export chỉ cấu trúc cây cho D3.js"""
+        layout=True: tính sẵn tọa độ x/y/extent cho từng nút và xuất quadtree
+        các ô ra file .tiles.json để viewer không phải tự tính layout.
+        """
         print(f"Đang xuất cấu trúc cây: {output_file}")
 
-        tree = self.build_tree_structure("START", max_depth=max_depth)
+        tree = self.build_tree_structure(max_depth=max_depth)
+
+        if layout and tree:
+            bounds = layout_tree(tree)
+            tiles_file = output_file.replace('.json', '.tiles.json')
+            tiles = {
+                "layout": {
+                    "node_width": NODE_WIDTH,
+                    "level_height": LEVEL_HEIGHT,
+                    "bounds": bounds,
+                },
+                "tiles": build_quadtree(tree, bounds),
+            }
+            with open(tiles_file, 'w', encoding='utf-8') as f:
+                json.dump(tiles, f, ensure_ascii=False, separators=(',', ':'))
+            print(f"Đã tính layout và xuất chỉ mục ô: {tiles_file}")
 
         with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(tree, f, ensure_ascii=False, indent=2)
 
         print(f"Đã xuất cấu trúc cây")
+        return tree
+
+    def export_tree_tiles(self, output_dir: str, root_id: Optional[str] = None, step: int = 4) -> Dict:
+        """Xuất cây thành các ô theo mức chi tiết (level of detail)
+
+        Mỗi ô bao gồm `step` đời dưới gốc của ô; các nút ở biên còn hậu duệ
+        được thu gọn thành tóm tắt và trỏ tới ô chi tiết của chúng ("tile").
+        Ô gốc (mức 0) rất nhỏ để xem toàn cảnh; viewer chỉ tải thêm ô khi
+        người dùng phóng to vào nhánh đó.
+        """
+        if root_id is None:
+            root_id = self.rules.founder_id
+        tile_dir = Path(output_dir) / "tree_tiles"
+        tile_dir.mkdir(parents=True, exist_ok=True)
+        print(f"Đang xuất các ô cây: {tile_dir}")
+
+        index = {}
+        pending = [(root_id, 0)]
+        while pending:
+            tile_root, level = pending.pop()
+            if tile_root in index or tile_root not in self.persons:
+                continue
 
-    def run(self, output_dir: str = None):
-        """Chạy toàn bộ quá trình chuyển đổi"""
-        if output_dir is None:
-            output_dir = Path(self.input_file).parent
+            tile = self.build_tree_structure(tile_root, max_depth=step, summarize=True)
+
+            node_count = 0
+            stack = [tile]
+            while stack:
+                node = stack.pop()
+                node_count += 1
+                if "collapsed" in node:
+                    node["tile"] = node["id"]
+                    pending.append((node["id"], level + 1))
+                stack.extend(node["children"])
+
+            with open(tile_dir / f"{tile_root}.json", 'w', encoding='utf-8') as f:
+                json.dump(tile, f, ensure_ascii=False, separators=(',', ':'))
+
+            index[tile_root] = {
+                "level": level,
+                "nodes": node_count,
+                "generation": tile["generation"],
+                "summary": self.subtree_summary(tile_root),
+            }
 
-        output_dir = Path(output_dir)
-        output_dir.mkdir(parents=True, exist_ok=True)
+        # Xóa các ô cũ không còn trong bản build này
+        for old_file in tile_dir.glob("*.json"):
+            if old_file.stem != "index" and old_file.stem not in index:
+                old_file.unlink()
+
+        with open(tile_dir / "index.json", 'w', encoding='utf-8') as f:
+            json.dump({"root": root_id, "step": step, "tiles": index}, f,
+                      ensure_ascii=False, separators=(',', ':'))
+
+        print(f"Đã xuất {len(index)} ô cây")
+        return index
+
+    def load(self, jobs: Optional[int] = None, profiler: Optional[StageProfiler] = None):
+        """Parse, xây dựng quan hệ và suy luận đời (dùng chung cho mọi bước sau)"""
+        if profiler is None:
+            profiler = NullProfiler()
 
         # Parse
-        self.parse_familyscript()
+        with profiler.stage("parse", lambda: len(self.persons)):
+            self.parse_familyscript(jobs=jobs)
+
+        self.build_graph(profiler)
+
+    def build_graph(self, profiler: Optional[StageProfiler] = None):
+        """Quan hệ, suy luận đời và chỉ số cây con từ self.persons đã có sẵn"""
+        if profiler is None:
+            profiler = NullProfiler()
 
         # Build relationships
-        self.build_relationships()
+        with profiler.stage("relationships", lambda: len(self.families)):
+            self.build_relationships()
+
+        # Thứ tự anh chị em
+        with profiler.stage("siblings", lambda: len(self.sibling_order)):
+            self.infer_birth_ranks()
 
         # Propagate generations
-        self.propagate_generations()
+        with profiler.stage("propagation", lambda: sum(1 for p in self.persons.values() if p["generation"] is not None)):
+            self.propagate_generations()
+
+        # Chỉ số cây con cho từng người
+        with profiler.stage("analytics", lambda: len(self.persons)):
+            self.attach_subtree_metrics()
+
+        # Đường dẫn tổ tiên cho breadcrumb
+        with profiler.stage("ancestors", lambda: len(self.ancestor_paths.ids)):
+            self.build_ancestor_paths()
+
+    def public_persons(self) -> ProjectedRecords:
+        """persons qua view public, cho mọi đầu ra công khai (không sao chép)"""
+        return ProjectedRecords(self.persons, get_projection("public"))
+
+    def export_sqlite(self, db_file: str, view: str = "admin"):
+        """Export cơ sở dữ liệu SQLite có chỉ mục để truy vấn tùy ý (mặc định view admin:
+        file dành cho quản trị, không xuất bản lên trang web)"""
+        print(f"Đang xuất SQLite: {db_file} (view: {view})")
+        projection = get_projection(view)
+        count = export_sqlite(ProjectedRecords(self.persons, projection), self.families, db_file,
+                              omit_columns=projection.drop)
+        print(f"Đã xuất {count} người vào SQLite")
+
+    def export_search_index(self, output_dir: str) -> SearchIndex:
+        """Export chỉ mục tìm kiếm toàn văn (ghi chú, hoạt động, nơi sinh, nơi an táng; view public)"""
+        print(f"Đang xuất chỉ mục tìm kiếm: {output_dir}")
+        index = SearchIndex.build(self.public_persons())
+        shard_count = index.write_shards(output_dir)
+        print(f"Đã xuất {len(index.postings)} từ, {len(index.doc_ids)} người, {shard_count} shard")
+        return index
+
+    def export_calendar(self, output_dir: str) -> Dict:
+        """Export lịch ngày giỗ theo tháng (JSON) và file iCalendar (view public)"""
+        print(f"Đang xuất lịch ngày giỗ: {output_dir}")
+        summary = write_calendar(self.public_persons(), output_dir, calendar_name=self.rules.calendar_name)
+        print(f"Đã xuất {summary['entries']} ngày giỗ/an táng, {summary['months']} tháng")
+        return summary
+
+    def export_outputs(self, output_dir: str, write_delta: bool = True,
+                       profiler: Optional[StageProfiler] = None, layout: bool = False, tiles: bool = False,
+                       sqlite_file: Optional[str] = None, search: bool = False, calendar: bool = False,
+                       conflicts: bool = False, budgets: Optional[PayloadBudgets] = None,
+                       views: Sequence[str] = DEFAULT_VIEWS, sqlite_view: str = "admin"):
+        """Xuất các file JSON cho trang web (sau khi đã load)
+
+        budgets: đo kích thước/thời gian parse các file web sau khi xuất và so
+        với ngân sách; kết quả nằm trong self.budget_report.
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        if profiler is None:
+            profiler = NullProfiler()
 
         # Export full JSON
-        self.export_json(str(output_dir / "family_data.json"))
+        with profiler.stage("export", lambda: len(self.persons)):
+            self.export_json(str(output_dir / "family_data.json"), write_delta=write_delta, views=views,
+                             tree_layout=layout)
 
         # Export tree structure only
-        self.export_tree_only(str(output_dir / "family_tree.json"))
-
-        # Print summary
+        with profiler.stage("tree", lambda: count_tree_nodes(tree)):
+            tree = self.export_tree_only(str(output_dir / "family_tree.json"), layout=layout)
+
+        # Các ô cây theo mức chi tiết
+        if tiles:
+            with profiler.stage("tiles", lambda: len(tile_index)):
+                tile_index = self.export_tree_tiles(str(output_dir))
+
+        # Cơ sở dữ liệu SQLite
+        if sqlite_file:
+            with profiler.stage("sqlite", lambda: len(self.persons)):
+                self.export_sqlite(sqlite_file, view=sqlite_view)
+
+        # Chỉ mục tìm kiếm toàn văn
+        if search:
+            with profiler.stage("search", lambda: len(self.persons)):
+                self.export_search_index(str(output_dir / "search"))
+
+        # Lịch ngày giỗ
+        if calendar:
+            with profiler.stage("calendar", lambda: calendar_summary["entries"]):
+                calendar_summary = self.export_calendar(str(output_dir / "calendar"))
+
+        # Báo cáo mâu thuẫn đời
+        if conflicts:
+            with profiler.stage("conflicts", lambda: len(report["conflicts"]) + len(report["link_conflicts"])):
+                report = self.export_generation_conflicts(str(output_dir / "generation_conflicts.json"))
+
+        # Ngân sách dữ liệu web (đo sau cùng, trên các file đã ghi)
+        if budgets is not None:
+            with profiler.stage("budgets", lambda: len(self.budget_report["artifacts"])):
+                self.budget_report = budgets.check(str(output_dir))
+            print_budget_report(self.budget_report)
+
+    def print_summary(self):
+        """In tóm tắt thống kê"""
         stats = self.compute_statistics()
         print("\n" + "=" * 60)
         print("TÓM TẮT")
@@ -492,6 +1044,55 @@ class FamilyTreeConverter:
             data = stats['generations'][gen]
             print(f"  Đời {gen}: {data['count']} người")
 
+    def run(self, output_dir: str = None, write_delta: bool = True, jobs: Optional[int] = None,
+            profiler: Optional[StageProfiler] = None, layout: bool = False, tiles: bool = False,
+            sqlite_file: Optional[str] = None, search: bool = False, calendar: bool = False,
+            conflicts: bool = False, budgets: Optional[PayloadBudgets] = None,
+            views: Sequence[str] = DEFAULT_VIEWS, sqlite_view: str = "admin"):
+        """Chạy toàn bộ quá trình chuyển đổi"""
+        if output_dir is None:
+            output_dir = Path(self.input_file).parent
+
+        self.load(jobs=jobs, profiler=profiler)
+        self.export_outputs(output_dir, write_delta=write_delta, profiler=profiler, layout=layout, tiles=tiles,
+                            sqlite_file=sqlite_file, search=search, calendar=calendar, conflicts=conflicts,
+                            budgets=budgets, views=views, sqlite_view=sqlite_view)
+        self.print_summary()
+
+
+def count_tree_nodes(tree: Optional[Dict]) -> int:
+    """Đếm số nút trong cây (không đệ quy)"""
+    if not tree:
+        return 0
+    count = 0
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.get("children", []))
+    return count
+
+
+# Số khối cho mỗi tiến trình, để cân bằng tải khi các đoạn file dài ngắn khác nhau
+CHUNKS_PER_JOB = 4
+
+
+def _parse_chunk(input_file: str, start: int, end: int) -> List[Dict]:
+    """Worker: parse các dòng trong khoảng byte [start, end) của file"""
+    with FamilyEchoFile(input_file, cache_dir=None) as reader:
+        text = str(reader.buffer[start:end], 'utf-8')
+
+    # Xử lý xuống dòng giống chế độ đọc text (universal newlines)
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+
+    converter = FamilyTreeConverter(input_file)
+    persons = []
+    for line in text.split('\n'):
+        person = converter.parse_line(line)
+        if person:
+            persons.append(person)
+    return persons
+
 
 def main():
     import argparse
@@ -505,11 +1106,87 @@ def main():
                         help='File FamilyScript đầu vào')
     parser.add_argument('-o', '--output', default=str(script_dir / 'docs'),
                         help='Thư mục xuất (mặc định: docs folder)')
+    parser.add_argument('--no-delta', action='store_true',
+                        help='Không tạo patch so với bản build trước')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Số tiến trình parse song song (mặc định: tuần tự)')
+    parser.add_argument('--layout', action='store_true',
+                        help='Tính sẵn tọa độ cây và chỉ mục ô cho viewer')
+    parser.add_argument('--tiles', action='store_true',
+                        help='Xuất cây thành các ô theo mức chi tiết (tree_tiles/)')
+    parser.add_argument('--sqlite', default=None,
+                        help='Xuất thêm cơ sở dữ liệu SQLite có chỉ mục (ví dụ: docs/family.db)')
+    parser.add_argument('--sqlite-view', choices=VIEWS, default='admin',
+                        help='View dùng cho SQLite (mặc định: admin, đủ mọi trường)')
+    parser.add_argument('--search', action='store_true',
+                        help='Xuất chỉ mục tìm kiếm toàn văn (search/)')
+    parser.add_argument('--calendar', action='store_true',
+                        help='Xuất lịch ngày giỗ theo tháng và file iCalendar (calendar/)')
+    parser.add_argument('--conflicts', action='store_true',
+                        help='Xuất báo cáo mâu thuẫn đời kèm giải thích (generation_conflicts.json)')
+    parser.add_argument('--rules', default=None,
+                        help='File JSON quy tắc dòng họ (họ, cụ tổ, tên không hợp lệ, cách suy luận đời)')
+    parser.add_argument('--views', type=parse_views, default=list(DEFAULT_VIEWS),
+                        help='Các view của family_data.json, cách nhau bởi dấu phẩy: public (trang web, '
+                             'bỏ thông tin riêng của người còn sống), family, admin (mặc định: public)')
+    parser.add_argument('--budgets', action='store_true',
+                        help='Đo kích thước, gzip và thời gian parse các file web so với ngân sách')
+    parser.add_argument('--budget-file', default=None,
+                        help='File JSON ngân sách theo từng file (bật --budgets)')
+    parser.add_argument('--strict-budgets', action='store_true',
+                        help='Thoát với mã lỗi khi vượt ngân sách thay vì chỉ cảnh báo (bật --budgets)')
+    parser.add_argument('--watch', action='store_true',
+                        help='Theo dõi file đầu vào và tự build lại khi có thay đổi')
+    parser.add_argument('--debounce', type=float, default=1.0,
+                        help='Số giây file phải đứng yên trước khi build lại (mặc định: 1.0)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Đo thời gian, RSS đỉnh và số lượng xử lý theo từng giai đoạn')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='Đo thêm bộ nhớ cấp phát theo giai đoạn bằng tracemalloc '
+                             '(chậm hơn nhiều, bật --profile)')
+    parser.add_argument('--profile-json', default=None,
+                        help='Ghi báo cáo hiệu năng ra file JSON (bật --profile)')
+    parser.add_argument('--cprofile', default=None,
+                        help='Ghi dữ liệu cProfile ra file (bật --profile)')
 
     args = parser.parse_args()
 
-    converter = FamilyTreeConverter(args.input)
-    converter.run(args.output)
+    rules = load_rules(args.rules)
+
+    budgets = None
+    if args.budgets or args.budget_file or args.strict_budgets:
+        budgets = load_budgets(args.budget_file, fail=args.strict_budgets)
+
+    if args.watch:
+        from watch_mode import watch
+        watch(args.input, args.output, debounce=args.debounce, rules=rules,
+              write_delta=not args.no_delta, layout=args.layout, tiles=args.tiles, sqlite_file=args.sqlite,
+              search=args.search, calendar=args.calendar, conflicts=args.conflicts, budgets=budgets,
+              views=args.views, sqlite_view=args.sqlite_view)
+        return
+
+    profiler = None
+    if args.profile or args.profile_json or args.cprofile or args.profile_memory:
+        profiler = StageProfiler(cprofile_file=args.cprofile, trace_memory=args.profile_memory)
+        profiler.start()
+
+    converter = FamilyTreeConverter(args.input, rules=rules)
+    try:
+        converter.run(args.output, write_delta=not args.no_delta, jobs=args.jobs, profiler=profiler,
+                      layout=args.layout, tiles=args.tiles, sqlite_file=args.sqlite, search=args.search,
+                      calendar=args.calendar, conflicts=args.conflicts, budgets=budgets, views=args.views,
+                      sqlite_view=args.sqlite_view)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+
+    if profiler is not None:
+        profiler.report()
+        if args.profile_json:
+            profiler.write_json(args.profile_json)
+
+    if converter.budget_report is not None and converter.budget_report["failed"]:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
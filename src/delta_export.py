@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xuất bản vá (patch) giữa hai lần build liên tiếp của family_data.json
+
+Client đang giữ phiên bản N chỉ cần tải các patch N -> N+1 -> ... thay vì
+tải lại toàn bộ family_data.min.json.
+"""
+
+import json
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+# Các phần được so sánh theo từng bản ghi (theo ID)
+KEYED_SECTIONS = ("persons", "families")
+
+# Các phần nhỏ được thay thế nguyên khối khi có thay đổi
+REPLACED_SECTIONS = ("statistics", "tree", "ancestor_paths")
+
+
+def load_previous_build(output_file: str) -> Optional[Dict]:
+    """Đọc bản build trước (nếu có) để so sánh"""
+    path = Path(output_file)
+    if not path.exists():
+        return None
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _normalize(value: Any) -> Any:
+    """Chuẩn hóa giá trị qua JSON (ví dụ: key int -> str) để so sánh"""
+    return json.loads(json.dumps(value, ensure_ascii=False))
+
+
+def diff_records(old: Dict[str, Dict], new: Dict[str, Dict]) -> Dict:
+    """So sánh hai tập bản ghi theo ID, trả về các bản ghi thêm/xóa/đổi"""
+    added = {}
+    changed = {}
+    unset = {}
+
+    for rid, record in new.items():
+        previous = old.get(rid)
+        if previous is None:
+            added[rid] = record
+            continue
+
+        fields = {k: v for k, v in record.items() if k not in previous or previous[k] != v}
+        if fields:
+            changed[rid] = fields
+
+        missing = [k for k in previous if k not in record]
+        if missing:
+            unset[rid] = missing
+
+    removed = sorted(rid for rid in old if rid not in new)
+
+    result = {}
+    if added:
+        result["added"] = added
+    if removed:
+        result["removed"] = removed
+    if changed:
+        result["changed"] = changed
+    if unset:
+        result["unset"] = unset
+    return result
+
+
+def compute_delta(previous: Dict, current: Dict) -> Dict:
+    """Tính bản vá từ bản build trước sang bản build hiện tại"""
+    delta = {}
+
+    for section in KEYED_SECTIONS:
+        section_diff = diff_records(previous.get(section, {}), current.get(section, {}))
+        if section_diff:
+            delta[section] = section_diff
+
+    replace = {}
+    for section in REPLACED_SECTIONS:
+        if section not in current:
+            continue
+        value = _normalize(current[section])
+        if previous.get(section) != value:
+            replace[section] = value
+    if replace:
+        delta["replace"] = replace
+
+    return delta
+
+
+def write_patch(patch_dir: Path, from_version: int, to_version: int, delta: Dict, metadata: Dict) -> Path:
+    """Ghi file patch và cập nhật patches/index.json"""
+    patch_dir.mkdir(parents=True, exist_ok=True)
+
+    patch = {
+        "from_version": from_version,
+        "to_version": to_version,
+        "metadata": metadata,
+        **delta,
+    }
+    patch_file = patch_dir / f"{from_version}-{to_version}.json"
+    with open(patch_file, 'w', encoding='utf-8') as f:
+        json.dump(patch, f, ensure_ascii=False, separators=(',', ':'))
+
+    index_file = patch_dir / "index.json"
+    index = {"latest": to_version, "patches": {}}
+    if index_file.exists():
+        try:
+            with open(index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    index["latest"] = to_version
+    index.setdefault("patches", {})[str(from_version)] = patch_file.name
+    with open(index_file, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+
+    return patch_file
+
+
+def apply_patch(data: Dict, patch: Dict) -> Dict:
+    """Áp dụng một patch lên dữ liệu phiên bản from_version (dùng để kiểm tra)"""
+    current_version = data.get("metadata", {}).get("version", 0)
+    if current_version != patch["from_version"]:
+        raise ValueError(
+            f"Patch {patch['from_version']}-{patch['to_version']} không áp dụng được cho phiên bản {current_version}"
+        )
+
+    for section in KEYED_SECTIONS:
+        section_diff = patch.get(section)
+        if not section_diff:
+            continue
+        records = data.setdefault(section, {})
+        for rid in section_diff.get("removed", []):
+            records.pop(rid, None)
+        records.update(section_diff.get("added", {}))
+        for rid, fields in section_diff.get("changed", {}).items():
+            records[rid].update(fields)
+        for rid, fields in section_diff.get("unset", {}).items():
+            for field in fields:
+                records[rid].pop(field, None)
+
+    data.update(patch.get("replace", {}))
+    data["metadata"] = patch["metadata"]
+    return data
@@ -7,12 +7,15 @@ Phân tích chi tiết và tìm tất cả các lỗi dữ liệu
 import re
 from collections import defaultdict
 
+from clan_rules import load_rules
+from familyecho_file import FamilyEchoFile
+
 def parse_familyscript(filepath):
     """Parse FamilyScript file"""
     persons = {}
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        for line in f:
+    with FamilyEchoFile(filepath) as reader:
+        for line in reader.person_text():
             line = line.strip()
             if not line.startswith('i'):
                 continue
@@ -53,8 +56,10 @@ def parse_familyscript(filepath):
     return persons
 
 
-def find_all_errors(persons):
+def find_all_errors(persons, rules=None):
     """Find all data quality issues"""
+    if rules is None:
+        rules = load_rules()
 
     errors = []
 
@@ -90,8 +95,8 @@ def find_all_errors(persons):
                 is_parent = True
                 break
 
-        if not has_father and not has_mother and not is_parent and pid != 'START':
-            if 'Đặng' in person.get('surname', ''):
+        if not has_father and not has_mother and not is_parent and pid != rules.founder_id:
+            if rules.is_clan_member(person):
                 errors.append({
                     'type': 'ORPHAN',
                     'severity': 'MEDIUM',
@@ -102,7 +107,7 @@ def find_all_errors(persons):
 
     # 3. Check for missing names
     for pid, person in persons.items():
-        if not person['name'] or person['name'] in ['A', 'B', 'C', 'Y', 'Vợ']:
+        if rules.is_invalid_name(person['name']):
             errors.append({
                 'type': 'INVALID_NAME',
                 'severity': 'HIGH',
@@ -114,8 +119,10 @@ def find_all_errors(persons):
     return errors
 
 
-def print_report(errors, persons):
+def print_report(errors, persons, rules=None):
     """Print detailed error report"""
+    if rules is None:
+        rules = load_rules()
 
     print("=" * 80)
     print("BÁO CÁO CHI TIẾT CÁC LỖI DỮ LIỆU GIA PHẢ")
@@ -163,7 +170,7 @@ def print_report(errors, persons):
 
     # 3. Orphans
     print("\n" + "=" * 80)
-    print("3. NGƯỜI KHÔNG CÓ LIÊN KẾT GIA ĐÌNH (Họ Đặng)")
+    print(f"3. NGƯỜI KHÔNG CÓ LIÊN KẾT GIA ĐÌNH (Họ {rules.surname})")
     print("=" * 80)
 
     orphan_errors = by_type.get('ORPHAN', [])
@@ -187,8 +194,14 @@ def print_report(errors, persons):
 
 
 if __name__ == "__main__":
-    input_file = "/Users/toandang/Downloads/FamilyEcho/My-Family-20-Jan-2026-020424519.txt"
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Phân tích chi tiết các lỗi dữ liệu gia phả')
+    parser.add_argument('input', help='File FamilyScript hoặc HTML xuất từ FamilyEcho')
+    parser.add_argument('--rules', default=None, help='File JSON quy tắc dòng họ')
+    args = parser.parse_args()
+    rules = load_rules(args.rules)
 
-    persons = parse_familyscript(input_file)
-    errors = find_all_errors(persons)
-    print_report(errors, persons)
+    persons = parse_familyscript(args.input)
+    errors = find_all_errors(persons, rules)
+    print_report(errors, persons, rules)
@@ -1,143 +1,287 @@
 #!/usr/bin/env python3
 """
 Extract images from FamilyEcho HTML and create a mapping to person IDs.
-Updates family_data.json with photo information.
+
+Images are decoded, hashed and written to docs/photos/<sha256>.<ext> by a
+bounded thread pool; docs/photos_map.json maps person IDs to those files.
+family_data.json is never read or rewritten.
+
+With Pillow installed, a 128px thumbnail is written to docs/photos/thumbs/
+and the photos map points at it, since the viewer only shows photos as
+avatars of 100px or less.
 """
 
-import re
+import base64
+import hashlib
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-def extract_images_from_html(html_file):
-    """Extract all base64 images from HTML file."""
-    print(f"Reading {html_file}...")
+from familyecho_file import FamilyEchoFile
 
-    with open(html_file, 'r', encoding='utf-8') as f:
-        content = f.read()
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional: thumbnails are skipped without it
+    Image = None
 
-    # Find all image tags with base64 data
-    # Format: <IMG WIDTH=0 HEIGHT=0 STYLE="display:none;" ID="image-754551379" SRC="data:image/jpeg;base64,...">
-    image_pattern = r'ID="image-(\d+)"\s+SRC="(data:image/[^;]+;base64,[^"]+)"'
+EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+
+PHOTO_DIR = 'photos'
+THUMBNAIL_DIR = 'thumbs'
+THUMBNAIL_SIZE = (128, 128)
+
+# Images waiting in the pool per worker, so the reader never runs far ahead
+MAX_PENDING_PER_WORKER = 2
 
-    images = {}
-    matches = re.findall(image_pattern, content)
 
-    for image_id, data_url in matches:
-        images[image_id] = data_url
+def extract_images_from_html(html_file):
+    """Extract all base64 images from HTML file as data URLs."""
+    print(f"Reading {html_file}...")
+
+    # Format: <IMG WIDTH=0 HEIGHT=0 STYLE="display:none;" ID="image-754551379" SRC="data:image/jpeg;base64,...">
+    with FamilyEchoFile(html_file) as reader:
+        images = {
+            image_id: f"data:{mime_type};base64,{str(data, 'ascii')}"
+            for image_id, mime_type, data in reader.images()
+        }
 
     print(f"Found {len(images)} images")
     return images
 
+
+def parse_photo_field(value):
+    """Parse the FamilyScript 'r' field: "<image_id> <width> <height>"."""
+    photo_parts = (value or '').split()
+    if len(photo_parts) < 3:
+        return None
+    return {
+        'image_id': photo_parts[0],
+        'width': int(photo_parts[1]),
+        'height': int(photo_parts[2])
+    }
+
+
+def photo_refs_from_persons(persons):
+    """Person to photo mapping from already parsed persons (their 'photo' field)."""
+    person_photos = {}
+    for person_id, person in persons.items():
+        photo_info = parse_photo_field(person.get('photo'))
+        if photo_info:
+            person_photos[person_id] = photo_info
+    return person_photos
+
+
 def extract_person_photos_from_html(html_file):
     """Extract person to photo mapping from FamilyScript data in HTML."""
 
-    with open(html_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-
     # Find person lines with photo reference
     # Format: iSTART ... r754551379 160 118 ...
     # The 'r' field contains: image_id width height
 
     person_photos = {}
 
-    # Pattern to match person lines with photo info
-    # Person ID starts with 'i', photo info is 'r' followed by numbers
-    person_pattern = r'^i([A-Z0-9]+)\t.*?r(\d+)\s+(\d+)\s+(\d+)'
-
-    for line in content.split('\n'):
-        if line.startswith('i') and '\tr' in line:
-            # Extract person ID
-            parts = line.split('\t')
-            if parts:
-                person_id = parts[0][1:]  # Remove leading 'i'
-
-                # Find photo reference
-                for part in parts:
-                    if part.startswith('r') and ' ' in part:
-                        photo_parts = part[1:].split()
-                        if len(photo_parts) >= 3:
-                            image_id = photo_parts[0]
-                            width = int(photo_parts[1])
-                            height = int(photo_parts[2])
-                            person_photos[person_id] = {
-                                'image_id': image_id,
-                                'width': width,
-                                'height': height
-                            }
-                            break
+    with FamilyEchoFile(html_file) as reader:
+        for line in reader.person_text():
+            if '\tr' not in line:
+                continue
+            parts = line.rstrip('\r').split('\t')
+            person_id = parts[0][1:]  # Remove leading 'i'
+
+            # Find photo reference
+            for part in parts:
+                if part.startswith('r') and ' ' in part:
+                    photo_info = parse_photo_field(part[1:])
+                    if photo_info:
+                        person_photos[person_id] = photo_info
+                        break
 
     print(f"Found {len(person_photos)} persons with photos")
     return person_photos
 
-def update_family_data(json_file, person_photos, images):
-    """Update family_data.json with photo information."""
-
-    print(f"Reading {json_file}...")
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    updated_count = 0
 
+def _write_atomic(path, data):
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_thumbnail(source, target):
+    with Image.open(source) as img:
+        img.thumbnail(THUMBNAIL_SIZE)
+        tmp_path = target.with_name(target.name + '.tmp')
+        img.convert('RGB').save(tmp_path, 'JPEG', quality=80)
+    os.replace(tmp_path, target)
+
+
+def process_image(mime_type, encoded, photo_dir, thumb_dir=None):
+    """Decode, hash and write one image.
+
+    Returns (file name, size, bytes written, thumbnail file name or None).
+    """
+    data = base64.b64decode(encoded)
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    name = f"{digest}.{EXTENSIONS.get(mime_type, 'bin')}"
+
+    # Content-addressed: an unchanged photo is never rewritten
+    path = photo_dir / name
+    written = 0
+    if not path.exists():
+        _write_atomic(path, data)
+        written = len(data)
+
+    thumb_name = None
+    if thumb_dir is not None:
+        thumb_name = f"{digest}.jpg"
+        thumb_path = thumb_dir / thumb_name
+        if not thumb_path.exists():
+            _write_thumbnail(path, thumb_path)
+
+    return name, len(data), written, thumb_name
+
+
+def load_previous_digests(photos_file):
+    """Content hashes of the photo files listed in an existing photos map."""
+    try:
+        with open(photos_file, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    # Inline maps hold data URLs, not files
+    return {Path(value).stem for value in previous.values() if not value.startswith('data:')}
+
+
+def write_photos(person_photos, images, output_dir='docs', photos_file=None, workers=4, inline=False):
+    """Write referenced images through a bounded pool and save the photos map.
+
+    images is an iterable of (image_id, mime_type, base64 buffer), e.g.
+    FamilyEchoFile.images(), which must stay open until this returns; at most
+    workers * MAX_PENDING_PER_WORKER images are held in memory at once.
+    With inline=True the map keeps data URLs instead of file paths.
+    """
+    output_dir = Path(output_dir)
+    photo_dir = output_dir / PHOTO_DIR
+    photo_dir.mkdir(parents=True, exist_ok=True)
+    thumb_dir = None
+    if Image is not None:
+        thumb_dir = photo_dir / THUMBNAIL_DIR
+        thumb_dir.mkdir(exist_ok=True)
+    if photos_file is None:
+        photos_file = output_dir / 'photos_map.json'
+    previous_digests = load_previous_digests(photos_file)
+
+    persons_by_image = {}
     for person_id, photo_info in person_photos.items():
-        if person_id in data['persons']:
-            image_id = photo_info['image_id']
-            if image_id in images:
-                data['persons'][person_id]['photo'] = {
-                    'data_url': images[image_id],
-                    'width': photo_info['width'],
-                    'height': photo_info['height']
-                }
-                updated_count += 1
-
-    print(f"Updated {updated_count} persons with photo data")
-
-    # Save updated JSON
-    output_file = json_file.replace('.json', '_with_photos.json')
-    print(f"Saving to {output_file}...")
-
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-    # Also create a separate photos mapping file (lighter weight)
+        persons_by_image.setdefault(photo_info['image_id'], []).append(person_id)
+
+    slots = threading.BoundedSemaphore(max(1, workers) * MAX_PENDING_PER_WORKER)
+    futures = {}
+    inline_urls = {}
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for image_id, mime_type, encoded in images:
+            if image_id not in persons_by_image or image_id in futures:
+                continue
+            if inline:
+                inline_urls[image_id] = f"data:{mime_type};base64,{str(encoded, 'ascii')}"
+            # Backpressure: wait for a free slot before reading further
+            slots.acquire()
+            future = pool.submit(process_image, mime_type, encoded, photo_dir, thumb_dir)
+            future.add_done_callback(lambda _: slots.release())
+            futures[image_id] = future
+
+    elapsed = time.perf_counter() - start
+    results = {image_id: future.result() for image_id, future in futures.items()}
+
+    total_bytes = sum(size for _, size, _, _ in results.values())
+    written_bytes = sum(written for _, _, written, _ in results.values())
+    written_count = sum(1 for _, _, written, _ in results.values() if written)
+    print(f"Processed {len(results)} images ({total_bytes / 1024 / 1024:.2f} MB) in {elapsed:.2f}s: "
+          f"{len(results) / elapsed if elapsed else 0:.1f} images/s, "
+          f"{total_bytes / 1024 / 1024 / elapsed if elapsed else 0:.2f} MB/s")
+    print(f"Wrote {written_count} new images ({written_bytes / 1024 / 1024:.2f} MB), "
+          f"{len(results) - written_count} unchanged")
+
+    # Remove photos the previous map listed that nobody references any more.
+    # Other files in photos/ (another export sharing the folder) are left alone.
+    stale = previous_digests - {name.rsplit('.', 1)[0] for name, _, _, _ in results.values()}
+    for digest in stale:
+        for old_file in photo_dir.glob(f"{digest}.*"):
+            old_file.unlink()
+        (photo_dir / THUMBNAIL_DIR / f"{digest}.jpg").unlink(missing_ok=True)
+    if stale:
+        print(f"Removed {len(stale)} photos no longer referenced")
+
     photos_map = {}
-    for person_id, photo_info in person_photos.items():
+    missing = 0
+    for person_id, photo_info in sorted(person_photos.items()):
         image_id = photo_info['image_id']
-        if image_id in images:
-            photos_map[person_id] = images[image_id]
+        if image_id not in results:
+            missing += 1
+            continue
+        name, _, _, thumb_name = results[image_id]
+        if inline:
+            photos_map[person_id] = inline_urls[image_id]
+        elif thumb_name is not None:
+            photos_map[person_id] = f"{PHOTO_DIR}/{THUMBNAIL_DIR}/{thumb_name}"
+        else:
+            photos_map[person_id] = f"{PHOTO_DIR}/{name}"
+
+    if missing:
+        print(f"Warning: {missing} persons reference images not found in the HTML")
 
-    photos_file = 'docs/photos_map.json'
     print(f"Saving photos map to {photos_file}...")
     with open(photos_file, 'w', encoding='utf-8') as f:
         json.dump(photos_map, f, ensure_ascii=False)
 
-    print(f"Photos map size: {len(json.dumps(photos_map)) / 1024 / 1024:.2f} MB")
+    print(f"Photos map size: {os.path.getsize(photos_file) / 1024:.1f} KB for {len(photos_map)} persons")
+
+    return photos_file
 
-    return output_file, photos_file
 
 def main():
-    html_file = 'docs/family-tree.html'
-    json_file = 'docs/family_data.json'
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Extract photos from a FamilyEcho HTML export')
+    parser.add_argument('html', nargs='?', default='docs/family-tree.html',
+                        help='FamilyEcho HTML export (default: docs/family-tree.html)')
+    parser.add_argument('-o', '--output', default='docs',
+                        help='Output folder for photos/ and photos_map.json (default: docs)')
+    parser.add_argument('--photos-map', default=None,
+                        help='Output photos map (default: <output>/photos_map.json)')
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                        help='Number of decode/write threads (default: 4)')
+    parser.add_argument('--inline', action='store_true',
+                        help='Keep base64 data URLs in the photos map instead of file paths')
+    args = parser.parse_args()
+
+    html_file = args.html
 
     if not os.path.exists(html_file):
         print(f"Error: {html_file} not found")
         return
 
-    if not os.path.exists(json_file):
-        print(f"Error: {json_file} not found")
-        return
-
-    # Extract images
-    images = extract_images_from_html(html_file)
-
     # Extract person-photo mapping
     person_photos = extract_person_photos_from_html(html_file)
 
-    # Update JSON
-    updated_file, photos_file = update_family_data(json_file, person_photos, images)
+    # Decode and write images straight from the memory-mapped file
+    with FamilyEchoFile(html_file) as reader:
+        photos_file = write_photos(person_photos, reader.images(), args.output, args.photos_map,
+                                   workers=args.workers, inline=args.inline)
 
     print(f"\nDone!")
-    print(f"- Updated data: {updated_file}")
+    print(f"- Photos: {Path(args.output) / PHOTO_DIR}")
     print(f"- Photos map: {photos_file}")
 
+
 if __name__ == '__main__':
     main()
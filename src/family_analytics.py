@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Phân tích đồ thị gia phả: quy mô nhánh, độ sâu dòng dõi, số con mỗi cặp vợ chồng
+
+Mọi chỉ số theo cây con được tính trong một lần duyệt sau (post-order) cho
+toàn bộ người; các câu hỏi như "nhánh đông người còn sống nhất dưới mỗi con
+trai của cụ tổ" hay "dòng nam dài nhất" chỉ còn là tra cứu.
+
+Lưu ý: hậu duệ được cộng theo từng con, nên người có cả cha và mẹ cùng là
+hậu duệ của một tổ tiên (hôn nhân trong họ) được đếm hai lần ở tổ tiên đó.
+"""
+
+from collections import defaultdict
+from typing import Optional, Dict, List
+
+
+def _empty_aggregate() -> Dict:
+    return {
+        "descendants": 0, "male": 0, "female": 0, "living": 0,
+        "min_gen": None, "max_gen": None,
+        # Số đời con cháu bên dưới (0 = không có con)
+        "depth": 0,
+        # Số đời nối tiếp qua con trai bên dưới (0 = không có con trai)
+        "male_line": 0,
+    }
+
+
+def compute_subtree_aggregates(persons: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Tổng hợp hậu duệ cho mọi người trong một lần duyệt sau (không đệ quy)"""
+    aggregates = {}
+    visiting = set()
+
+    for start_id in persons:
+        if start_id in aggregates:
+            continue
+        stack = [(start_id, False)]
+        while stack:
+            pid, expanded = stack.pop()
+            children = persons[pid].get("children_ids", [])
+
+            if not expanded:
+                if pid in aggregates or pid in visiting:
+                    continue
+                visiting.add(pid)
+                stack.append((pid, True))
+                stack.extend((cid, False) for cid in children
+                             if cid not in aggregates and cid not in visiting)
+                continue
+
+            agg = _empty_aggregate()
+            for cid in children:
+                # Bỏ qua cạnh tạo vòng lặp (dữ liệu lỗi)
+                if cid not in aggregates:
+                    continue
+                child = persons[cid]
+                sub = aggregates[cid]
+                agg["descendants"] += 1 + sub["descendants"]
+                agg["male"] += (child["gender"] == "male") + sub["male"]
+                agg["female"] += (child["gender"] == "female") + sub["female"]
+                agg["living"] += (not child["is_deceased"]) + sub["living"]
+                agg["depth"] = max(agg["depth"], 1 + sub["depth"])
+                if child["gender"] == "male":
+                    agg["male_line"] = max(agg["male_line"], 1 + sub["male_line"])
+                for gen in (child["generation"], sub["min_gen"], sub["max_gen"]):
+                    if gen is None:
+                        continue
+                    if agg["min_gen"] is None or gen < agg["min_gen"]:
+                        agg["min_gen"] = gen
+                    if agg["max_gen"] is None or gen > agg["max_gen"]:
+                        agg["max_gen"] = gen
+            aggregates[pid] = agg
+            visiting.discard(pid)
+
+    return aggregates
+
+
+def person_metrics(agg: Dict) -> Dict:
+    """Các trường gắn vào từng người trong family_data.json"""
+    return {
+        "descendant_count": agg["descendants"],
+        "living_descendant_count": agg["living"],
+        "lineage_depth": agg["depth"],
+    }
+
+
+def branch_sizes(persons: Dict[str, Dict], aggregates: Dict[str, Dict], root_id: str,
+                 sons_only: bool = True) -> List[Dict]:
+    """Quy mô nhánh dưới mỗi con của root_id, xếp theo số hậu duệ còn sống giảm dần"""
+    branches = []
+    for cid in persons.get(root_id, {}).get("children_ids", []):
+        child = persons.get(cid)
+        if child is None or cid not in aggregates:
+            continue
+        if sons_only and child["gender"] != "male":
+            continue
+        agg = aggregates[cid]
+        branches.append({
+            "id": cid,
+            "name": child["display_name"],
+            "descendants": agg["descendants"],
+            "living": agg["living"],
+            "depth": agg["depth"],
+        })
+    branches.sort(key=lambda b: (-b["living"], -b["descendants"], b["id"]))
+    return branches
+
+
+def longest_male_line(persons: Dict[str, Dict], aggregates: Dict[str, Dict], root_id: str) -> List[str]:
+    """Dòng nam (cha -> con trai) dài nhất bắt đầu từ root_id, trả về danh sách id"""
+    if root_id not in aggregates:
+        return []
+    line = [root_id]
+    current = root_id
+    while aggregates[current]["male_line"]:
+        target = aggregates[current]["male_line"] - 1
+        current = next(
+            cid for cid in persons[current]["children_ids"]
+            if cid in aggregates and persons[cid]["gender"] == "male"
+            and aggregates[cid]["male_line"] == target
+        )
+        line.append(current)
+    return line
+
+
+def fertility_by_generation(persons: Dict[str, Dict]) -> Dict[int, Dict]:
+    """Số con trung bình mỗi cặp vợ chồng, theo đời của chồng (hoặc vợ nếu thiếu)
+
+    Cặp vợ chồng gồm các cặp có con chung và các cặp kết hôn chưa có con.
+    """
+    children_of_couple = defaultdict(int)
+    for person in persons.values():
+        father, mother = person["father_id"], person["mother_id"]
+        if father in persons and mother in persons:
+            children_of_couple[tuple(sorted((father, mother)))] += 1
+
+    couples = set(children_of_couple)
+    for pid, person in persons.items():
+        for spouse_id in person["spouse_ids"]:
+            if spouse_id in persons:
+                couples.add(tuple(sorted((pid, spouse_id))))
+
+    by_generation = defaultdict(lambda: {"couples": 0, "children": 0})
+    for couple in couples:
+        a, b = persons[couple[0]], persons[couple[1]]
+        husband, wife = (a, b) if a["gender"] == "male" else (b, a)
+        gen = husband["generation"] if husband["generation"] is not None else wife["generation"]
+        if gen is None:
+            continue
+        by_generation[gen]["couples"] += 1
+        by_generation[gen]["children"] += children_of_couple.get(couple, 0)
+
+    result = {}
+    for gen in sorted(by_generation):
+        data = by_generation[gen]
+        result[gen] = {**data, "average": round(data["children"] / data["couples"], 2)}
+    return result
+
+
+def build_analytics(persons: Dict[str, Dict], aggregates: Dict[str, Dict],
+                    root_id: str = "START") -> Optional[Dict]:
+    """Phần "analytics" trong statistics của family_data.json"""
+    if root_id not in persons:
+        return None
+    root = aggregates[root_id]
+    male_line = longest_male_line(persons, aggregates, root_id)
+    return {
+        "root_id": root_id,
+        "descendants": root["descendants"],
+        "living_descendants": root["living"],
+        "lineage_depth": root["depth"],
+        "branches": branch_sizes(persons, aggregates, root_id),
+        "longest_male_line": {"length": len(male_line), "ids": male_line},
+        "fertility_by_generation": fertility_by_generation(persons),
+    }
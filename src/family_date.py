@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Kiểu ngày gọn cho gia phả: một số nguyên đóng gói năm/tháng/ngày và độ chính xác
+
+    packed = (((năm << 4 | tháng) << 5 | ngày) << 3) | cờ
+
+Cờ cho biết phần nào đã biết (HAS_YEAR, HAS_MONTH, HAS_DAY); phần chưa biết
+là 0. So sánh hai ngày chỉ là so sánh số nguyên, nên sắp xếp và tìm theo
+khoảng (bisect) rất rẻ. Mỗi giá trị chuỗi khác nhau chỉ được parse một lần
+và dùng chung một đối tượng (intern).
+
+Ngày không hợp lệ được hạ độ chính xác thay vì giữ nguyên số sai:
+tháng 13 -> chỉ còn năm; 30/02 -> chỉ còn tháng/năm.
+"""
+
+import calendar
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from functools import lru_cache
+from typing import Optional, Dict, List, Tuple, Any
+
+HAS_DAY = 1
+HAS_MONTH = 2
+HAS_YEAR = 4
+
+MAX_YEAR = 9999
+
+# Khóa sắp xếp cho người không có ngày: xếp sau mọi ngày hợp lệ
+UNKNOWN_SORT_KEY = (MAX_YEAR + 1) << 12
+
+# Nhóm gồm mọi người trong DateIndex
+ALL = "*"
+
+
+class FamilyDate(int):
+    """Ngày đã đóng gói (int bất biến, so sánh/sắp xếp trực tiếp)"""
+
+    __slots__ = ()
+
+    @classmethod
+    def pack(cls, year: int, month: int, day: int) -> "FamilyDate":
+        flags = (HAS_YEAR if year else 0) | (HAS_MONTH if month else 0) | (HAS_DAY if day else 0)
+        return cls((((year << 4 | month) << 5 | day) << 3) | flags)
+
+    @property
+    def flags(self) -> int:
+        return int(self) & 7
+
+    @property
+    def year(self) -> int:
+        return int(self) >> 12
+
+    @property
+    def month(self) -> int:
+        return (int(self) >> 8) & 15
+
+    @property
+    def day(self) -> int:
+        return (int(self) >> 3) & 31
+
+    @property
+    def display(self) -> Optional[str]:
+        if not self.year:
+            return None
+        return f"{self.day or '??'}/{self.month or '??'}/{self.year}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dạng JSON dùng trong family_data.json (dùng chung cho cùng một giá trị)"""
+        return _date_dict(self)
+
+    def __repr__(self):
+        return f"FamilyDate({self.year:04d}-{self.month:02d}-{self.day:02d})"
+
+
+@lru_cache(maxsize=None)
+def _date_dict(date: FamilyDate) -> Dict[str, Any]:
+    return {"year": date.year, "month": date.month, "day": date.day, "display": date.display}
+
+
+def validate_parts(year: int, month: int, day: int) -> Tuple[int, int, int]:
+    """Hạ độ chính xác của phần không hợp lệ (0 = chưa biết)"""
+    if not 0 <= year <= MAX_YEAR:
+        return 0, 0, 0
+    if not 1 <= month <= 12:
+        return year, 0, 0
+    # Năm chưa biết: cho phép 29/02
+    days_in_month = calendar.monthrange(year or 2000, month)[1]
+    if not 1 <= day <= days_in_month:
+        return year, month, 0
+    return year, month, day
+
+
+@lru_cache(maxsize=None)
+def parse_family_date(date_str: str) -> Optional[FamilyDate]:
+    """Parse YYYYMMDD / 0000MMDD / YYYY từ FamilyScript; None nếu không có thông tin"""
+    if not date_str or len(date_str) < 4 or not date_str[:8].isdigit():
+        return None
+
+    year = int(date_str[:4])
+    month = int(date_str[4:6]) if len(date_str) >= 6 else 0
+    day = int(date_str[6:8]) if len(date_str) >= 8 else 0
+
+    year, month, day = validate_parts(year, month, day)
+    if not (year or month):
+        return None
+    return FamilyDate.pack(year, month, day)
+
+
+@lru_cache(maxsize=None)
+def _from_parts(year: int, month: int, day: int) -> FamilyDate:
+    return FamilyDate.pack(*validate_parts(year, month, day))
+
+
+def from_dict(date: Optional[Dict]) -> Optional[FamilyDate]:
+    """FamilyDate từ dạng dict (ví dụ đọc lại từ JSON)"""
+    if not date:
+        return None
+    return _from_parts(date.get("year") or 0, date.get("month") or 0, date.get("day") or 0)
+
+
+def sort_key(date: Optional[FamilyDate]) -> int:
+    """Khóa sắp xếp: ngày không có năm được xếp cuối"""
+    if date is None or not date.year:
+        return UNKNOWN_SORT_KEY
+    return int(date)
+
+
+def year_bounds(start_year: int, end_year: int) -> Tuple[int, int]:
+    """Khoảng packed [lo, hi] bao trọn các năm start_year..end_year"""
+    return FamilyDate.pack(start_year, 0, 0), FamilyDate.pack(end_year, 15, 31) | 7
+
+
+class DateIndex:
+    """Chỉ mục đã sắp xếp của một trường ngày, tách theo nhóm (ví dụ theo đời)"""
+
+    def __init__(self):
+        self.keys: Dict[Any, List[int]] = {}
+        self.ids: Dict[Any, List[str]] = {}
+
+    @classmethod
+    def build(cls, dates: Dict[str, Optional[FamilyDate]],
+              groups: Optional[Dict[str, Any]] = None) -> "DateIndex":
+        """dates: id -> ngày; groups: id -> nhóm (người không có nhóm chỉ nằm trong ALL)"""
+        buckets = defaultdict(list)
+        for pid, date in dates.items():
+            if date is None or not date.year:
+                continue
+            buckets[ALL].append((int(date), pid))
+            group = groups.get(pid) if groups is not None else None
+            if group is not None:
+                buckets[group].append((int(date), pid))
+
+        index = cls()
+        for group, entries in buckets.items():
+            entries.sort()
+            index.keys[group] = [key for key, _ in entries]
+            index.ids[group] = [pid for _, pid in entries]
+        return index
+
+    def between(self, start_year: int, end_year: int, group: Any = ALL) -> List[str]:
+        """Id có ngày trong các năm start_year..end_year (tính cả hai đầu), sắp theo ngày"""
+        keys = self.keys.get(group)
+        if not keys:
+            return []
+        lo, hi = year_bounds(start_year, end_year)
+        return self.ids[group][bisect_left(keys, lo):bisect_right(keys, hi)]
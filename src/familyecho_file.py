@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Đọc file xuất từ FamilyEcho (HTML hoặc FamilyScript thuần) bằng mmap
+
+Không đọc cả file vào bộ nhớ: file được ánh xạ (mmap), khối FamilyScript và
+các thẻ <IMG ID="image-N" SRC="data:..."> được định vị theo byte offset, rồi
+trả về các lát memoryview (không sao chép) cho bộ parse và bộ giải mã ảnh.
+
+Bảng offset (khối script, từng dòng người, từng ảnh) được lưu vào thư mục
+tạm của hệ thống, khóa theo (kích thước, mtime); lần chạy sau với file không
+đổi bỏ qua bước quét.
+
+    with FamilyEchoFile("docs/family-tree.html") as reader:
+        for line in reader.person_lines():      # memoryview từng dòng "i..."
+            ...
+        for image_id, mime_type, data in reader.images():   # data: base64
+            ...
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple, Iterator
+
+SCRIPT_START = b"# Start of FamilyScript"
+SCRIPT_END = b"# ...end of FamilyScript"
+
+# Dòng người có thể thụt lề (script nhúng trong HTML); span chỉ lấy phần từ "i"
+PERSON_LINE = re.compile(rb"^[ \t]*(i[^\n]*)", re.MULTILINE)
+IMAGE_TAG = re.compile(rb'<IMG[^>]*?\sID="image-(\d+)"\s+SRC="data:(image/[^;"]+);base64,')
+
+OFFSET_CACHE_DIR = Path(tempfile.gettempdir()) / "tocdang-offsets"
+
+# Tăng khi đổi định dạng bảng offset
+OFFSET_TABLE_VERSION = 2
+
+
+class FamilyEchoFile:
+    """File FamilyEcho đã mmap, kèm bảng offset của script và ảnh"""
+
+    def __init__(self, path: str, cache_dir: Optional[Path] = OFFSET_CACHE_DIR):
+        self.path = str(path)
+        self.cache_dir = cache_dir
+        self._file = None
+        self._mmap = None
+        self._view: Optional[memoryview] = None
+        self._offsets: Optional[Dict] = None
+        self.cache_hit = False
+
+    def __enter__(self) -> "FamilyEchoFile":
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        self._file = open(self.path, 'rb')
+        if os.fstat(self._file.fileno()).st_size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+        else:
+            # mmap không hỗ trợ file rỗng
+            self._view = memoryview(b"")
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def buffer(self):
+        return self._mmap if self._mmap is not None else b""
+
+    # ------------------------------------------------------------------
+    # Bảng offset
+    # ------------------------------------------------------------------
+
+    def _signature(self) -> List[int]:
+        stat = os.fstat(self._file.fileno())
+        return [OFFSET_TABLE_VERSION, stat.st_size, stat.st_mtime_ns]
+
+    def _cache_file(self) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        key = hashlib.sha1(os.path.abspath(self.path).encode('utf-8')).hexdigest()[:16]
+        return Path(self.cache_dir) / f"{key}.json"
+
+    def _load_cached_offsets(self) -> Optional[Dict]:
+        cache_file = self._cache_file()
+        if cache_file is None:
+            return None
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                offsets = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if offsets.get("signature") != self._signature():
+            return None
+        return offsets
+
+    def _save_offsets(self, offsets: Dict):
+        cache_file = self._cache_file()
+        if cache_file is None:
+            return
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_suffix(".tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(offsets, f, separators=(',', ':'))
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            # Không ghi được cache thì lần sau quét lại, không ảnh hưởng kết quả
+            pass
+
+    def scan(self) -> Dict:
+        """Quét file một lần: khối script, các dòng người, các ảnh"""
+        buf = self.buffer
+        size = len(buf)
+
+        start = buf.find(SCRIPT_START)
+        if start < 0:
+            # File FamilyScript thuần: cả file là script
+            script = [0, size]
+        else:
+            end = buf.find(SCRIPT_END, start)
+            script = [start, end if end >= 0 else size]
+
+        lines = []
+        for match in PERSON_LINE.finditer(buf, script[0], script[1]):
+            lines.extend(match.span(1))
+
+        images = []
+        for match in IMAGE_TAG.finditer(buf):
+            data_start = match.end()
+            data_end = buf.find(b'"', data_start)
+            if data_end < 0:
+                continue
+            images.append([match.group(1).decode('ascii'), match.group(2).decode('ascii'),
+                           data_start, data_end])
+
+        return {"signature": self._signature(), "script": script, "lines": lines, "images": images}
+
+    @property
+    def offsets(self) -> Dict:
+        """Bảng offset, đọc từ cache nếu file không đổi"""
+        if self._offsets is None:
+            offsets = self._load_cached_offsets()
+            self.cache_hit = offsets is not None
+            if offsets is None:
+                offsets = self.scan()
+                self._save_offsets(offsets)
+            self._offsets = offsets
+        return self._offsets
+
+    # ------------------------------------------------------------------
+    # Các lát memoryview
+    # ------------------------------------------------------------------
+
+    def script(self) -> memoryview:
+        start, end = self.offsets["script"]
+        return self._view[start:end]
+
+    def person_line_spans(self) -> List[Tuple[int, int]]:
+        lines = self.offsets["lines"]
+        return list(zip(lines[0::2], lines[1::2]))
+
+    def person_lines(self) -> Iterator[memoryview]:
+        """Các dòng người ("i...") dưới dạng memoryview, chỉ hợp lệ đến lần lặp kế tiếp"""
+        lines = self.offsets["lines"]
+        for i in range(0, len(lines), 2):
+            with self._view[lines[i]:lines[i + 1]] as line:
+                yield line
+
+    def person_text(self) -> Iterator[str]:
+        """Các dòng người đã giải mã UTF-8"""
+        for line in self.person_lines():
+            yield str(line, 'utf-8')
+
+    def images(self) -> Iterator[Tuple[str, str, memoryview]]:
+        """(image_id, mime_type, dữ liệu base64) cho từng ảnh nhúng trong HTML
+
+        Khác person_lines: lát memoryview còn hợp lệ đến khi đóng file, để có
+        thể giao cho thread khác giải mã; phải bỏ mọi tham chiếu trước khi đóng.
+        """
+        for image_id, mime_type, start, end in self.offsets["images"]:
+            yield image_id, mime_type, self._view[start:end]
+
+    def image(self, image_id: str) -> Optional[memoryview]:
+        """Dữ liệu base64 của một ảnh (memoryview, người gọi tự release)"""
+        for entry_id, _, start, end in self.offsets["images"]:
+            if entry_id == image_id:
+                return self._view[start:end]
+        return None
+
+    def line_chunks(self, n_chunks: int) -> List[Tuple[int, int]]:
+        """Chia các dòng người thành tối đa n_chunks khoảng byte liên tiếp"""
+        spans = self.person_line_spans()
+        if not spans:
+            return []
+        n_chunks = max(1, min(n_chunks, len(spans)))
+        chunks = []
+        for k in range(n_chunks):
+            first = len(spans) * k // n_chunks
+            last = len(spans) * (k + 1) // n_chunks - 1
+            if first <= last:
+                chunks.append((spans[first][0], spans[last][1]))
+        return chunks
@@ -5,14 +5,18 @@ Tìm các liên kết cha-con gây ra đời âm (lỗi dữ liệu)
 """
 
 import re
-from collections import defaultdict
+
+from ancestor_paths import AncestorPaths
+from clan_rules import load_rules
+from generation_solver import solve_generations
+from familyecho_file import FamilyEchoFile
 
 def parse_familyscript(filepath):
     """Parse FamilyScript file"""
     persons = {}
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        for line in f:
+    with FamilyEchoFile(filepath) as reader:
+        for line in reader.person_text():
             line = line.strip()
             if not line.startswith('i'):
                 continue
@@ -27,6 +31,7 @@ def parse_familyscript(filepath):
                 'name': '',
                 'surname': '',
                 'father_id': None,
+                'mother_id': None,
                 'generation': None,
             }
 
@@ -38,6 +43,8 @@ def parse_familyscript(filepath):
                     person['surname'] = field[1:]
                 elif field.startswith('f'):
                     person['father_id'] = field[1:]
+                elif field.startswith('m') and field[1:2].isupper():
+                    person['mother_id'] = field[1:]
                 elif field.startswith('o') or field.startswith('A'):
                     text = field[1:]
                     gen_match = re.search(r'[Đđ]ời\s*[Tt]hứ\s*(\d+)', text)
@@ -49,58 +56,39 @@ def parse_familyscript(filepath):
     return persons
 
 
-def find_chain_to_founder(persons, person_id, founder_id='START', visited=None):
-    """Trace the ancestor chain from a person to the founder"""
-    if visited is None:
-        visited = set()
-
-    if person_id in visited:
-        return None  # Cycle detected
+def father_paths(persons, founder_id='START'):
+    """Ancestor paths along father links for everyone, built once top-down"""
+    def father_of(pid):
+        father_id = persons[pid]['father_id']
+        return father_id if father_id in persons and father_id != pid else None
 
-    visited.add(person_id)
+    return AncestorPaths.build(persons, father_of, root_id=founder_id)
 
-    if person_id not in persons:
-        return None
 
-    person = persons[person_id]
+def find_chain_to_founder(persons, person_id, founder_id='START', paths=None):
+    """Trace the ancestor chain from a person to the founder (None if it never gets there)"""
+    if paths is None:
+        paths = father_paths(persons, founder_id)
 
-    if person_id == founder_id:
-        return [(person_id, person['name'], person['surname'], person['generation'])]
+    chain = paths.path(person_id)
+    if not chain or chain[0] != founder_id:
+        return None  # Not connected to the founder, or stuck in a cycle
 
-    if person['father_id']:
-        chain = find_chain_to_founder(persons, person['father_id'], founder_id, visited)
-        if chain is not None:
-            return chain + [(person_id, person['name'], person['surname'], person['generation'])]
+    return [(pid, persons[pid]['name'], persons[pid]['surname'], persons[pid]['generation']) for pid in chain]
 
-    return None
 
-
-def analyze_negative_generations(persons):
+def analyze_negative_generations(persons, rules=None):
     """Find people with negative inferred generations and trace their lineage"""
+    if rules is None:
+        rules = load_rules()
+    founder_id = rules.founder_id
 
-    # First, propagate generations
-    children_of = defaultdict(list)
-    for pid, person in persons.items():
-        if person['father_id'] and person['father_id'] in persons:
-            children_of[person['father_id']].append(pid)
-
-    gen_map = {}
-    for pid, person in persons.items():
-        if person['generation'] is not None:
-            gen_map[pid] = person['generation']
-
-    # Propagate down from founder
-    def propagate_down(pid, parent_gen):
-        if pid in gen_map:
-            return
-        gen_map[pid] = parent_gen + 1
-        for child_id in children_of[pid]:
-            propagate_down(child_id, parent_gen + 1)
-
-    # Start from people with known generations
-    for pid, gen in list(gen_map.items()):
-        for child_id in children_of[pid]:
-            propagate_down(child_id, gen)
+    # First, solve generations from the parent-child links the clan rules infer from
+    # (same links as the converter) and every explicit annotation
+    links = rules.generation_links(persons)
+    explicit = {pid: p['generation'] for pid, p in persons.items() if p['generation'] is not None}
+    solution = solve_generations(persons, links, explicit)
+    gen_map = solution['generations']
 
     # Find chains that lead to unexpected results
     print("=" * 80)
@@ -136,6 +124,27 @@ def analyze_negative_generations(persons):
     else:
         print("\nKhông tìm thấy liên kết bất thường trực tiếp")
 
+    # Annotations that disagree with the rest of their connected family
+    print("\n" + "-" * 80)
+    print("GHI CHÚ ĐỜI MÂU THUẪN (kèm giải thích)")
+    print("-" * 80)
+
+    if solution['conflicts']:
+        print(f"\nTìm thấy {len(solution['conflicts'])} ghi chú mâu thuẫn:\n")
+        for c in solution['conflicts']:
+            person = persons[c['person_id']]
+            anchor = persons[c['agrees_with']]
+            print(f"  {person['name']} {person['surname']} ghi Đời {c['annotated']}, phải là Đời {c['expected']}")
+            print(f"    vì {anchor['name']} {anchor['surname']} ghi Đời {c['agrees_with_annotated']}, "
+                  f"qua {len(c['path']) - 1} liên kết: {' - '.join(c['path'])}")
+    else:
+        print("\nKhông có ghi chú mâu thuẫn")
+
+    for c in solution['link_conflicts']:
+        child = persons[c['child_id']]
+        print(f"  Liên kết lệch đời: {child['name']} {child['surname']} ({c['child_id']}) - cha/mẹ {c['parent_id']}, "
+              f"theo các liên kết khác lệch {c['implied_difference']} đời: {' - '.join(c['cycle'])}")
+
     # Find the specific chain causing negative generations
     # Look for people connected to founder but with wrong generation path
     print("\n" + "-" * 80)
@@ -143,10 +152,11 @@ def analyze_negative_generations(persons):
     print("-" * 80)
 
     # Find people with negative computed generations
+    paths = father_paths(persons, founder_id)
     for pid, person in persons.items():
         computed_gen = gen_map.get(pid)
         if computed_gen is not None and computed_gen < 1:
-            chain = find_chain_to_founder(persons, pid)
+            chain = find_chain_to_founder(persons, pid, founder_id, paths)
             if chain:
                 print(f"\nChuỗi dẫn đến {person['name']} {person['surname']} (tính ra Đời {computed_gen}):")
                 for i, (cid, name, surname, explicit_gen) in enumerate(chain):
@@ -161,8 +171,13 @@ def analyze_negative_generations(persons):
 
 
 if __name__ == "__main__":
-    input_file = "/Users/toandang/Downloads/FamilyEcho/My-Family-20-Jan-2026-020424519.txt"
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Tìm các liên kết cha-con gây ra đời âm')
+    parser.add_argument('input', help='File FamilyScript hoặc HTML xuất từ FamilyEcho')
+    parser.add_argument('--rules', default=None, help='File JSON quy tắc dòng họ')
+    args = parser.parse_args()
 
     print("Đang phân tích...")
-    persons = parse_familyscript(input_file)
-    analyze_negative_generations(persons)
+    persons = parse_familyscript(args.input)
+    analyze_negative_generations(persons, load_rules(args.rules))
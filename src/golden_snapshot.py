@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Kiểm tra hồi quy bằng ảnh chụp (golden snapshot) đầu ra của bộ chuyển đổi
+
+Chạy FamilyTreeConverter trên các bộ dữ liệu mẫu, bỏ các trường thay đổi theo
+lần chạy (generated_at, source_file, version) rồi so các phần metadata,
+persons, families, statistics và tree (view admin) cùng persons của view
+public (public_persons) với file golden đã lưu. Khác biệt được
+báo theo đường dẫn tới từng trường (ví dụ persons.START.birth_date.year).
+
+    python src/golden_snapshot.py                 # kiểm tra mọi bộ mẫu
+    python src/golden_snapshot.py synthetic -j 4  # một bộ mẫu, parse song song
+    python src/golden_snapshot.py --update        # ghi lại file golden
+
+Bộ mẫu:
+    family-tree  file docs/family-tree.html trong repo
+    synthetic    FamilyScript sinh ngẫu nhiên có seed cố định, gồm các trường
+                 hợp biên: ngày âm lịch 0000MMDD, ngày sai, tên dạng NFD, cha
+                 không tồn tại, người thiếu đời, ghi chú đời sai, vợ chồng
+                 khai trùng
+
+File golden là JSON nén gzip (mtime = 0, khóa đã sắp xếp) trong thư mục
+golden/, để git chỉ thấy thay đổi khi nội dung thật sự đổi.
+"""
+
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import random
+import sys
+import tempfile
+import unicodedata
+from pathlib import Path
+from typing import Optional, Dict, List, Any
+
+from convert_to_json import FamilyTreeConverter
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+GOLDEN_DIR = REPO_ROOT / "golden"
+
+# Các trường metadata thay đổi theo lần chạy, không đưa vào snapshot
+VOLATILE_METADATA = ("generated_at", "source_file", "version")
+
+SECTIONS = ("metadata", "persons", "families", "statistics", "ancestor_paths", "tree", "public_persons")
+
+SYNTHETIC_SEED = 20240101
+SYNTHETIC_GENERATIONS = 9
+SYNTHETIC_MAX_PERSONS = 400
+
+MALE_NAMES = ["An", "Bình", "Cẩn", "Danh", "Đức", "Hải", "Hùng", "Khang", "Lâm", "Minh",
+              "Nghĩa", "Phúc", "Quang", "Sơn", "Thành", "Toàn", "Trung", "Vinh"]
+FEMALE_NAMES = ["Cúc", "Dung", "Hạnh", "Hoa", "Hồng", "Lan", "Liên", "Mai", "Nga", "Nhung",
+                "Phượng", "Thảo", "Thu", "Tuyết", "Vân", "Yến"]
+OUTSIDE_SURNAMES = ["Nguyễn Thị", "Trần Thị", "Lê Thị", "Phạm Thị", "Huỳnh Thị", "Võ Thị"]
+PHAI = ["Nhất", "Nhì", "Ba"]
+CHI = ["Nhất", "Nhì", "Ba", "Tư"]
+
+
+# ----------------------------------------------------------------------
+# Bộ mẫu sinh ngẫu nhiên
+# ----------------------------------------------------------------------
+
+def _date_field(rng: random.Random, year: int) -> str:
+    """Một giá trị ngày FamilyScript với đủ các dạng: đầy đủ, chỉ năm, sai"""
+    kind = rng.random()
+    if kind < 0.5:
+        return f"{year:04d}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}"
+    if kind < 0.8:
+        return f"{year:04d}"
+    if kind < 0.9:
+        # Tháng không hợp lệ: chỉ giữ lại năm
+        return f"{year:04d}13{rng.randint(1, 28):02d}"
+    # 30/02: chỉ giữ lại tháng/năm
+    return f"{year:04d}0230"
+
+
+def synthetic_familyscript(seed: int = SYNTHETIC_SEED, generations: int = SYNTHETIC_GENERATIONS,
+                           max_persons: int = SYNTHETIC_MAX_PERSONS) -> str:
+    """Sinh một file FamilyScript xác định (cùng seed cho cùng kết quả)"""
+    rng = random.Random(seed)
+    records: Dict[str, Dict[str, Any]] = {}
+    order: List[str] = []
+    counter = [0]
+
+    def new_person(gender: str, surname: str, name: str, **fields) -> str:
+        counter[0] += 1
+        pid = fields.pop("pid", None) or f"S{counter[0]:04d}"
+        records[pid] = {"g": gender, "l": surname, "q": surname, "p": name, "s": [], **fields}
+        order.append(pid)
+        return pid
+
+    def marry(husband: str, wife: str):
+        records[husband]["s"].append(wife)
+        records[wife]["s"].append(husband)
+
+    founder = new_person("m", "Đặng Văn", "Tổ", pid="START", b="1600", z=True, gen=1)
+    records[founder]["d"] = "00000612"
+    founder_wife = new_person("f", "Nguyễn Thị", "Tổ Mẫu", z=True, d="00000305")
+    marry(founder, founder_wife)
+
+    layer = [(founder, founder_wife, 1600)]
+    for gen in range(2, generations + 1):
+        next_layer = []
+        for father, mother, father_year in layer:
+            # Cụ tổ luôn có con để cây không bị cụt ngay đời 2
+            for _ in range(rng.randint(2 if gen == 2 else 0, 5)):
+                if len(records) >= max_persons:
+                    break
+                year = father_year + rng.randint(18, 40)
+                # Mỗi đời có ít nhất một con trai để dòng họ tiếp tục
+                male = rng.random() < 0.6 or not next_layer
+                child = new_person(
+                    "m" if male else "f",
+                    "Đặng Văn" if male else "Đặng Thị",
+                    rng.choice(MALE_NAMES if male else FEMALE_NAMES),
+                    f=father, m=mother, b=_date_field(rng, year),
+                )
+                record = records[child]
+                # Đời được ghi rõ ở khoảng 60% số người, còn lại phải suy luận
+                if rng.random() < 0.6:
+                    record["gen"] = gen
+                if gen == 2:
+                    record["phai"] = rng.choice(PHAI)
+                elif gen == 3 and rng.random() < 0.7:
+                    record["chi"] = rng.choice(CHI)
+                if year < 1950 or rng.random() < 0.3:
+                    record["z"] = True
+                    if rng.random() < 0.5:
+                        # Ngày giỗ âm lịch (không có năm)
+                        record["d"] = f"0000{rng.randint(1, 12):02d}{rng.randint(1, 30):02d}"
+                if male and rng.random() < 0.75:
+                    wife = new_person("f", rng.choice(OUTSIDE_SURNAMES), rng.choice(FEMALE_NAMES),
+                                      b=_date_field(rng, year + rng.randint(0, 6)))
+                    if record.get("z"):
+                        records[wife]["z"] = True
+                    marry(child, wife)
+                    next_layer.append((child, wife, year))
+                elif male:
+                    next_layer.append((child, None, year))
+        layer = next_layer
+
+    # Các trường hợp biên
+    orphan = new_person("m", "Đặng Văn", "Lạc", f="ZZZZZ", b="1900")
+    records[orphan]["gen"] = 10
+    nfd_name = unicodedata.normalize("NFD", "Đặng Thị Ngọc Ánh")
+    surname, _, name = nfd_name.rpartition(" ")
+    new_person("f", surname, name, f=founder, m=founder_wife, b="16250101")
+    mislabelled = new_person("m", "Đặng Văn", "Sai", f=founder, m=founder_wife, b="1630")
+    records[mislabelled]["gen"] = 5
+    lone = new_person("m", "Trần Văn", "Độc", b="1850")
+    records[lone]["s"].append(lone + "X")
+    duplicate_wife = new_person("f", "Lê Thị", "Trùng")
+    marry(founder, duplicate_wife)
+    records[founder]["s"].append(duplicate_wife)
+    # Con ghi cuối file nhưng ghi chú là con thứ hai (không có ngày sinh)
+    second = new_person("f", "Đặng Thị", "Hai", f=founder, m=founder_wife)
+    records[second]["rank"] = "Con thứ hai"
+
+    lines = ["# Start of FamilyScript...", ""]
+    for pid in order:
+        record = records[pid]
+        fields = [f"i{pid}"]
+        for key in ("f", "m"):
+            if record.get(key):
+                fields.append(f"{key}{record[key]}")
+        fields.extend([f"l{record['l']}", f"q{record['q']}", f"p{record['p']}", f"g{record['g']}"])
+        if record.get("b"):
+            fields.append(f"b{record['b']}")
+        if record.get("z"):
+            fields.append("z1")
+        if record.get("d"):
+            fields.append(f"d{record['d']}")
+        fields.extend(f"s{spouse}" for spouse in record["s"])
+        note = []
+        if record.get("gen"):
+            note.append(f"Đời thứ {record['gen']}")
+        if record.get("phai"):
+            note.append(f"Phái {record['phai']}")
+        if record.get("chi"):
+            note.append(f"Chi {record['chi']}")
+        if record.get("rank"):
+            note.append(record["rank"])
+        if note:
+            fields.append("o" + ", ".join(note))
+        lines.append("\t".join(fields))
+    lines.extend(["", "# ...end of FamilyScript"])
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_fixture() -> Path:
+    """Ghi bộ mẫu sinh ngẫu nhiên ra thư mục tạm (đường dẫn cố định)"""
+    path = Path(tempfile.gettempdir()) / "tocdang-golden" / "synthetic.txt"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    content = synthetic_familyscript().encode("utf-8")
+    # Chỉ ghi khi nội dung đổi, để giữ nguyên mtime và cache offset
+    if not path.exists() or path.read_bytes() != content:
+        path.write_bytes(content)
+    return path
+
+
+FIXTURES = {
+    "family-tree": lambda: REPO_ROOT / "docs" / "family-tree.html",
+    "synthetic": synthetic_fixture,
+}
+
+
+# ----------------------------------------------------------------------
+# Chạy bộ chuyển đổi và chuẩn hóa
+# ----------------------------------------------------------------------
+
+def normalize_output(data: Dict, tree: Optional[Dict], public: Dict) -> Dict:
+    """Snapshot từ family_data.admin.json, family_tree.json và persons của family_data.json
+    (view public), bỏ các trường thay đổi theo lần chạy"""
+    metadata = {k: v for k, v in data.get("metadata", {}).items() if k not in VOLATILE_METADATA}
+    return {
+        "metadata": metadata,
+        "persons": data.get("persons", {}),
+        "families": data.get("families", {}),
+        "statistics": data.get("statistics", {}),
+        "ancestor_paths": data.get("ancestor_paths"),
+        "tree": tree,
+        "public_persons": public.get("persons", {}),
+    }
+
+
+def run_fixture(input_file: Path, jobs: Optional[int] = None, verbose: bool = False) -> Dict:
+    """Chạy bộ chuyển đổi như khi build thật và đọc lại các file JSON đã xuất"""
+    output = io.StringIO()
+    with tempfile.TemporaryDirectory(prefix="tocdang-golden-") as tmp_dir, \
+            contextlib.redirect_stdout(sys.stdout if verbose else output):
+        converter = FamilyTreeConverter(str(input_file))
+        converter.load(jobs=jobs)
+        # View admin: đủ mọi trường; view public: phép chiếu của trang web công khai
+        converter.export_outputs(tmp_dir, write_delta=False, views=("public", "admin"))
+        with open(Path(tmp_dir) / "family_data.admin.json", 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        with open(Path(tmp_dir) / "family_data.json", 'r', encoding='utf-8') as f:
+            public = json.load(f)
+        with open(Path(tmp_dir) / "family_tree.json", 'r', encoding='utf-8') as f:
+            tree = json.load(f)
+    return normalize_output(data, tree, public)
+
+
+def golden_file(name: str, golden_dir: Path = GOLDEN_DIR) -> Path:
+    return Path(golden_dir) / f"{name}.json.gz"
+
+
+def load_golden(path: Path) -> Optional[Dict]:
+    if not path.exists():
+        return None
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_golden(path: Path, snapshot: Dict):
+    """Ghi file golden ổn định theo byte: khóa sắp xếp, gzip không có mtime"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    content = json.dumps(snapshot, ensure_ascii=False, sort_keys=True, indent=1).encode('utf-8') + b"\n"
+    tmp_file = path.with_suffix(".tmp")
+    with open(tmp_file, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', filename='', mtime=0) as f:
+        f.write(content)
+    tmp_file.replace(path)
+
+
+# ----------------------------------------------------------------------
+# So sánh có cấu trúc
+# ----------------------------------------------------------------------
+
+def _join(path: str, key: Any) -> str:
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    return f"{path}.{key}" if path else str(key)
+
+
+def diff_values(expected: Any, actual: Any, path: str = "") -> List[Dict]:
+    """Danh sách khác biệt {"path", "kind": added/removed/changed, "expected", "actual"}"""
+    diffs = []
+    stack = [(expected, actual, path)]
+    while stack:
+        old, new, here = stack.pop()
+        if isinstance(old, dict) and isinstance(new, dict):
+            for key in old:
+                if key not in new:
+                    diffs.append({"path": _join(here, key), "kind": "removed", "expected": old[key]})
+            for key in new:
+                if key not in old:
+                    diffs.append({"path": _join(here, key), "kind": "added", "actual": new[key]})
+            stack.extend((old[key], new[key], _join(here, key))
+                         for key in reversed(list(old)) if key in new)
+        elif isinstance(old, list) and isinstance(new, list):
+            for i in range(len(new), len(old)):
+                diffs.append({"path": _join(here, i), "kind": "removed", "expected": old[i]})
+            for i in range(len(old), len(new)):
+                diffs.append({"path": _join(here, i), "kind": "added", "actual": new[i]})
+            stack.extend((old[i], new[i], _join(here, i))
+                         for i in reversed(range(min(len(old), len(new)))))
+        elif old != new or type(old) is not type(new):
+            diffs.append({"path": here, "kind": "changed", "expected": old, "actual": new})
+    return diffs
+
+
+def compare_snapshots(expected: Dict, actual: Dict) -> Dict[str, List[Dict]]:
+    """Khác biệt theo từng phần (chỉ gồm các phần có khác biệt)"""
+    result = {}
+    for section in SECTIONS:
+        diffs = diff_values(expected.get(section), actual.get(section), section)
+        if diffs:
+            result[section] = diffs
+    return result
+
+
+def _short(value: Any, width: int = 80) -> str:
+    text = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+def format_diff(diffs: Dict[str, List[Dict]], max_lines: int = 20) -> List[str]:
+    """Báo cáo dạng text: số khác biệt mỗi phần và tối đa max_lines dòng mỗi phần"""
+    marks = {"added": "+", "removed": "-", "changed": "~"}
+    lines = []
+    for section, section_diffs in diffs.items():
+        counts = {kind: sum(1 for d in section_diffs if d["kind"] == kind) for kind in marks}
+        lines.append(f"  {section}: {counts['added']} thêm, {counts['removed']} xóa, {counts['changed']} đổi")
+        for d in section_diffs[:max_lines]:
+            if d["kind"] == "changed":
+                detail = f"{_short(d['expected'])} -> {_short(d['actual'])}"
+            else:
+                detail = _short(d.get("actual", d.get("expected")))
+            lines.append(f"    {marks[d['kind']]} {d['path']}: {detail}")
+        if len(section_diffs) > max_lines:
+            lines.append(f"    ... và {len(section_diffs) - max_lines} khác biệt khác")
+    return lines
+
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+
+def check_fixture(name: str, golden_dir: Path, jobs: Optional[int], update: bool,
+                  max_lines: int, verbose: bool) -> Optional[Dict[str, List[Dict]]]:
+    """Kiểm tra (hoặc ghi lại) một bộ mẫu; trả về khác biệt, {} nếu khớp"""
+    input_file = FIXTURES[name]()
+    snapshot = run_fixture(input_file, jobs=jobs, verbose=verbose)
+    # Qua JSON một lần để so cùng kiểu với file golden (ví dụ key int -> str)
+    snapshot = json.loads(json.dumps(snapshot, ensure_ascii=False))
+    path = golden_file(name, golden_dir)
+
+    if update:
+        save_golden(path, snapshot)
+        print(f"[{name}] Đã ghi golden: {path} ({len(snapshot['persons'])} người)")
+        return {}
+
+    expected = load_golden(path)
+    if expected is None:
+        print(f"[{name}] Chưa có file golden {path}, chạy lại với --update")
+        return None
+
+    diffs = compare_snapshots(expected, snapshot)
+    if not diffs:
+        print(f"[{name}] Khớp golden ({len(snapshot['persons'])} người)")
+        return diffs
+
+    total = sum(len(d) for d in diffs.values())
+    print(f"[{name}] KHÔNG khớp golden: {total} khác biệt")
+    for line in format_diff(diffs, max_lines):
+        print(line)
+    return diffs
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Kiểm tra đầu ra của bộ chuyển đổi với file golden')
+    parser.add_argument('fixtures', nargs='*', default=[],
+                        help=f"Các bộ mẫu (mặc định: tất cả - {', '.join(FIXTURES)})")
+    parser.add_argument('--update', action='store_true',
+                        help='Ghi lại file golden từ đầu ra hiện tại')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Số tiến trình parse song song (mặc định: tuần tự)')
+    parser.add_argument('--golden-dir', default=str(GOLDEN_DIR),
+                        help='Thư mục chứa file golden (mặc định: golden/)')
+    parser.add_argument('--max-lines', type=int, default=20,
+                        help='Số khác biệt in ra tối đa mỗi phần (mặc định: 20)')
+    parser.add_argument('--report', default=None,
+                        help='Ghi toàn bộ khác biệt ra file JSON')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Hiện log của bộ chuyển đổi')
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.fixtures if name not in FIXTURES]
+    if unknown:
+        parser.error(f"Bộ mẫu không hợp lệ: {', '.join(unknown)} (chọn từ {', '.join(FIXTURES)})")
+
+    names = args.fixtures or list(FIXTURES)
+    report = {}
+    failed = False
+    for name in names:
+        diffs = check_fixture(name, Path(args.golden_dir), args.jobs, args.update, args.max_lines, args.verbose)
+        if diffs is None:
+            failed = True
+            report[name] = {"missing_golden": True}
+        elif diffs:
+            failed = True
+            report[name] = diffs
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Đã ghi báo cáo khác biệt: {args.report}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gộp nhiều file xuất FamilyEcho (mỗi nhánh tự quản lý một cây) thành một đồ thị
+
+    python src/merge_exports.py nhanh1.html nhanh2.html -o docs/merged
+
+Các file được parse song song (mỗi file một tiến trình). File đầu tiên là gốc;
+người của các file sau được khớp vào đồ thị đã gộp qua chỉ mục:
+    1. cùng ID FamilyEcho và cùng tên (cây được sao chép từ nhau)
+    2. cùng (tên, tên cha, tên mẹ), (tên, ngày sinh) hoặc (tên, tên vợ/chồng)
+    3. là cha mẹ, vợ chồng hoặc con cùng tên của một người đã khớp
+Mỗi người chỉ tra cứu dictionary và được xét một lần, nên thời gian tỉ lệ
+tuyến tính với tổng số người.
+
+Ngoài các file JSON thường (family_data.json, family_tree.json), xuất thêm:
+    provenance.json       -> id đã gộp -> {file: id gốc trong file đó}
+    merge_conflicts.json  -> các trường mâu thuẫn, khớp không rõ ràng, trùng ID
+"""
+
+import json
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple
+
+from clan_rules import ClanRules, load_rules
+from convert_to_json import FamilyTreeConverter
+
+# Trường so sánh khi gộp; trường trống được điền từ file sau
+MERGE_FIELDS = (
+    "name", "surname", "surname_at_birth", "gender", "birth_date", "birth_place",
+    "death_date", "death_place", "burial_place", "burial_date", "phai", "chi",
+    "address", "email", "phone", "photo", "profession", "employer", "interests",
+)
+
+# Trường văn bản được nối (không coi là mâu thuẫn)
+TEXT_FIELDS = ("notes", "activities")
+
+
+def _parse_export(input_file: str) -> Dict[str, Dict]:
+    """Worker: parse một file xuất, chưa xây dựng quan hệ"""
+    converter = FamilyTreeConverter(input_file)
+    converter.parse_familyscript()
+    return converter.persons
+
+
+def parse_exports(input_files: List[str], jobs: Optional[int] = None) -> List[Dict[str, Dict]]:
+    """Parse các file song song, giữ đúng thứ tự đầu vào"""
+    if jobs == 1 or len(input_files) == 1:
+        return [_parse_export(f) for f in input_files]
+    with ProcessPoolExecutor(max_workers=jobs or len(input_files)) as executor:
+        return list(executor.map(_parse_export, input_files))
+
+
+def _birth_key(person: Dict) -> Optional[Tuple]:
+    birth = person["birth_date"]
+    if not birth or not birth.get("year"):
+        return None
+    return birth["year"], birth.get("month") or 0, birth.get("day") or 0
+
+
+def match_keys(person: Dict, persons: Dict[str, Dict]) -> List[Tuple]:
+    """Các khóa dùng để khớp một người, theo thứ tự ưu tiên"""
+    name = person["name_key"]
+    if not name:
+        return []
+    keys = []
+    father = persons.get(person["father_id"] or "")
+    mother = persons.get(person["mother_id"] or "")
+    if father or mother:
+        keys.append(("parents", name,
+                     father["name_key"] if father else "", mother["name_key"] if mother else ""))
+    birth = _birth_key(person)
+    if birth:
+        keys.append(("birth", name, *birth))
+    for spouse_id in person["spouse_ids"]:
+        spouse = persons.get(spouse_id)
+        if spouse and spouse["name_key"]:
+            keys.append(("spouse", name, spouse["name_key"]))
+    return keys
+
+
+class ExportMerger:
+    """Đồ thị đã gộp cùng chỉ mục khớp, nguồn gốc và danh sách mâu thuẫn"""
+
+    def __init__(self):
+        self.persons: Dict[str, Dict] = {}
+        self.provenance: Dict[str, Dict[str, str]] = defaultdict(dict)
+        self.conflicts: List[Dict] = []
+        self.key_index: Dict[Tuple, List[str]] = defaultdict(list)
+        self.children_of: Dict[str, List[str]] = defaultdict(list)
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _new_id(self, source_id: str) -> str:
+        """ID chưa dùng, giữ dạng chữ/số của FamilyEcho"""
+        if source_id not in self.persons:
+            return source_id
+        n = 2
+        while f"{source_id}{n}" in self.persons:
+            n += 1
+        return f"{source_id}{n}"
+
+    def _narrow(self, person: Dict, candidates: List[str]) -> List[str]:
+        """Nhiều ứng viên cùng tên đã bỏ dấu: ưu tiên ứng viên trùng tên có dấu"""
+        if len(candidates) > 1:
+            exact = [c for c in candidates if self.persons[c]["display_name"] == person["display_name"]]
+            if exact:
+                return exact
+        return candidates
+
+    def _ambiguous(self, source: str, pid: str, person: Dict, candidates: List[str]):
+        self.conflicts.append({"type": "ambiguous", "source": source, "source_id": pid,
+                               "name": person["display_name"], "candidates": candidates})
+
+    def _find_match(self, source: str, pid: str, person: Dict, keys: List[Tuple]) -> Optional[str]:
+        existing = self.persons.get(pid)
+        if existing is not None and existing["name_key"] == person["name_key"] and source not in self.provenance[pid]:
+            return pid
+
+        candidates = []
+        for key in keys:
+            for merged_id in self.key_index.get(key, ()):
+                if merged_id not in candidates and source not in self.provenance[merged_id]:
+                    candidates.append(merged_id)
+        candidates = self._narrow(person, [
+            c for c in candidates
+            if not (person["gender"] and self.persons[c]["gender"]
+                    and person["gender"] != self.persons[c]["gender"])
+        ])
+
+        if len(candidates) > 1:
+            self._ambiguous(source, pid, person, candidates)
+            return None
+        if existing is not None and not candidates:
+            self.conflicts.append({"type": "id_collision", "source": source, "source_id": pid,
+                                   "name": person["display_name"], "existing_name": existing["display_name"]})
+        return candidates[0] if candidates else None
+
+    def _merge_fields(self, source: str, merged_id: str, person: Dict):
+        target = self.persons[merged_id]
+        for field in MERGE_FIELDS:
+            incoming = person.get(field)
+            if incoming in (None, "", {}):
+                continue
+            current = target.get(field)
+            if current in (None, "", {}):
+                target[field] = incoming
+            elif current != incoming:
+                self.conflicts.append({"type": "field", "id": merged_id, "field": field,
+                                       "values": {"merged": current, source: incoming}})
+
+        for field in TEXT_FIELDS:
+            incoming = person.get(field) or ""
+            parts = target[field].split(" | ") if target[field] else []
+            for part in incoming.split(" | ") if incoming else []:
+                if part not in parts:
+                    parts.append(part)
+            target[field] = " | ".join(parts)
+
+        if person["generation_source"] == "explicit":
+            if target["generation_source"] != "explicit":
+                target["generation"] = person["generation"]
+                target["generation_source"] = "explicit"
+            elif target["generation"] != person["generation"]:
+                self.conflicts.append({"type": "field", "id": merged_id, "field": "generation",
+                                       "values": {"merged": target["generation"], source: person["generation"]}})
+        for tag, value in person["note_tags"].items():
+            target["note_tags"].setdefault(tag, value)
+
+    def _claim(self, source: str, pid: str, person: Dict, merged_id: str, id_map: Dict[str, str]):
+        id_map[pid] = merged_id
+        self.provenance[merged_id][source] = pid
+        self._merge_fields(source, merged_id, person)
+
+    def _match_by_relatives(self, source: str, persons: Dict[str, Dict], id_map: Dict[str, str]):
+        """Lan từ người đã khớp sang cha mẹ, vợ chồng, con cùng tên (mỗi người xét một lần)"""
+        children_in_source = defaultdict(list)
+        for pid, person in persons.items():
+            for field in ("father_id", "mother_id"):
+                if person[field] in persons:
+                    children_in_source[person[field]].append(pid)
+
+        queue = deque(id_map)
+        while queue:
+            pid = queue.popleft()
+            person = persons[pid]
+            merged = self.persons[id_map[pid]]
+
+            pairs = []
+            for field in ("father_id", "mother_id"):
+                if person[field] in persons and merged[field]:
+                    pairs.append((person[field], [merged[field]]))
+            for spouse_id in person["spouse_ids"]:
+                if spouse_id in persons:
+                    pairs.append((spouse_id, merged["spouse_ids"]))
+            for child_id in children_in_source[pid]:
+                pairs.append((child_id, self.children_of[merged["id"]]))
+
+            for relative_id, options in pairs:
+                if relative_id in id_map:
+                    continue
+                relative = persons[relative_id]
+                found = self._narrow(relative, [
+                    m for m in options
+                    if self.persons[m]["name_key"] == relative["name_key"]
+                    and source not in self.provenance[m]
+                ])
+                if len(found) == 1:
+                    self._claim(source, relative_id, relative, found[0], id_map)
+                    queue.append(relative_id)
+                elif len(found) > 1:
+                    self._ambiguous(source, relative_id, relative, found)
+
+    def add_export(self, source: str, persons: Dict[str, Dict]):
+        """Khớp và gộp người của một file vào đồ thị (các lượt đều tuyến tính)"""
+        # Lượt 1: khớp theo ID và các khóa tên
+        id_map = {}
+        keys_of = {}
+        for pid, person in persons.items():
+            keys_of[pid] = match_keys(person, persons)
+            merged_id = self._find_match(source, pid, person, keys_of[pid])
+            if merged_id is not None:
+                self._claim(source, pid, person, merged_id, id_map)
+
+        # Lượt 2: người chưa khớp nhưng có họ hàng đã khớp
+        self._match_by_relatives(source, persons, id_map)
+        matched = len(id_map)
+
+        # Lượt 3: người mới
+        for pid, person in persons.items():
+            if pid in id_map:
+                continue
+            merged_id = self._new_id(pid)
+            # Tham chiếu tới người không có trong file được giữ nguyên như converter
+            self.persons[merged_id] = dict(
+                person, id=merged_id,
+                father_id=None if person["father_id"] in persons else person["father_id"],
+                mother_id=None if person["mother_id"] in persons else person["mother_id"],
+                spouse_ids=[s for s in person["spouse_ids"] if s not in persons],
+                children_ids=[], note_tags=dict(person["note_tags"]),
+            )
+            id_map[pid] = merged_id
+            self.provenance[merged_id][source] = pid
+
+        # Lượt 4: quan hệ theo id đã gộp, cập nhật chỉ mục khớp
+        for pid, person in persons.items():
+            target = self.persons[id_map[pid]]
+            for field in ("father_id", "mother_id"):
+                parent = id_map.get(person[field]) if person[field] else None
+                if parent is None:
+                    continue
+                if target[field] is None:
+                    target[field] = parent
+                    self.children_of[parent].append(target["id"])
+                elif target[field] != parent:
+                    self.conflicts.append({"type": "parent", "id": target["id"], "field": field,
+                                           "values": {"merged": target[field], source: parent}})
+            for spouse_id in person["spouse_ids"]:
+                merged_spouse = id_map.get(spouse_id)
+                if merged_spouse and merged_spouse not in target["spouse_ids"]:
+                    target["spouse_ids"].append(merged_spouse)
+
+            for key in keys_of[pid]:
+                ids = self.key_index[key]
+                if target["id"] not in ids:
+                    ids.append(target["id"])
+
+        created = len(persons) - matched
+        self.stats[source] = {"persons": len(persons), "matched": matched, "created": created}
+        print(f"{source}: {len(persons)} người, khớp {matched}, thêm mới {created}")
+
+
+def source_labels(input_files: List[str]) -> List[str]:
+    """Tên nguồn dùng trong provenance: đường dẫn file, thêm #n nếu trùng"""
+    labels = []
+    seen = defaultdict(int)
+    for input_file in input_files:
+        seen[input_file] += 1
+        labels.append(input_file if seen[input_file] == 1 else f"{input_file}#{seen[input_file]}")
+    return labels
+
+
+def merge_exports(input_files: List[str], output_dir: str, jobs: Optional[int] = None,
+                  write_delta: bool = True, rules: Optional[ClanRules] = None) -> ExportMerger:
+    """Parse song song, gộp theo thứ tự file và xuất đồ thị đã gộp"""
+    all_persons = parse_exports(input_files, jobs=jobs)
+
+    merger = ExportMerger()
+    for source, persons in zip(source_labels(input_files), all_persons):
+        merger.add_export(source, persons)
+
+    converter = FamilyTreeConverter(input_files[0], rules=rules)
+    converter.persons = merger.persons
+    converter.build_name_index()
+    converter.build_graph()
+    converter.export_outputs(output_dir, write_delta=write_delta)
+
+    output_dir = Path(output_dir)
+    with open(output_dir / "provenance.json", 'w', encoding='utf-8') as f:
+        json.dump(merger.provenance, f, ensure_ascii=False, indent=2)
+
+    report = {"sources": merger.stats, "conflicts": merger.conflicts}
+    with open(output_dir / "merge_conflicts.json", 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"Đã gộp {len(input_files)} file: {len(merger.persons)} người, {len(merger.conflicts)} mâu thuẫn")
+    return merger
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Gộp nhiều file xuất FamilyEcho thành một cây')
+    parser.add_argument('inputs', nargs='+', help='Các file FamilyScript/HTML, file đầu tiên là gốc')
+    parser.add_argument('-o', '--output', default='docs/merged', help='Thư mục xuất (mặc định: docs/merged)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Số tiến trình parse song song (mặc định: một tiến trình mỗi file)')
+    parser.add_argument('--no-delta', action='store_true', help='Không tạo patch so với bản build trước')
+    parser.add_argument('--rules', default=None, help='File JSON quy tắc dòng họ')
+    args = parser.parse_args()
+
+    merge_exports(args.inputs, args.output, jobs=args.jobs, write_delta=not args.no_delta,
+                  rules=load_rules(args.rules))
+
+
+if __name__ == "__main__":
+    main()
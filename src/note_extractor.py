@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Trích xuất thông tin có cấu trúc từ ghi chú FamilyScript trong một lần quét
+
+Một regex biên dịch sẵn gộp tất cả các mẫu (đời, phái, chi, nhánh, trưởng nam,
+con thứ, ...). Mỗi mẫu được bọc trong lookahead nên không "ăn" ký tự của mẫu
+khác: kết quả giống hệt việc gọi re.search riêng cho từng mẫu. Lớp ký tự đầu
+tiên loại nhanh các vị trí không thể bắt đầu một mẫu nào.
+"""
+
+import re
+from typing import Optional, Dict, Any
+
+_NOTE_PATTERN = re.compile(r'''(?=[ĐđGgPpCcNnTtVv])(?=
+      (?P<gen_thu>[Đđ]ời\s*[Tt]hứ\s*(?P<gen_thu_v>\d+))
+    | (?P<gen_num>[Đđ]ời\s*(?P<gen_num_v>\d+))
+    | (?P<gen_en>[Gg]en(?:eration)?\s*(?P<gen_en_v>\d+))
+    | (?P<phai>[Pp]hái\s+(?P<phai_v>\w+))
+    | (?P<chi>[Cc]hi\s+(?P<chi_v>\d+|\w+))
+    | (?P<nhanh>[Nn]hánh\s*(?P<nhanh_v>\d+|\w+))
+    | (?P<truong>[Tt]rưởng\s+(?P<truong_v>nam|nữ))
+    | (?P<con_truong>[Cc]on\s+(?:trưởng|cả))
+    | (?P<con_thu>[Cc]on\s+thứ\s+(?P<con_thu_v>\d+|hai|ba|tư|năm|sáu|bảy|tám|chín|mười))
+    | (?P<con_ut>[Cc]on\s+út)
+    | (?P<vo_tu>[Vv]ô\s+tự|[Tt]hất\s+truyền)
+    | (?P<married_into>[Cc]ó\s+chồng\s+về\s+(?:[Tt]ộc\s+)?(?P<married_into_v>\w+))
+)''', re.VERBOSE)
+
+# Thứ tự ưu tiên của các mẫu đời (giống extract_generation cũ)
+GENERATION_TAGS = ("gen_thu", "gen_num", "gen_en")
+
+# Các tag bổ sung được lưu vào person["note_tags"]
+EXTRA_TAGS = ("nhanh", "truong", "con_truong", "con_thu", "con_ut", "vo_tu", "married_into")
+
+# Các tag có nhóm giá trị "<tag>_v"
+_VALUE_GROUPS = {name[:-2] for name in _NOTE_PATTERN.groupindex if name.endswith("_v")}
+
+ORDINAL_WORDS = {
+    "hai": 2, "ba": 3, "tư": 4, "năm": 5, "sáu": 6,
+    "bảy": 7, "tám": 8, "chín": 9, "mười": 10,
+}
+
+
+def _tag_value(tag: str, value: Optional[str]) -> Any:
+    """Chuyển giá trị thô của tag sang kiểu phù hợp"""
+    if tag in GENERATION_TAGS:
+        return int(value)
+    if tag == "con_thu":
+        return int(value) if value.isdigit() else ORDINAL_WORDS[value]
+    if value is None:
+        return True
+    return value
+
+
+def scan_note(text: str) -> Dict[str, Dict]:
+    """Quét ghi chú một lần, trả về {tag: {"value": ..., "span": (start, end)}}
+
+    Mỗi tag chỉ giữ lần xuất hiện đầu tiên (trái nhất), như re.search.
+    """
+    found = {}
+    if not text:
+        return found
+
+    for match in _NOTE_PATTERN.finditer(text):
+        tag = match.lastgroup
+        if tag in found:
+            continue
+        value = match.group(f"{tag}_v") if tag in _VALUE_GROUPS else None
+        found[tag] = {"value": _tag_value(tag, value), "span": match.span(tag)}
+
+    return found
+
+
+def generation_from_scan(scan: Dict[str, Dict]) -> Optional[int]:
+    """Lấy số đời từ kết quả quét theo thứ tự ưu tiên các mẫu"""
+    for tag in GENERATION_TAGS:
+        if tag in scan:
+            return scan[tag]["value"]
+    return None
+
+
+def value_from_scan(scan: Dict[str, Dict], tag: str) -> Any:
+    """Lấy giá trị của một tag (None nếu không có)"""
+    entry = scan.get(tag)
+    return entry["value"] if entry else None
+
+
+def extra_tags_from_scan(scan: Dict[str, Dict]) -> Dict[str, Any]:
+    """Các tag bổ sung (ngoài đời/phái/chi) dạng {tag: value}"""
+    return {tag: scan[tag]["value"] for tag in EXTRA_TAGS if tag in scan}
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ngân sách kích thước cho các file JSON của trang web
+
+Sau khi xuất, mỗi file được đo: số byte, số byte sau gzip (như khi máy chủ
+nén gửi đi) và thời gian json.loads trong Python (lấy lần nhanh nhất trong
+vài lần, dùng để so sánh giữa các bản build, không phải thời gian trên điện
+thoại). Kết quả được so với ngân sách; file vượt ngân sách được phân tích
+theo trường để thấy khóa nào chiếm nhiều byte nhất:
+
+    persons.*.generation_source      177.2 KB    5.9%
+    persons.*.surname_at_birth       134.5 KB    4.5%
+    families.*.children_ids          101.8 KB    3.4%
+
+Các bản ghi theo id (persons, families, photos...) được gộp thành "*", phần
+tử mảng thành "[]", và cấu trúc đệ quy (children của children) được gộp về
+cùng một đường dẫn.
+
+Vượt ngân sách byte/gzip là lỗi khi build với --strict-budgets; thời gian
+parse đo trên máy build nên chỉ được cảnh báo.
+
+File ngân sách (JSON) ghi đè giá trị mặc định theo từng file và từng chỉ số;
+null bỏ giới hạn đó:
+
+    {
+        "family_data.min.json": {"bytes": 3000000, "gzip_bytes": 250000},
+        "photos_map.json": {"parse_seconds": null}
+    }
+"""
+
+import gzip
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional, Dict, List, Any, Tuple
+
+METRICS = ("bytes", "gzip_bytes", "parse_seconds")
+
+# Thời gian parse phụ thuộc máy build nên chỉ cảnh báo, kể cả khi fail=True
+WARN_ONLY_METRICS = ("parse_seconds",)
+
+# Mặc định ngang kích thước bản build hiện có (family_data.min.json 2.5 MB,
+# photos_map.json 0.6 MB): file chỉ được phép nhỏ đi, lớn hơn là hồi quy
+DEFAULT_BUDGETS = {
+    "family_data.json": {"bytes": 3_820_000, "gzip_bytes": 205_000, "parse_seconds": 0.25},
+    "family_data.min.json": {"bytes": 2_560_000, "gzip_bytes": 185_000, "parse_seconds": 0.25},
+    "family_tree.json": {"bytes": 1_760_000, "gzip_bytes": 75_000, "parse_seconds": 0.1},
+    "photos_map.json": {"bytes": 640_000, "gzip_bytes": 440_000, "parse_seconds": 0.05},
+}
+
+# Dict nhiều khóa hơn một bản ghi người (vài chục trường) với giá trị cùng kiểu
+# được coi là tập bản ghi theo id
+COLLECTION_MIN_KEYS = 64
+# Số lần json.loads khi đo thời gian parse
+PARSE_REPEAT = 3
+# Số dòng phân tích theo trường được in cho mỗi file vượt ngân sách
+BREAKDOWN_LINES = 12
+
+
+def _json_size(value: Any) -> int:
+    """Số byte JSON gọn của một giá trị lá (chuỗi: bỏ qua ký tự escape)"""
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 2
+    if value is None or value is True:
+        return 4
+    if value is False:
+        return 5
+    return len(repr(value))
+
+
+def _is_collection(value: Dict) -> bool:
+    """Dict theo id (persons, photos...): nhiều khóa cùng kiểu giá trị, hoặc
+    các bản ghi có cùng bộ trường (thống kê theo đời...)"""
+    if len(value) < 2:
+        return False
+    items = iter(value.values())
+    first = next(items)
+    if len(value) >= COLLECTION_MIN_KEYS:
+        return all(type(item) is type(first) for item in items)
+    return isinstance(first, dict) and all(isinstance(item, dict) and item.keys() == first.keys() for item in items)
+
+
+def field_breakdown(data: Any) -> List[Tuple[str, int]]:
+    """[(đường dẫn trường, số byte JSON gọn)], giảm dần theo số byte
+
+    Số byte của một giá trị lá gồm cả tên khóa của nó; phần khung (ngoặc,
+    dấu phẩy) không được tính nên tổng nhỏ hơn kích thước file một chút.
+    """
+    sizes = defaultdict(int)
+    stack: List[Tuple[Tuple[str, ...], Any]] = [((), data)]
+    while stack:
+        path, value = stack.pop()
+        if isinstance(value, dict):
+            collection = _is_collection(value)
+            for key, item in value.items():
+                segment = "*" if collection else key
+                # Cấu trúc đệ quy: quay về lần xuất hiện đầu tiên của khóa
+                child = path[:path.index(segment) + 1] if segment in path else path + (segment,)
+                if isinstance(item, (dict, list)):
+                    stack.append((child, item))
+                else:
+                    sizes[child] += _json_size(key) + 1 + _json_size(item)
+        elif isinstance(value, list):
+            child = path + ("[]",) if not path or path[-1] != "[]" else path
+            for item in value:
+                if isinstance(item, (dict, list)):
+                    stack.append((child, item))
+                else:
+                    sizes[child] += _json_size(item) + 1
+        else:
+            sizes[path] += _json_size(value)
+
+    named = defaultdict(int)
+    for path, size in sizes.items():
+        named[".".join(path).replace(".[]", "[]") or "(gốc)"] += size
+    return sorted(named.items(), key=lambda item: (-item[1], item[0]))
+
+
+def measure_artifact(path: Path) -> Tuple[Dict[str, Any], Any]:
+    """Đo một file: ({bytes, gzip_bytes, parse_seconds}, dữ liệu đã parse)"""
+    raw = path.read_bytes()
+    best = None
+    data = None
+    for _ in range(PARSE_REPEAT):
+        start = time.perf_counter()
+        data = json.loads(raw)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        "bytes": len(raw),
+        "gzip_bytes": len(gzip.compress(raw, compresslevel=6)),
+        "parse_seconds": round(best, 4),
+    }, data
+
+
+class PayloadBudgets:
+    """Ngân sách theo file; fail=True: vượt ngân sách kích thước là lỗi build
+    (không chỉ cảnh báo), vượt thời gian parse vẫn chỉ cảnh báo"""
+
+    def __init__(self, config: Optional[Dict[str, Dict[str, Optional[float]]]] = None, fail: bool = False):
+        self.limits: Dict[str, Dict[str, Optional[float]]] = {name: dict(limits) for name, limits in DEFAULT_BUDGETS.items()}
+        for name, limits in (config or {}).items():
+            unknown = sorted(set(limits) - set(METRICS))
+            if unknown:
+                raise ValueError(f"Chỉ số ngân sách không hợp lệ cho {name}: {', '.join(unknown)} "
+                                 f"(chọn từ {', '.join(METRICS)})")
+            self.limits.setdefault(name, dict.fromkeys(METRICS)).update(limits)
+        self.fail = fail
+
+    def check(self, output_dir: str) -> Dict[str, Any]:
+        """Đo các file có ngân sách trong output_dir (bỏ qua file chưa có)"""
+        output_dir = Path(output_dir)
+        artifacts = []
+        for name, limits in self.limits.items():
+            path = output_dir / name
+            if not path.exists():
+                continue
+            measured, data = measure_artifact(path)
+            violations = [
+                {"metric": metric, "value": measured[metric], "limit": limits[metric],
+                 "warn_only": metric in WARN_ONLY_METRICS}
+                for metric in METRICS
+                if limits.get(metric) is not None and measured[metric] > limits[metric]
+            ]
+            artifacts.append({
+                "file": name,
+                **measured,
+                "limits": {metric: limits.get(metric) for metric in METRICS},
+                "violations": violations,
+                # Chỉ phân tích theo trường khi cần giải thích
+                "breakdown": field_breakdown(data) if violations else [],
+            })
+            del data
+
+        exceeded = any(a["violations"] for a in artifacts)
+        blocking = any(not v["warn_only"] for a in artifacts for v in a["violations"])
+        return {"artifacts": artifacts, "exceeded": exceeded, "failed": blocking and self.fail}
+
+
+def load_budgets(path: Optional[str] = None, fail: bool = False) -> PayloadBudgets:
+    """Đọc ngân sách từ file JSON; không có file thì dùng ngân sách mặc định"""
+    if path is None:
+        return PayloadBudgets(fail=fail)
+    with open(path, 'r', encoding='utf-8') as f:
+        return PayloadBudgets(json.load(f), fail=fail)
+
+
+def _format_value(metric: str, value: float) -> str:
+    if metric == "parse_seconds":
+        return f"{value * 1000:.1f} ms"
+    return f"{value / 1024:.1f} KB"
+
+
+def print_report(report: Dict[str, Any]):
+    """In bảng kích thước và phân tích theo trường của các file vượt ngân sách"""
+    print("\n" + "=" * 60)
+    print("NGÂN SÁCH DỮ LIỆU WEB")
+    print("=" * 60)
+    print(f"{'File':<24} {'Kích thước':>12} {'Gzip':>12} {'Parse':>10}")
+    for a in report["artifacts"]:
+        flag = "  VƯỢT" if a["violations"] else ""
+        print(f"{a['file']:<24} {_format_value('bytes', a['bytes']):>12} "
+              f"{_format_value('gzip_bytes', a['gzip_bytes']):>12} "
+              f"{_format_value('parse_seconds', a['parse_seconds']):>10}{flag}")
+
+    for a in report["artifacts"]:
+        if not a["violations"]:
+            continue
+        print(f"\n{a['file']}:")
+        for v in a["violations"]:
+            note = " (chỉ cảnh báo)" if v["warn_only"] else ""
+            print(f"  {v['metric']}: {_format_value(v['metric'], v['value'])} "
+                  f"> {_format_value(v['metric'], v['limit'])}{note}")
+        total = sum(size for _, size in a["breakdown"]) or 1
+        print("  Các trường chiếm nhiều byte nhất (JSON gọn):")
+        for field, size in a["breakdown"][:BREAKDOWN_LINES]:
+            if size * 1000 < total:
+                break
+            print(f"    {field:<36} {_format_value('bytes', size):>12} {size * 100 / total:>6.1f}%")
+
+    if report["failed"]:
+        print("\nLỖI: dữ liệu web vượt ngân sách")
+    elif report["exceeded"]:
+        print("\nCẢNH BÁO: dữ liệu web vượt ngân sách")
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Các góc nhìn (view) của family_data.json: public / family / admin
+
+Mỗi view là một phép chiếu khai báo trên bản ghi người: bỏ trường với mọi
+người ("drop", kể cả các trường chỉ dùng lúc build), bỏ trường với người còn
+sống ("living_drop"), hoặc làm mờ trường của người còn sống ("living_mask",
+ví dụ ngày sinh chỉ giữ năm). "drop_sections" bỏ hẳn một phần của file.
+
+Phép chiếu được áp dụng ngay khi ghi file: mọi view được ghi trong cùng một
+lượt duyệt persons, mỗi bản ghi chỉ được chiếu tạm thời rồi bỏ, không tạo bản
+sao toàn bộ dữ liệu cho từng view. Bản ghi giống nhau giữa các view (người đã
+mất không có trường bị bỏ...) chỉ được serialize một lần.
+
+    public  family_data.json        trang web công khai
+    family  family_data.family.json người trong họ
+    admin   family_data.admin.json  đầy đủ mọi trường
+"""
+
+import argparse
+import json
+from collections.abc import Mapping
+from contextlib import ExitStack
+from typing import Optional, Dict, List, Any, Callable, Iterator, Sequence, Tuple
+
+from family_date import FamilyDate
+
+VIEWS = ("public", "family", "admin")
+
+# View mặc định: chỉ file công khai cho trang web
+DEFAULT_VIEWS = ("public",)
+
+CONTACT_FIELDS = ["email", "phone", "address"]
+
+# Trường suy ra lúc build cho chỉ mục/thống kê phía Python; trang web không đọc
+# nên không đưa vào file công khai (view family/admin vẫn giữ)
+DERIVED_FIELDS = [
+    # Suy ra từ name/surname, dùng cho name_key_index/name_token_index
+    "display_name", "name_key", "name_tokens",
+    # Chỉ số cây con (family_analytics), số hậu duệ còn sống lộ thông tin người sống
+    "descendant_count", "living_descendant_count", "lineage_depth",
+    # Vị trí trong ancestor_paths.ids (suy lại được từ chính mảng ids)
+    "path_id",
+    # Chỉ mục người -> gia đình (phần families đã có đủ thông tin)
+    "spouse_family_ids", "parent_family_id",
+    # Thứ bậc sinh (sibling_order); cây xuất ra đã xếp con theo thứ tự này
+    "birth_rank",
+]
+
+PROJECTIONS = {
+    "public": {
+        "drop": CONTACT_FIELDS + DERIVED_FIELDS,
+        # note_tags được rút từ notes (nhánh, vô tự, dâu/rể...) nên bỏ cùng với notes
+        "living_drop": ["notes", "note_tags", "activities", "birth_place", "profession", "employer", "interests"],
+        "living_mask": {"birth_date": "year"},
+        # Trie ancestor_paths chỉ dùng phía Python; trang web không đọc
+        "drop_sections": ["ancestor_paths"],
+    },
+    "family": {
+        "living_drop": CONTACT_FIELDS,
+    },
+    "admin": {},
+}
+
+
+def _year_only(date: Optional[Dict]) -> Optional[Dict]:
+    """Ngày -> chỉ còn năm (không có năm thì bỏ hẳn)"""
+    if not date or not date.get("year"):
+        return None
+    return FamilyDate.pack(date["year"], 0, 0).to_dict()
+
+
+MASKS: Dict[str, Callable[[Any], Any]] = {
+    "year": _year_only,
+}
+
+
+class Projection:
+    """Phép chiếu bản ghi người của một view"""
+
+    def __init__(self, name: str, drop: Sequence[str] = (), living_drop: Sequence[str] = (),
+                 living_mask: Optional[Dict[str, str]] = None, drop_sections: Sequence[str] = ()):
+        self.name = name
+        self.drop_sections = frozenset(drop_sections)
+        self.drop = frozenset(drop)
+        self.living_drop = self.drop | frozenset(living_drop)
+        self.living_mask: Dict[str, Callable[[Any], Any]] = {}
+        for field, kind in (living_mask or {}).items():
+            if kind not in MASKS:
+                raise ValueError(f"Kiểu làm mờ không hợp lệ: {field}={kind} (chọn từ {', '.join(MASKS)})")
+            self.living_mask[field] = MASKS[kind]
+
+    def apply(self, person: Dict) -> Dict:
+        """Bản ghi theo view; trả về chính person nếu không có gì phải bỏ/làm mờ"""
+        living = not person.get("is_deceased")
+        drop = self.living_drop if living else self.drop
+        masks = self.living_mask if living else {}
+        if not masks and drop.isdisjoint(person):
+            return person
+        projected = {key: value for key, value in person.items() if key not in drop}
+        for field, mask in masks.items():
+            if field in projected:
+                projected[field] = mask(projected[field])
+        return projected
+
+    def document(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Document bỏ các phần không thuộc view (không chiếu persons)"""
+        return {key: value for key, value in document.items() if key not in self.drop_sections}
+
+
+def get_projection(name: str) -> Projection:
+    if name not in PROJECTIONS:
+        raise ValueError(f"View không hợp lệ: {name} (chọn từ {', '.join(VIEWS)})")
+    return Projection(name, **PROJECTIONS[name])
+
+
+def parse_views(value: str) -> List[str]:
+    """Đọc danh sách view từ dòng lệnh ("public,admin")"""
+    views = list(dict.fromkeys(v.strip() for v in value.split(',') if v.strip()))
+    unknown = [v for v in views if v not in VIEWS]
+    if unknown or not views:
+        invalid = ', '.join(unknown) if unknown else repr(value)
+        raise argparse.ArgumentTypeError(f"View không hợp lệ: {invalid} (chọn từ {', '.join(VIEWS)})")
+    return views
+
+
+def view_file(output_file: str, view: str) -> str:
+    """File của một view: public dùng đúng tên file, view khác thêm hậu tố"""
+    if view == "public":
+        return output_file
+    return output_file.replace('.json', f'.{view}.json')
+
+
+def minified_file(output_file: str) -> str:
+    return output_file.replace('.json', '.min.json')
+
+
+def view_metadata(metadata: Dict[str, Any], view: str) -> Dict[str, Any]:
+    """Metadata ghi trong file của một view (kèm tên view)"""
+    return {**metadata, "view": view}
+
+
+class ProjectedRecords(Mapping):
+    """Tập bản ghi nhìn qua một view, chiếu từng bản ghi khi được đọc (không sao chép)"""
+
+    def __init__(self, records: Dict[str, Dict], projection: Projection):
+        self.records = records
+        self.projection = projection
+
+    def __getitem__(self, key: str) -> Dict:
+        return self.projection.apply(self.records[key])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+
+def _dumps(value: Any, level: int) -> Tuple[str, str]:
+    """(dạng indent=2 ở độ sâu level, dạng gọn), giống json.dump cho cả file"""
+    pretty = json.dumps(value, ensure_ascii=False, indent=2)
+    if level:
+        pretty = pretty.replace("\n", "\n" + "  " * level)
+    return pretty, json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def write_views(output_file: str, document: Dict[str, Any], projections: Sequence[Projection],
+                records_key: str = "persons") -> List[str]:
+    """Ghi document ra file của mọi view (mỗi view một file đầy đủ và một file .min) trong một lượt
+
+    Chỉ phần records_key được chiếu theo view; metadata của mỗi file được ghi
+    thêm tên view, phần nằm trong drop_sections của view bị bỏ qua. Trả về danh
+    sách file đầy đủ đã ghi.
+    """
+    written = []
+    with ExitStack() as stack:
+        outputs = []
+        for projection in projections:
+            path = view_file(output_file, projection.name)
+            pretty = stack.enter_context(open(path, 'w', encoding='utf-8'))
+            compact = stack.enter_context(open(minified_file(path), 'w', encoding='utf-8'))
+            outputs.append((projection, pretty, compact))
+            written.append(path)
+
+        def write_all(pretty_text: str, compact_text: str, section: Optional[str] = None):
+            for projection, pretty, compact in outputs:
+                if section not in projection.drop_sections:
+                    pretty.write(pretty_text)
+                    compact.write(compact_text)
+
+        write_all("{", "{")
+        for i, (key, value) in enumerate(document.items()):
+            if all(key in projection.drop_sections for projection, _, _ in outputs):
+                continue
+            sep = "," if i else ""
+            key_json = json.dumps(key, ensure_ascii=False)
+            write_all(f"{sep}\n  {key_json}: ", f"{sep}{key_json}:", key)
+
+            if key == records_key and value:
+                write_all("{", "{")
+                for j, (rid, record) in enumerate(value.items()):
+                    rid_json = json.dumps(rid, ensure_ascii=False)
+                    # id(bản ghi chiếu) -> (bản ghi, chuỗi đã serialize), dùng chung giữa
+                    # các view; giữ tham chiếu bản ghi để id không bị dùng lại
+                    serialized = {}
+                    for projection, pretty, compact in outputs:
+                        projected = projection.apply(record)
+                        if id(projected) not in serialized:
+                            serialized[id(projected)] = (projected, *_dumps(projected, 2))
+                        _, pretty_text, compact_text = serialized[id(projected)]
+                        pretty.write(f"{',' if j else ''}\n    {rid_json}: {pretty_text}")
+                        compact.write(f"{',' if j else ''}{rid_json}:{compact_text}")
+                write_all("\n  }", "}")
+            elif key == "metadata":
+                for projection, pretty, compact in outputs:
+                    pretty_text, compact_text = _dumps(view_metadata(value, projection.name), 1)
+                    pretty.write(pretty_text)
+                    compact.write(compact_text)
+            else:
+                write_all(*_dumps(value, 1), key)
+        write_all("\n}", "}")
+
+    return written
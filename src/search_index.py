@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chỉ mục tìm kiếm toàn văn (offline) cho ghi chú, hoạt động, nơi sinh, nơi an táng
+
+Từ được bỏ dấu (text_normalize.tokenize) nên "an tang" khớp "An Táng".
+Hỗ trợ:
+    - từ thường:       dung son           (mọi từ đều phải có)
+    - cụm từ:          "hoa son"          (các từ liền nhau)
+    - tiền tố:         nguy*              (mọi từ bắt đầu bằng "nguy")
+Kết quả xếp hạng theo BM25.
+
+Xuất ra thư mục các shard JSON nhỏ (theo ký tự đầu của từ) để trang web chỉ
+tải phần cần thiết:
+    search/index.json   -> thông tin chung, danh sách tài liệu, danh sách shard
+    search/<k>.json     -> {từ: [[doc, vị trí, ...], ...]}
+
+Dùng từ dòng lệnh:
+    python src/search_index.py docs/search '"hoa son" nguy*'
+"""
+
+import json
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional
+
+from text_normalize import tokenize
+
+# Các trường được đánh chỉ mục
+SEARCH_FIELDS = ("notes", "activities", "birth_place", "burial_place")
+
+# Khoảng cách vị trí giữa các trường, để cụm từ không khớp xuyên trường
+FIELD_GAP = 100
+
+# Tham số BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+
+class SearchIndex:
+    """Chỉ mục ngược có vị trí: từ -> {doc: [vị trí]}"""
+
+    def __init__(self):
+        self.doc_ids: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, List[int]]] = {}
+        self._vocabulary: Optional[List[str]] = None
+
+    @classmethod
+    def build(cls, persons: Dict[str, Dict], fields=SEARCH_FIELDS) -> "SearchIndex":
+        """Xây dựng chỉ mục từ persons (một lần lúc build)"""
+        index = cls()
+        postings = defaultdict(lambda: defaultdict(list))
+
+        for pid, person in persons.items():
+            position = 0
+            length = 0
+            doc = len(index.doc_ids)
+            for field in fields:
+                tokens = tokenize(person.get(field) or "")
+                for offset, token in enumerate(tokens):
+                    postings[token][doc].append(position + offset)
+                length += len(tokens)
+                position += len(tokens) + FIELD_GAP
+            # Người không có nội dung nào thì không cần đưa vào chỉ mục
+            if length:
+                index.doc_ids.append(pid)
+                index.doc_lengths.append(length)
+
+        index.postings = {token: dict(docs) for token, docs in postings.items()}
+        return index
+
+    @property
+    def vocabulary(self) -> List[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+    @property
+    def avg_doc_length(self) -> float:
+        return sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+
+    def _idf(self, df: int) -> float:
+        n = len(self.doc_ids)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _bm25(self, tf: int, doc: int, avgdl: float) -> float:
+        dl = self.doc_lengths[doc]
+        return tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl))
+
+    def expand_prefix(self, prefix: str) -> List[str]:
+        """Các từ trong từ điển bắt đầu bằng prefix"""
+        vocab = self.vocabulary
+        start = bisect_left(vocab, prefix)
+        end = start
+        while end < len(vocab) and vocab[end].startswith(prefix):
+            end += 1
+        return vocab[start:end]
+
+    def _term_matches(self, term: str) -> Dict[int, int]:
+        """doc -> tf của một từ hoặc tiền tố (term kết thúc bằng *)"""
+        if term.endswith("*"):
+            matches = defaultdict(int)
+            for token in self.expand_prefix(term[:-1]):
+                for doc, positions in self.postings[token].items():
+                    matches[doc] += len(positions)
+            return dict(matches)
+        return {doc: len(positions) for doc, positions in self.postings.get(term, {}).items()}
+
+    def _phrase_matches(self, tokens: List[str]) -> Dict[int, int]:
+        """doc -> số lần cụm từ xuất hiện liền nhau"""
+        lists = [self.postings.get(t) for t in tokens]
+        if not all(lists):
+            return {}
+
+        docs = set(lists[0])
+        for docs_positions in lists[1:]:
+            docs &= docs_positions.keys()
+
+        matches = {}
+        for doc in docs:
+            starts = set(lists[0][doc])
+            for offset, docs_positions in enumerate(lists[1:], 1):
+                starts &= {p - offset for p in docs_positions[doc]}
+                if not starts:
+                    break
+            if starts:
+                matches[doc] = len(starts)
+        return matches
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """Tìm kiếm; mọi mệnh đề đều phải khớp. Trả về [(person_id, điểm)]"""
+        clauses = []
+        for phrase, word in _QUERY_PATTERN.findall(query):
+            if phrase:
+                tokens = tokenize(phrase)
+                if len(tokens) == 1:
+                    clauses.append(self._term_matches(tokens[0]))
+                elif tokens:
+                    clauses.append(self._phrase_matches(tokens))
+            else:
+                tokens = tokenize(word)
+                # Dấu * chỉ áp dụng cho từ cuối cùng (ví dụ "Hòa-Sơ*")
+                if tokens and word.endswith("*"):
+                    tokens[-1] += "*"
+                clauses.extend(self._term_matches(token) for token in tokens)
+
+        if not clauses:
+            return []
+
+        docs = set(clauses[0])
+        for clause in clauses[1:]:
+            docs &= clause.keys()
+
+        avgdl = self.avg_doc_length
+        scores = defaultdict(float)
+        for clause in clauses:
+            idf = self._idf(len(clause))
+            for doc in docs:
+                scores[doc] += idf * self._bm25(clause[doc], doc, avgdl)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.doc_ids[item[0]]))
+        return [(self.doc_ids[doc], round(score, 4)) for doc, score in ranked[:limit]]
+
+    def write_shards(self, output_dir: str) -> int:
+        """Ghi chỉ mục ra các shard JSON theo ký tự đầu của từ, trả về số shard"""
+        out = Path(output_dir)
+        out.mkdir(parents=True, exist_ok=True)
+
+        shards = defaultdict(dict)
+        for token in self.vocabulary:
+            shards[shard_key(token)][token] = [
+                [doc, *positions] for doc, positions in sorted(self.postings[token].items())
+            ]
+
+        for key, data in shards.items():
+            with open(out / f"{key}.json", 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+        for old_file in out.glob("*.json"):
+            if old_file.stem != "index" and old_file.stem not in shards:
+                old_file.unlink()
+
+        meta = {
+            "fields": list(SEARCH_FIELDS),
+            "bm25": {"k1": BM25_K1, "b": BM25_B},
+            "field_gap": FIELD_GAP,
+            "docs": self.doc_ids,
+            "lengths": self.doc_lengths,
+            "shards": sorted(shards),
+        }
+        with open(out / "index.json", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, separators=(',', ':'))
+
+        return len(shards)
+
+    @classmethod
+    def load_shards(cls, index_dir: str) -> "SearchIndex":
+        """Đọc lại chỉ mục từ các shard JSON"""
+        src = Path(index_dir)
+        with open(src / "index.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        index = cls()
+        index.doc_ids = meta["docs"]
+        index.doc_lengths = meta["lengths"]
+        for key in meta["shards"]:
+            with open(src / f"{key}.json", 'r', encoding='utf-8') as f:
+                for token, entries in json.load(f).items():
+                    index.postings[token] = {entry[0]: entry[1:] for entry in entries}
+        return index
+
+
+def shard_key(token: str) -> str:
+    """Tên shard cho một từ: ký tự đầu (a-z), số gộp vào '0'"""
+    first = token[0]
+    if first.isdigit():
+        return "0"
+    if "a" <= first <= "z":
+        return first
+    return "_"
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print("Cách dùng: python search_index.py <thư mục search> <truy vấn>")
+        sys.exit(1)
+
+    search_index = SearchIndex.load_shards(sys.argv[1])
+    for person_id, score in search_index.search(" ".join(sys.argv[2:])):
+        print(f"{score:8.3f}  {person_id}")
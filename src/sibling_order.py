@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thứ tự anh chị em và thứ bậc sinh (birth_rank)
+
+Chỉ một phần nhỏ số người có ngày sinh, nên thứ tự các con của một cha/mẹ
+được suy luận từ ba nguồn, nguồn sau được ưu tiên hơn nguồn trước:
+
+    1. Thứ tự trong file FamilyScript (thứ tự nhập, thường theo thứ tự sinh)
+    2. Ngày sinh: các con có năm sinh được xếp lại theo ngày, nhưng chỉ trong
+       các vị trí vốn có của chúng; con không có ngày sinh giữ nguyên chỗ
+    3. Ghi chú: "Trưởng nam/nữ" đứng đầu các con cùng giới, "con trưởng/con
+       cả" đứng đầu, "con thứ N" ở vị trí N, "con út" đứng cuối
+
+Thứ tự được tính một lần cho mỗi cha/mẹ; cây và tile chỉ đọc lại, không sắp
+xếp lại ở mỗi lần xuất.
+"""
+
+from typing import Optional, Dict, List, Iterable
+
+from family_date import UNKNOWN_SORT_KEY
+
+
+def _pinned_position(tags: Dict, count: int) -> Optional[int]:
+    """Vị trí (1..count) do ghi chú chỉ định, None nếu không có"""
+    if "con_truong" in tags:
+        return 1
+    if "con_thu" in tags:
+        return tags["con_thu"]
+    if "con_ut" in tags:
+        return count
+    return None
+
+
+def order_siblings(children: Iterable[str], persons: Dict[str, Dict],
+                   birth_keys: Dict[str, int]) -> List[str]:
+    """Các con theo thứ tự sinh suy luận (children theo thứ tự trong file)"""
+    order = list(children)
+
+    # 2. Ngày sinh, trong các vị trí của những con có ngày
+    slots = [i for i, cid in enumerate(order) if birth_keys.get(cid, UNKNOWN_SORT_KEY) != UNKNOWN_SORT_KEY]
+    dated = sorted((order[i] for i in slots), key=birth_keys.__getitem__)
+    for i, cid in zip(slots, dated):
+        order[i] = cid
+
+    # 3a. Trưởng nam/nữ lên trước mọi anh chị em cùng giới
+    for cid in [c for c in order if "truong" in persons[c]["note_tags"]]:
+        gender = persons[cid]["gender"]
+        first = next(i for i, c in enumerate(order) if persons[c]["gender"] == gender)
+        order.remove(cid)
+        order.insert(first, cid)
+
+    # 3b. Vị trí ghi rõ; trùng hoặc vượt số con thì bỏ qua
+    pinned: Dict[int, str] = {}
+    for cid in order:
+        position = _pinned_position(persons[cid]["note_tags"], len(order))
+        if position is not None and 1 <= position <= len(order) and position not in pinned:
+            pinned[position] = cid
+    if pinned:
+        placed = set(pinned.values())
+        rest = iter([c for c in order if c not in placed])
+        order = [pinned[pos] if pos in pinned else next(rest) for pos in range(1, len(order) + 1)]
+
+    return order
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xuất dữ liệu gia phả ra cơ sở dữ liệu SQLite có chỉ mục, để truy vấn tùy ý
+
+Ví dụ: nam còn sống đời 12, Phái Nhất, chưa có ngày sinh:
+
+    sqlite3 docs/family.db "SELECT id, display_name FROM persons
+        WHERE generation = 12 AND phai = 'Nhất' AND gender = 'male'
+          AND is_deceased = 0 AND birth_year IS NULL"
+
+Toàn bộ hậu duệ của một người:
+
+    SELECT p.display_name, d.depth FROM descendant_closure d
+        JOIN persons p ON p.id = d.descendant_id
+        WHERE d.ancestor_id = 'N080G'
+
+View `descendants` là định nghĩa bằng CTE đệ quy; bảng `descendant_closure`
+là kết quả của view đó được tính sẵn lúc build, có chỉ mục theo tổ tiên nên
+truy vấn một nhánh chỉ mất vài mili giây (view phải tính lại toàn bộ).
+
+Cơ sở dữ liệu dành cho người quản trị (không xuất bản lên trang web) nên mặc
+định lấy từ view admin. Khi xuất từ view khác, các cột mà view đó luôn bỏ
+(ví dụ email/phone/address của view public) không được tạo.
+"""
+
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, Mapping
+
+from text_normalize import fold_text, tokenize
+
+# Giới hạn độ sâu của view đệ quy, tránh lặp vô hạn khi dữ liệu có vòng
+MAX_DESCENDANT_DEPTH = 64
+
+# Cột của bảng persons -> kiểu (bảng được tạo từ các cột còn lại sau khi bỏ cột)
+PERSON_COLUMNS = {
+    "id": "TEXT PRIMARY KEY",
+    "name": "TEXT",
+    "surname": "TEXT",
+    "surname_at_birth": "TEXT",
+    "display_name": "TEXT",
+    "name_key": "TEXT",
+    "gender": "TEXT",
+    "generation": "INTEGER",
+    "generation_source": "TEXT",
+    "phai": "TEXT",
+    "chi": "TEXT",
+    "is_deceased": "INTEGER NOT NULL",
+    "birth_year": "INTEGER",
+    "birth_month": "INTEGER",
+    "birth_day": "INTEGER",
+    "death_year": "INTEGER",
+    "death_month": "INTEGER",
+    "death_day": "INTEGER",
+    "burial_year": "INTEGER",
+    "burial_month": "INTEGER",
+    "burial_day": "INTEGER",
+    "birth_place": "TEXT",
+    "death_place": "TEXT",
+    "burial_place": "TEXT",
+    "father_id": "TEXT",
+    "mother_id": "TEXT",
+    "address": "TEXT",
+    "email": "TEXT",
+    "phone": "TEXT",
+    "profession": "TEXT",
+    "employer": "TEXT",
+    "interests": "TEXT",
+    "notes": "TEXT",
+    "activities": "TEXT",
+}
+
+# Chỉ mục của bảng persons: (tên, cột); chỉ tạo khi cột đầu tiên còn trong bảng
+PERSON_INDEXES = (
+    ("idx_persons_generation", "generation"),
+    ("idx_persons_phai", "phai, generation"),
+    ("idx_persons_chi", "chi, generation"),
+    ("idx_persons_name_key", "name_key"),
+    ("idx_persons_father", "father_id"),
+    ("idx_persons_mother", "mother_id"),
+)
+
+SCHEMA = f"""
+CREATE TABLE parent_edges (
+    child_id TEXT NOT NULL,
+    parent_id TEXT NOT NULL,
+    role TEXT NOT NULL CHECK (role IN ('father', 'mother')),
+    PRIMARY KEY (child_id, role)
+);
+
+CREATE TABLE spouse_edges (
+    person_id TEXT NOT NULL,
+    spouse_id TEXT NOT NULL,
+    PRIMARY KEY (person_id, spouse_id)
+);
+
+CREATE TABLE families (
+    id TEXT PRIMARY KEY,
+    husband_id TEXT,
+    wife_id TEXT
+);
+
+CREATE TABLE family_children (
+    family_id TEXT NOT NULL,
+    child_id TEXT NOT NULL,
+    PRIMARY KEY (family_id, child_id)
+);
+
+CREATE TABLE name_tokens (
+    token TEXT NOT NULL,
+    person_id TEXT NOT NULL,
+    PRIMARY KEY (token, person_id)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_parent_edges_parent ON parent_edges (parent_id);
+CREATE INDEX idx_spouse_edges_spouse ON spouse_edges (spouse_id);
+CREATE INDEX idx_family_children_child ON family_children (child_id);
+
+CREATE VIEW descendants AS
+WITH RECURSIVE d(ancestor_id, descendant_id, depth) AS (
+    SELECT parent_id, child_id, 1 FROM parent_edges
+    UNION ALL
+    SELECT d.ancestor_id, e.child_id, d.depth + 1
+    FROM d JOIN parent_edges e ON e.parent_id = d.descendant_id
+    WHERE d.depth < {MAX_DESCENDANT_DEPTH}
+)
+SELECT ancestor_id, descendant_id, MIN(depth) AS depth
+FROM d GROUP BY ancestor_id, descendant_id;
+
+CREATE TABLE descendant_closure (
+    ancestor_id TEXT NOT NULL,
+    descendant_id TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_descendant_closure_descendant ON descendant_closure (descendant_id);
+"""
+
+def _date_parts(date: Dict) -> tuple:
+    if not date:
+        return None, None, None
+    return date.get("year"), date.get("month"), date.get("day")
+
+
+def person_schema(columns: Iterable[str]) -> str:
+    """CREATE TABLE persons và các chỉ mục cho các cột đã chọn"""
+    columns = list(columns)
+    lines = ["CREATE TABLE persons (\n    " + ",\n    ".join(f"{c} {PERSON_COLUMNS[c]}" for c in columns) + "\n);"]
+    for name, indexed in PERSON_INDEXES:
+        if indexed.split(",")[0] in columns:
+            lines.append(f"CREATE INDEX {name} ON persons ({indexed});")
+    return "\n".join(lines) + "\n"
+
+
+def _person_row(person: Dict, columns: Iterable[str]) -> tuple:
+    row = dict(person)
+    row["is_deceased"] = int(bool(person["is_deceased"]))
+    for field in ("birth", "death", "burial"):
+        year, month, day = _date_parts(person.get(f"{field}_date"))
+        row[f"{field}_year"] = year or None
+        row[f"{field}_month"] = month or None
+        row[f"{field}_day"] = day or None
+    return tuple(row.get(col) for col in columns)
+
+
+def export_sqlite(persons: Mapping[str, Dict], families: Dict[str, Dict], db_file: str,
+                  omit_columns: Iterable[str] = ()) -> int:
+    """Ghi toàn bộ dữ liệu ra file SQLite (ghi file tạm rồi thay thế), trả về số người
+
+    omit_columns: các cột của bảng persons không tạo (trường mà view luôn bỏ).
+    """
+    omit = set(omit_columns)
+    columns = [c for c in PERSON_COLUMNS if c not in omit]
+    db_path = Path(db_file)
+    tmp_path = db_path.with_suffix(db_path.suffix + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(str(tmp_path))
+    try:
+        conn.executescript(person_schema(columns) + SCHEMA)
+
+        placeholders = ", ".join("?" for _ in columns)
+        conn.executemany(
+            f"INSERT INTO persons ({', '.join(columns)}) VALUES ({placeholders})",
+            (_person_row(p, columns) for p in persons.values()),
+        )
+
+        parent_edges = []
+        spouse_edges = set()
+        name_tokens = set()
+        for pid, p in persons.items():
+            if p["father_id"] in persons:
+                parent_edges.append((pid, p["father_id"], "father"))
+            if p["mother_id"] in persons:
+                parent_edges.append((pid, p["mother_id"], "mother"))
+            for spouse_id in p["spouse_ids"]:
+                if spouse_id in persons:
+                    spouse_edges.add((pid, spouse_id))
+            # View không có name_key: gấp lại từ họ và tên như lúc parse
+            name_key = p.get("name_key") or fold_text(f"{p.get('surname', '')} {p.get('name', '')}".strip())
+            for token in tokenize(name_key):
+                name_tokens.add((token, pid))
+
+        conn.executemany("INSERT INTO parent_edges VALUES (?, ?, ?)", parent_edges)
+        conn.executemany("INSERT INTO spouse_edges VALUES (?, ?)", sorted(spouse_edges))
+        conn.executemany("INSERT INTO name_tokens VALUES (?, ?)", sorted(name_tokens))
+
+        conn.executemany(
+            "INSERT INTO families VALUES (?, ?, ?)",
+            ((f["id"], f["husband_id"], f["wife_id"]) for f in families.values()),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO family_children VALUES (?, ?)",
+            ((f["id"], cid) for f in families.values() for cid in f["children_ids"]),
+        )
+
+        conn.execute("INSERT INTO descendant_closure SELECT * FROM descendants")
+
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    return len(persons)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chuẩn hóa chuỗi tiếng Việt: dạng NFC để hiển thị, dạng bỏ dấu để so khớp
+
+Các trình soạn thảo khác nhau có thể lưu "Đặng" ở dạng NFC hoặc NFD; so sánh
+chuỗi thô sẽ thất bại âm thầm. Mọi so khớp tên nên đi qua các hàm ở đây.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List
+
+# 'đ' không tách được bằng NFD nên phải thay riêng
+_FOLD_TABLE = str.maketrans({"đ": "d", "Đ": "D"})
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def nfc(text: str) -> str:
+    """Chuẩn hóa về dạng NFC (dạng hiển thị)"""
+    if not text or unicodedata.is_normalized("NFC", text):
+        return text
+    return unicodedata.normalize("NFC", text)
+
+
+@lru_cache(maxsize=65536)
+def fold_text(text: str) -> str:
+    """Bỏ dấu, chữ thường, gộp khoảng trắng: "Đặng  Văn Cẩn" -> "dang van can" """
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFD", text.translate(_FOLD_TABLE))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.lower().split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Tách chuỗi đã bỏ dấu thành các từ"""
+    return _TOKEN_PATTERN.findall(fold_text(text))
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CLI chung cho các công cụ gia phả Tộc Đặng
+
+    python src/tocdang.py convert   <input> [-o docs]
+    python src/tocdang.py analyze   <input>
+    python src/tocdang.py validate  <input>
+    python src/tocdang.py negatives <input>
+    python src/tocdang.py photos    <input.html> [-o docs]
+    python src/tocdang.py all       <input> [--stages convert,analyze,...]
+    python src/tocdang.py merge     <input> <input> ... [-o docs/merged]
+
+Lệnh `all` chỉ parse file một lần; mọi bước dùng chung một phiên (Session)
+trong bộ nhớ thay vì mỗi script tự đọc lại file.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Optional, Dict, List
+
+import analyze_generations
+import detailed_analysis
+import extract_images
+import find_negative_generations
+import merge_exports
+from clan_rules import ClanRules, load_rules
+from convert_to_json import FamilyTreeConverter
+from payload_budget import PayloadBudgets, load_budgets
+from privacy_projection import VIEWS, DEFAULT_VIEWS, parse_views
+from familyecho_file import FamilyEchoFile
+
+STAGES = ("convert", "analyze", "validate", "negatives", "photos")
+
+
+class Session:
+    """Phiên làm việc: parse và xây dựng chỉ mục một lần, dùng lại cho mọi bước"""
+
+    def __init__(self, input_file: str, jobs: Optional[int] = None, rules: Optional[ClanRules] = None,
+                 budgets: Optional[PayloadBudgets] = None):
+        self.input_file = input_file
+        self.jobs = jobs
+        self.rules = rules if rules is not None else ClanRules()
+        # Ngân sách dữ liệu web (None: không kiểm tra)
+        self.budgets = budgets
+        self._converter = None
+
+    @property
+    def converter(self) -> FamilyTreeConverter:
+        """Converter đã load (parse + quan hệ + suy luận đời), tạo khi cần"""
+        if self._converter is None:
+            self._converter = FamilyTreeConverter(self.input_file, rules=self.rules)
+            self._converter.load(jobs=self.jobs)
+        return self._converter
+
+    def analysis_persons(self) -> Dict[str, Dict]:
+        """Bản sao dữ liệu theo dạng các script phân tích dùng
+
+        Chỉ giữ đời ghi rõ trong ghi chú (chưa suy luận), vì các phân tích tự
+        suy luận và so sánh lại. Mỗi lần gọi trả về bản sao mới vì các phân
+        tích sửa trực tiếp vào dữ liệu.
+        """
+        persons = {}
+        # Ghi chú đời lúc parse, kể cả ghi chú mà lời giải ràng buộc đã bác bỏ
+        annotated = self.converter.annotated_generations()
+        for pid, p in self.converter.persons.items():
+            explicit = pid in annotated
+            persons[pid] = {
+                "id": pid,
+                "name": p["name"],
+                "surname": p["surname"],
+                "father_id": p["father_id"],
+                "mother_id": p["mother_id"],
+                "generation": annotated.get(pid),
+                "gen_source": "explicit" if explicit else None,
+                "phai": p["phai"],
+                "chi": p["chi"],
+            }
+        return persons
+
+
+def run_convert(session: Session, args):
+    converter = session.converter
+    converter.export_outputs(args.output, write_delta=not args.no_delta, layout=args.layout, tiles=args.tiles,
+                             sqlite_file=args.sqlite, search=args.search, calendar=args.calendar,
+                             conflicts=args.conflicts, budgets=session.budgets, views=args.views,
+                             sqlite_view=args.sqlite_view)
+    converter.print_summary()
+    if converter.budget_report is not None and converter.budget_report["failed"]:
+        sys.exit(1)
+
+
+def run_analyze(session: Session, args):
+    persons = session.analysis_persons()
+    print("\nĐang suy luận thông tin đời từ liên kết...")
+    iterations = analyze_generations.propagate_generations(persons, session.rules)
+    print(f"Hoàn thành sau {iterations} vòng lặp")
+
+    without_gen = analyze_generations.analyze_results(persons, session.rules)
+    if without_gen > 0 and args.missing_output:
+        analyze_generations.export_missing_generations(persons, args.missing_output, session.rules)
+
+
+def run_validate(session: Session, args):
+    persons = session.analysis_persons()
+    errors = detailed_analysis.find_all_errors(persons, session.rules)
+    detailed_analysis.print_report(errors, persons, session.rules)
+
+
+def run_negatives(session: Session, args):
+    find_negative_generations.analyze_negative_generations(session.analysis_persons(), session.rules)
+
+
+def run_photos(session: Session, args):
+    if not session.input_file.lower().endswith(('.html', '.htm')):
+        print("Bỏ qua photos: cần file HTML xuất từ FamilyEcho")
+        return
+
+    # Ảnh của từng người lấy từ dữ liệu đã parse, không cần đọc family_data.json
+    person_photos = extract_images.photo_refs_from_persons(session.converter.persons)
+    with FamilyEchoFile(session.input_file) as reader:
+        extract_images.write_photos(person_photos, reader.images(), args.output)
+
+
+RUNNERS = {
+    "convert": run_convert,
+    "analyze": run_analyze,
+    "validate": run_validate,
+    "negatives": run_negatives,
+    "photos": run_photos,
+}
+
+
+def parse_stages(value: str) -> List[str]:
+    stages = [s.strip() for s in value.split(',') if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Bước không hợp lệ: {', '.join(unknown)} (chọn từ {', '.join(STAGES)})")
+    return stages
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='tocdang', description='Công cụ gia phả Tộc Đặng Non Nước')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('input', help='File FamilyScript hoặc HTML xuất từ FamilyEcho')
+    common.add_argument('-o', '--output', default='docs', help='Thư mục xuất (mặc định: docs)')
+    common.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Số tiến trình parse song song (mặc định: tuần tự)')
+    common.add_argument('--no-delta', action='store_true',
+                        help='Không tạo patch so với bản build trước')
+    common.add_argument('--layout', action='store_true',
+                        help='(convert) Tính sẵn tọa độ cây và chỉ mục ô cho viewer')
+    common.add_argument('--tiles', action='store_true',
+                        help='(convert) Xuất cây thành các ô theo mức chi tiết (tree_tiles/)')
+    common.add_argument('--sqlite', default=None,
+                        help='(convert) Xuất thêm cơ sở dữ liệu SQLite có chỉ mục')
+    common.add_argument('--sqlite-view', choices=VIEWS, default='admin',
+                        help='(convert) View dùng cho SQLite (mặc định: admin, đủ mọi trường)')
+    common.add_argument('--search', action='store_true',
+                        help='(convert) Xuất chỉ mục tìm kiếm toàn văn')
+    common.add_argument('--calendar', action='store_true',
+                        help='(convert) Xuất lịch ngày giỗ (JSON theo tháng và iCalendar)')
+    common.add_argument('--conflicts', action='store_true',
+                        help='(convert) Xuất báo cáo mâu thuẫn đời kèm giải thích')
+    common.add_argument('--rules', default=None,
+                        help='File JSON quy tắc dòng họ (họ, cụ tổ, tên không hợp lệ, cách suy luận đời)')
+    common.add_argument('--views', type=parse_views, default=list(DEFAULT_VIEWS),
+                        help='(convert) Các view của family_data.json: public, family, admin (mặc định: public)')
+    common.add_argument('--budgets', action='store_true',
+                        help='(convert) Đo kích thước, gzip và thời gian parse các file web so với ngân sách')
+    common.add_argument('--budget-file', default=None,
+                        help='(convert) File JSON ngân sách theo từng file (bật --budgets)')
+    common.add_argument('--strict-budgets', action='store_true',
+                        help='(convert) Thoát với mã lỗi khi vượt ngân sách (bật --budgets)')
+    common.add_argument('--missing-output', default=None,
+                        help='(analyze) Ghi danh sách người thiếu thông tin đời ra file')
+
+    helps = {
+        "convert": "Chuyển FamilyScript sang JSON cho trang web",
+        "analyze": "Phân tích và suy luận thông tin đời",
+        "validate": "Kiểm tra lỗi dữ liệu (đời không khớp, tên lỗi, người không liên kết)",
+        "negatives": "Tìm các liên kết cha-con gây ra đời âm",
+        "photos": "Trích xuất ảnh từ file HTML của FamilyEcho",
+    }
+    for name in STAGES:
+        subparsers.add_parser(name, parents=[common], help=helps[name])
+
+    all_parser = subparsers.add_parser('all', parents=[common],
+                                       help='Chạy nhiều bước, chỉ parse file một lần')
+    all_parser.add_argument('--stages', type=parse_stages, default=list(STAGES),
+                            help=f"Các bước, cách nhau bởi dấu phẩy (mặc định: {','.join(STAGES)})")
+
+    merge_parser = subparsers.add_parser('merge', help='Gộp nhiều file xuất FamilyEcho thành một cây')
+    merge_parser.add_argument('inputs', nargs='+', help='Các file FamilyScript/HTML, file đầu tiên là gốc')
+    merge_parser.add_argument('-o', '--output', default='docs/merged',
+                              help='Thư mục xuất (mặc định: docs/merged)')
+    merge_parser.add_argument('-j', '--jobs', type=int, default=None,
+                              help='Số tiến trình parse song song (mặc định: một tiến trình mỗi file)')
+    merge_parser.add_argument('--no-delta', action='store_true',
+                              help='Không tạo patch so với bản build trước')
+    merge_parser.add_argument('--rules', default=None, help='File JSON quy tắc dòng họ')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+
+    inputs = args.inputs if args.command == 'merge' else [args.input]
+    for input_file in inputs:
+        if not Path(input_file).exists():
+            print(f"Không tìm thấy file: {input_file}")
+            sys.exit(1)
+
+    try:
+        rules = load_rules(args.rules)
+    except (OSError, ValueError) as e:
+        print(f"Không đọc được quy tắc dòng họ: {e}")
+        sys.exit(1)
+
+    if args.command == 'merge':
+        merge_exports.merge_exports(args.inputs, args.output, jobs=args.jobs, write_delta=not args.no_delta,
+                                    rules=rules)
+        return
+
+    budgets = None
+    if args.budgets or args.budget_file or args.strict_budgets:
+        try:
+            budgets = load_budgets(args.budget_file, fail=args.strict_budgets)
+        except (OSError, ValueError) as e:
+            print(f"Không đọc được file ngân sách: {e}")
+            sys.exit(1)
+
+    session = Session(args.input, jobs=args.jobs, rules=rules, budgets=budgets)
+    stages = args.stages if args.command == 'all' else [args.command]
+    for stage in stages:
+        print("\n" + "#" * 70)
+        print(f"# {stage.upper()}")
+        print("#" * 70)
+        RUNNERS[stage](session, args)
+
+
+if __name__ == "__main__":
+    main()
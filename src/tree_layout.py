@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tính tọa độ cây phả hệ phía server (thuật toán Reingold–Tilford / Walker,
+bản tuyến tính của Buchheim et al.), giống hệt d3.tree() trong docs/index.html
+
+Mỗi nút được gắn x, y và extent (khoảng x nhỏ nhất/lớn nhất của cây con),
+kèm một quadtree chia theo ô để viewer chỉ vẽ các nút nằm trong khung nhìn.
+"""
+
+from typing import Optional, Dict, List, Tuple
+
+# Giống d3.tree().nodeSize([180, 100]) trong viewer
+NODE_WIDTH = 180
+LEVEL_HEIGHT = 100
+
+# separation(a, b): anh em ruột 1, khác cha 1.2
+SIBLING_SEPARATION = 1.0
+COUSIN_SEPARATION = 1.2
+
+# Số nút tối đa trong một ô lá của quadtree
+TILE_CAPACITY = 256
+
+
+class _LayoutNode:
+    """Nút trung gian cho thuật toán Buchheim (tương đương TreeNode của d3)"""
+
+    __slots__ = ("node", "parent", "children", "index", "depth",
+                 "prelim", "mod", "change", "shift", "thread", "ancestor", "default_ancestor")
+
+    def __init__(self, node: Optional[Dict], index: int, depth: int):
+        self.node = node
+        self.parent = None
+        self.children = None
+        self.index = index
+        self.depth = depth
+        self.prelim = 0.0
+        self.mod = 0.0
+        self.change = 0.0
+        self.shift = 0.0
+        self.thread = None
+        self.ancestor = self
+        self.default_ancestor = None
+
+
+def _separation(a: _LayoutNode, b: _LayoutNode) -> float:
+    return SIBLING_SEPARATION if a.parent is b.parent else COUSIN_SEPARATION
+
+
+def _next_left(v: _LayoutNode) -> Optional[_LayoutNode]:
+    return v.children[0] if v.children else v.thread
+
+
+def _next_right(v: _LayoutNode) -> Optional[_LayoutNode]:
+    return v.children[-1] if v.children else v.thread
+
+
+def _move_subtree(wm: _LayoutNode, wp: _LayoutNode, shift: float):
+    change = shift / (wp.index - wm.index)
+    wp.change -= change
+    wp.shift += shift
+    wm.change += change
+    wp.prelim += shift
+    wp.mod += shift
+
+
+def _execute_shifts(v: _LayoutNode):
+    shift = 0.0
+    change = 0.0
+    for w in reversed(v.children):
+        w.prelim += shift
+        w.mod += shift
+        change += w.change
+        shift += w.shift + change
+
+
+def _next_ancestor(vim: _LayoutNode, v: _LayoutNode, ancestor: _LayoutNode) -> _LayoutNode:
+    return vim.ancestor if vim.ancestor.parent is v.parent else ancestor
+
+
+def _apportion(v: _LayoutNode, w: Optional[_LayoutNode], ancestor: _LayoutNode) -> _LayoutNode:
+    if w is None:
+        return ancestor
+
+    vip = vop = v
+    vim = w
+    vom = v.parent.children[0]
+    sip = vip.mod
+    sop = vop.mod
+    sim = vim.mod
+    som = vom.mod
+
+    vim = _next_right(vim)
+    vip = _next_left(vip)
+    while vim is not None and vip is not None:
+        vom = _next_left(vom)
+        vop = _next_right(vop)
+        vop.ancestor = v
+        shift = vim.prelim + sim - vip.prelim - sip + _separation(vim, vip)
+        if shift > 0:
+            _move_subtree(_next_ancestor(vim, v, ancestor), v, shift)
+            sip += shift
+            sop += shift
+        sim += vim.mod
+        sip += vip.mod
+        som += vom.mod
+        sop += vop.mod
+        vim = _next_right(vim)
+        vip = _next_left(vip)
+
+    if vim is not None and _next_right(vop) is None:
+        vop.thread = vim
+        vop.mod += sim - sop
+    if vip is not None and _next_left(vom) is None:
+        vom.thread = vip
+        vom.mod += sip - som
+        ancestor = v
+
+    return ancestor
+
+
+def _first_walk(v: _LayoutNode):
+    siblings = v.parent.children
+    w = siblings[v.index - 1] if v.index else None
+
+    if v.children:
+        _execute_shifts(v)
+        midpoint = (v.children[0].prelim + v.children[-1].prelim) / 2
+        if w is not None:
+            v.prelim = w.prelim + _separation(v, w)
+            v.mod = v.prelim - midpoint
+        else:
+            v.prelim = midpoint
+    elif w is not None:
+        v.prelim = w.prelim + _separation(v, w)
+
+    v.parent.default_ancestor = _apportion(v, w, v.parent.default_ancestor or siblings[0])
+
+
+def _build_layout_tree(tree: Dict) -> Tuple[_LayoutNode, List[_LayoutNode]]:
+    """Tạo cây _LayoutNode, trả về (gốc ảo, danh sách nút theo thứ tự trước)"""
+    sentinel = _LayoutNode(None, 0, -1)
+    root = _LayoutNode(tree, 0, 0)
+    root.parent = sentinel
+    sentinel.children = [root]
+
+    preorder = []
+    stack = [root]
+    while stack:
+        v = stack.pop()
+        preorder.append(v)
+        children = v.node.get("children") or []
+        if children:
+            v.children = []
+            for i, child in enumerate(children):
+                c = _LayoutNode(child, i, v.depth + 1)
+                c.parent = v
+                v.children.append(c)
+            stack.extend(reversed(v.children))
+
+    return sentinel, preorder
+
+
+def layout_tree(tree: Dict) -> Dict:
+    """Gắn x, y, extent vào từng nút của cây (sửa trực tiếp), trả về khung bao
+
+    extent = [x nhỏ nhất, x lớn nhất, độ sâu lớn nhất] của cây con, theo tọa độ
+    đã nhân NODE_WIDTH / LEVEL_HEIGHT.
+    """
+    sentinel, preorder = _build_layout_tree(tree)
+
+    # Duyệt sau (post-order), anh em theo thứ tự trái -> phải
+    for v in _postorder(preorder[0]):
+        _first_walk(v)
+
+    root = preorder[0]
+    sentinel.mod = -root.prelim
+
+    # Duyệt trước: x = prelim + tổng mod của tổ tiên
+    for v in preorder:
+        x = v.prelim + v.parent.mod
+        v.mod += v.parent.mod
+        v.node["x"] = round(x * NODE_WIDTH, 2)
+        v.node["y"] = v.depth * LEVEL_HEIGHT
+
+    # Khoảng chiếm của cây con, tính ngược từ lá lên gốc
+    for v in reversed(preorder):
+        node = v.node
+        extent = [node["x"], node["x"], node["y"]]
+        for c in v.children or []:
+            child_extent = c.node["extent"]
+            extent[0] = min(extent[0], child_extent[0])
+            extent[1] = max(extent[1], child_extent[1])
+            extent[2] = max(extent[2], child_extent[2])
+        node["extent"] = extent
+
+    min_x, max_x, max_y = tree["extent"]
+    return {"min_x": min_x, "max_x": max_x, "min_y": 0, "max_y": max_y}
+
+
+def _postorder(root: _LayoutNode) -> List[_LayoutNode]:
+    """Thứ tự sau giống eachAfter của d3: con trái -> phải, rồi đến cha"""
+    order = []
+    stack = [(root, False)]
+    while stack:
+        v, visited = stack.pop()
+        if visited or not v.children:
+            order.append(v)
+            continue
+        stack.append((v, True))
+        stack.extend((c, False) for c in reversed(v.children))
+    return order
+
+
+def build_quadtree(tree: Dict, bounds: Dict, capacity: int = TILE_CAPACITY) -> Dict:
+    """Chia các nút (đã có x, y) vào quadtree theo ô
+
+    Ô lá: {"bounds": [x0, y0, x1, y1], "ids": [...], "xy": [[x, y], ...]} (xy theo thứ tự ids,
+    để viewer lấy tọa độ từ file ô mà không phải tải cả family_tree.json)
+    Ô trong: {"bounds": [...], "children": [4 ô con không rỗng]}
+    """
+    points = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        points.append((node["x"], node["y"], node["id"]))
+        stack.extend(node.get("children") or [])
+
+    # Mở rộng nửa ô để thẻ nút ở mép vẫn nằm trong khung
+    box = (bounds["min_x"] - NODE_WIDTH / 2, bounds["min_y"] - LEVEL_HEIGHT / 2,
+           bounds["max_x"] + NODE_WIDTH / 2, bounds["max_y"] + LEVEL_HEIGHT / 2)
+    return _split_tile(points, box, capacity)
+
+
+def _split_tile(points: List[Tuple[float, float, str]], box: Tuple[float, float, float, float],
+                capacity: int) -> Dict:
+    x0, y0, x1, y1 = box
+    tile = {"bounds": [round(v, 2) for v in box]}
+
+    # Không chia tiếp khi đủ nhỏ, hoặc mọi điểm trùng nhau
+    if len(points) <= capacity or (x1 - x0 <= NODE_WIDTH and y1 - y0 <= LEVEL_HEIGHT):
+        tile["ids"] = [pid for _, _, pid in points]
+        tile["xy"] = [[round(x, 2), round(y, 2)] for x, y, _ in points]
+        return tile
+
+    mx = (x0 + x1) / 2
+    my = (y0 + y1) / 2
+    quadrants = [[], [], [], []]
+    for p in points:
+        quadrants[(p[0] >= mx) + 2 * (p[1] >= my)].append(p)
+
+    boxes = [(x0, y0, mx, my), (mx, y0, x1, my), (x0, my, mx, y1), (mx, my, x1, y1)]
+    tile["children"] = [
+        _split_tile(q, b, capacity) for q, b in zip(quadrants, boxes) if q
+    ]
+    return tile
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Watch mode: theo dõi file FamilyScript/HTML xuất từ FamilyEcho và tự build lại
+
+Dùng polling (chỉ thư viện chuẩn, chạy được trên mọi hệ điều hành). Các lần
+ghi liên tiếp được gộp lại (debounce): chỉ build khi file đứng yên đủ lâu.
+Kết quả parse của các dòng không đổi được giữ trong bộ nhớ giữa các lần build.
+
+Sau khi parse lại, các bản ghi được so với lần build trước để chỉ làm phần
+bị ảnh hưởng:
+    - không bản ghi nào đổi (file chỉ được ghi lại): bỏ qua build
+    - chỉ đổi trường hiển thị (ghi chú, nơi sinh, liên lạc, tên...): cập nhật
+      các trường đó vào đồ thị cũ rồi xuất lại, bỏ qua quan hệ/đời/chỉ số
+    - đổi trường của đồ thị (cha mẹ, vợ chồng, giới tính, họ, ngày sinh...):
+      dựng lại đồ thị. Đời, gia đình, thứ tự anh chị em và chỉ số cây con phụ
+      thuộc cả thành phần liên thông nên không vá cục bộ được.
+"""
+
+import os
+import time
+from typing import Optional, Tuple, Dict, Set
+
+from clan_rules import ClanRules
+from convert_to_json import FamilyTreeConverter
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) của file, None nếu file đang không tồn tại"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def wait_until_stable(path: str, debounce: float, interval: float) -> Optional[Tuple[int, int]]:
+    """Chờ đến khi file không đổi trong `debounce` giây, trả về chữ ký cuối"""
+    signature = file_signature(path)
+    stable_since = time.monotonic()
+
+    while time.monotonic() - stable_since < debounce:
+        time.sleep(interval)
+        current = file_signature(path)
+        if current != signature:
+            signature = current
+            stable_since = time.monotonic()
+
+    return signature
+
+
+# Các trường đầu vào của bước dựng đồ thị (quan hệ, suy luận đời, thứ tự anh
+# chị em, chỉ số cây con, quy tắc dòng họ); các trường khác chỉ dùng khi xuất
+GRAPH_FIELDS = frozenset({
+    "father_id", "mother_id", "spouse_ids", "children_ids", "gender", "surname",
+    "birth_date", "is_deceased", "generation", "generation_source", "phai", "chi", "note_tags",
+})
+
+
+class WatchBuilder:
+    """Giữ đồ thị của lần build trước để chỉ build lại phần bị ảnh hưởng"""
+
+    def __init__(self, input_file: str, output_dir: str, rules: Optional[ClanRules] = None, **run_options):
+        self.input_file = input_file
+        self.output_dir = output_dir
+        self.rules = rules
+        self.run_options = run_options
+        self.line_cache: Dict[str, Dict] = {}
+        # Converter đã dựng đồ thị và bản ghi vừa parse (trước khi dựng) của lần build trước
+        self.converter: Optional[FamilyTreeConverter] = None
+        self.parsed: Dict[str, Dict] = {}
+
+    def _changed_ids(self, persons: Dict[str, Dict]) -> Set[str]:
+        changed = {pid for pid, person in persons.items() if self.parsed.get(pid) != person}
+        changed.update(pid for pid in self.parsed if pid not in persons)
+        return changed
+
+    def _graph_changed(self, persons: Dict[str, Dict], changed: Set[str]) -> bool:
+        for pid in changed:
+            old, new = self.parsed.get(pid), persons.get(pid)
+            if old is None or new is None:
+                return True
+            if any(old[field] != new[field] for field in GRAPH_FIELDS):
+                return True
+        return False
+
+    def rebuild(self) -> Optional[float]:
+        """Build lại phần cần thiết, trả về thời gian (giây); None nếu không có gì đổi"""
+        start = time.perf_counter()
+        converter = FamilyTreeConverter(self.input_file, line_cache=self.line_cache, rules=self.rules)
+        converter.parse_familyscript()
+        # Bản sao nông: bước dựng đồ thị chỉ gán lại trường, không sửa tại chỗ
+        parsed = {pid: dict(person) for pid, person in converter.persons.items()}
+
+        changed = self._changed_ids(converter.persons)
+        # Thứ tự dòng trong file quyết định thứ tự anh chị em khi không có ngày sinh
+        reordered = list(converter.persons) != list(self.parsed)
+        if self.converter is not None and not changed and not reordered:
+            print("Không có bản ghi nào thay đổi, bỏ qua build")
+            return None
+
+        if (self.converter is not None and not reordered
+                and not self._graph_changed(converter.persons, changed)):
+            print(f"{len(changed)} người chỉ đổi trường hiển thị, dùng lại đồ thị của lần build trước")
+            previous = self.converter
+            for pid in changed:
+                previous.persons[pid].update(
+                    (field, value) for field, value in converter.persons[pid].items() if field not in GRAPH_FIELDS
+                )
+            previous.build_name_index()
+            previous.reset_derived_caches()
+            converter = previous
+        else:
+            converter.build_graph()
+
+        converter.export_outputs(self.output_dir, **self.run_options)
+        converter.print_summary()
+        self.converter = converter
+        self.parsed = parsed
+        return time.perf_counter() - start
+
+    def try_rebuild(self) -> Optional[float]:
+        """Như rebuild() nhưng chỉ báo lỗi (file có thể đang được ghi dở) thay vì dừng"""
+        try:
+            return self.rebuild()
+        except Exception as e:
+            # Lần thay đổi sau sẽ build lại
+            print(f"Lỗi khi build: {e}")
+            return None
+
+
+def watch(input_file: str, output_dir: str, debounce: float = 1.0, interval: float = 0.25,
+          rules: Optional[ClanRules] = None, **run_options):
+    """Vòng lặp theo dõi; dừng bằng Ctrl+C"""
+    builder = WatchBuilder(input_file, output_dir, rules=rules, **run_options)
+
+    print(f"Theo dõi thay đổi: {input_file} (Ctrl+C để dừng)")
+    try:
+        signature = wait_until_stable(input_file, debounce, interval)
+        if signature is not None:
+            elapsed = builder.try_rebuild()
+            if elapsed is not None:
+                print(f"\nĐã build xong sau {elapsed:.2f}s, đang chờ thay đổi...")
+
+        while True:
+            time.sleep(interval)
+            if file_signature(input_file) == signature:
+                continue
+
+            # Gộp các lần ghi liên tiếp thành một lần build
+            signature = wait_until_stable(input_file, debounce, interval)
+            if signature is None:
+                print(f"File {input_file} tạm thời không tồn tại, tiếp tục chờ...")
+                continue
+
+            print(f"\nPhát hiện thay đổi: {input_file}")
+            elapsed = builder.try_rebuild()
+            if elapsed is not None:
+                print(f"\nĐã build lại sau {elapsed:.2f}s, đang chờ thay đổi...")
+    except KeyboardInterrupt:
+        print("\nĐã dừng theo dõi")